@@ -0,0 +1,138 @@
+import json
+import math
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# --- Configuration ---
+DEFAULT_BATCH_OUTPUT = "batch_results.jsonl"
+MAX_IN_FLIGHT_PER_WORKER = 2
+
+
+def iter_jobs(input_path: str) -> Iterator[Dict[str, Any]]:
+    # Each line is either {"goal": "..."} or {"plan": {"steps": [...]}}; an
+    # optional "id" (or "request_id") is echoed into the result record.
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip(): continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield {"id": f"line-{line_number}", "line": line_number, "error": f"Invalid JSON: {e}"}
+                continue
+            if not isinstance(record, dict):
+                yield {"id": f"line-{line_number}", "line": line_number, "error": "Line is not a JSON object."}
+                continue
+            yield {
+                "id": record.get("id") or record.get("request_id") or f"line-{line_number}",
+                "line": line_number,
+                "goal": record.get("goal"),
+                "plan": record.get("plan"),
+            }
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values: return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return round(ordered[rank - 1], 4)
+
+
+def summarize(records: List[Dict[str, Any]], wall_s: float, pool_stats: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    latencies = [r["total_s"] for r in records if r.get("total_s") is not None]
+    failed_steps = Counter(
+        step["action"] for r in records for step in r.get("steps", []) if not step.get("success")
+    )
+    return {
+        "runs": len(records),
+        "succeeded": sum(1 for r in records if r["status"] == "ok"),
+        "failures_by_status": dict(Counter(r["status"] for r in records if r["status"] != "ok")),
+        "failed_steps_by_action": dict(failed_steps),
+        "latency_s": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": round(max(latencies), 4) if latencies else None,
+        },
+        "wall_s": round(wall_s, 3),
+        "runs_per_minute": round(len(records) / wall_s * 60, 2) if wall_s > 0 else None,
+        "pool": pool_stats,
+    }
+
+
+def _run_job(job: Dict[str, Any], plan_fn: Callable, run_fn: Callable, is_valid_plan: Callable, ctx=None) -> Dict[str, Any]:
+    record = {"id": job["id"], "line": job["line"], "goal": job.get("goal"), "status": "ok",
+              "final_answer": None, "steps": [], "planning_s": 0.0, "execution_s": 0.0}
+    started = time.perf_counter()
+    try:
+        if job.get("error"):
+            record["status"], record["error"] = "invalid_input", job["error"]
+            return record
+        plan = job.get("plan")
+        if plan is None:
+            if not job.get("goal"):
+                record["status"], record["error"] = "invalid_input", "Line has neither 'goal' nor 'plan'."
+                return record
+            plan = plan_fn(job["goal"])
+            record["planning_s"] = round(time.perf_counter() - started, 4)
+        if not is_valid_plan(plan):
+            record["status"], record["error"] = "plan_failed", "No valid plan with a 'steps' list."
+            return record
+        execution_started = time.perf_counter()
+        result = run_fn(plan["steps"], ctx, goal=job.get("goal"))
+        record["execution_s"] = round(time.perf_counter() - execution_started, 4)
+        record["final_answer"] = result.get("final_answer")
+        record["steps"] = result.get("steps", [])
+        if result.get("plan_errors"):
+            record["status"], record["error"] = "invalid_plan", "; ".join(result["plan_errors"])
+        elif result.get("abort"):
+            record["status"], record["error"], record["abort"] = "aborted", result["abort"]["message"], result["abort"]
+        elif result.get("halted"):
+            record["status"] = "halted"
+        elif record["final_answer"] is None:
+            record["status"] = "no_answer"
+    except Exception as e:
+        record["status"], record["error"] = "error", f"{type(e).__name__}: {e}"
+    finally:
+        record["total_s"] = round(time.perf_counter() - started, 4)
+    return record
+
+
+def run_batch(input_path: str, output_path: str, pool, plan_fn: Callable, run_fn: Callable,
+              is_valid_plan: Callable, summary_path: Optional[str] = None) -> Dict[str, Any]:
+    records: List[Dict[str, Any]] = []
+    write_lock = threading.Lock()
+    capacity = pool.size * MAX_IN_FLIGHT_PER_WORKER
+    in_flight = threading.BoundedSemaphore(capacity)
+    started = time.perf_counter()
+
+    with open(output_path, "w", encoding="utf-8") as out:
+        def on_done(future):
+            try:
+                record = future.result()
+            except Exception as e:
+                record = {"status": "error", "error": f"{type(e).__name__}: {e}", "steps": [], "total_s": None}
+            with write_lock:
+                records.append(record)
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                print(f"DEBUG: [{len(records)}] {record.get('id')} -> {record['status']} in {record.get('total_s')}s")
+            in_flight.release()
+
+        for job in iter_jobs(input_path):
+            in_flight.acquire()
+            pool.submit(_run_job, job, plan_fn, run_fn, is_valid_plan).add_done_callback(on_done)
+        # Every slot is released by on_done after its record is written, so
+        # reclaiming all of them means the output file is complete.
+        for _ in range(capacity):
+            in_flight.acquire()
+
+    summary = summarize(records, time.perf_counter() - started, pool.stats())
+    summary_path = summary_path or f"{output_path}.summary.json"
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    print(f"Batch finished: {summary['succeeded']}/{summary['runs']} succeeded, p50={summary['latency_s']['p50']}s "
+          f"p95={summary['latency_s']['p95']}s p99={summary['latency_s']['p99']}s, {summary['runs_per_minute']} runs/min.")
+    print(f"Results written to '{output_path}', summary to '{summary_path}'.")
+    return summary
@@ -0,0 +1,854 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+from plan_compiler import compile_condition, compile_path, compile_plan, compile_template
+
+# --- Configuration ---
+DEFAULT_ITERATIONS = 20000
+DEFAULT_E2E_RUNS = 10
+DEFAULT_MODEL_LATENCY_S = 0.05
+DEFAULT_MODEL_LATENCY_PER_IMAGE_KIB_S = 0.01
+DEFAULT_RESULTS_DIR = "bench_results"
+DEFAULT_MODEL_CLIENT_CALLS = 200
+DEFAULT_MODEL_FAILURE_RATE = 0.1  # fraction of fake-server requests answered with HTTP 429
+DEFAULT_MODEL_SLOW_RATE = 0.05  # fraction answered after DEFAULT_MODEL_SLOW_LATENCY_S
+DEFAULT_MODEL_SLOW_LATENCY_S = 1.0
+
+_SAMPLE_CONTEXT = {
+    "search_term": "iphone 13",
+    "results": [{"title": "iPhone 13 128GB", "price": "59999"}, {"title": "iPhone 13 256GB", "price": "69999"}],
+    "attempts": "2",
+    "homepage_elements": {1: {"number": 1, "description": "Search input", "box": [10, 10, 200, 40]}},
+}
+_SAMPLE_PATH = "results[1].price"
+_SAMPLE_TEMPLATE = "The cheapest {search_term} is {results[0].title} at {results[0].price} (tried {attempts} times)."
+_SAMPLE_CONDITION = "{{attempts}} < 3 && {{results}}.length >= 2"
+_SAMPLE_PLAN = [
+    {"action": "OPEN_BROWSER", "data": {"browser": "chrome"}},
+    {"action": "NAVIGATE_TO_URL", "data": {"url": "https://www.flipkart.com/search?q={search_term}"}},
+    {"action": "LABEL_AND_READ_SCREEN", "data": {"context_key_to_store_labels": "homepage_elements"}},
+    {"action": "TYPE_INTO_ELEMENT", "data": {"text": "{search_term}", "locator": {"type": "label_number", "value": 1, "context_source": "homepage_elements"}, "submit_after_typing": True}},
+    {"action": "READ_SCREEN", "data": {"prompt_for_vision": "List the results", "context_key_to_store": "results"}},
+    {"action": "CONDITIONAL_JUMP", "data": {"condition": _SAMPLE_CONDITION, "goto_step": 5}},
+    {"action": "ANSWER_USER", "data": {"response_template": _SAMPLE_TEMPLATE}},
+]
+
+
+def _time_per_call(fn: Callable[[], Any], iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations
+
+
+def bench_plan_eval(iterations: int = DEFAULT_ITERATIONS) -> Dict[str, Any]:
+    # "reparse" compiles on every call (what the executor used to do with its
+    # per-call regexes), "cached" goes through the compile cache the executor
+    # uses now, and "precompiled" calls the compiled object directly.
+    context = _SAMPLE_CONTEXT
+    path, template, condition = compile_path(_SAMPLE_PATH), compile_template(_SAMPLE_TEMPLATE), compile_condition(_SAMPLE_CONDITION)
+    cases = {
+        "path": (
+            lambda: compile_path.__wrapped__(_SAMPLE_PATH).resolve(context),
+            lambda: compile_path(_SAMPLE_PATH).resolve(context),
+            lambda: path.resolve(context),
+        ),
+        "template": (
+            lambda: compile_template.__wrapped__(_SAMPLE_TEMPLATE).render(context),
+            lambda: compile_template(_SAMPLE_TEMPLATE).render(context),
+            lambda: template.render(context),
+        ),
+        "condition": (
+            lambda: compile_condition.__wrapped__(_SAMPLE_CONDITION).evaluate(context),
+            lambda: compile_condition(_SAMPLE_CONDITION).evaluate(context),
+            lambda: condition.evaluate(context),
+        ),
+    }
+    results: Dict[str, Any] = {"iterations": iterations}
+    for name, (reparse, cached, precompiled) in cases.items():
+        reparse_s = _time_per_call(reparse, iterations)
+        cached_s = _time_per_call(cached, iterations)
+        precompiled_s = _time_per_call(precompiled, iterations)
+        results[name] = {
+            "reparse_us": round(reparse_s * 1e6, 3),
+            "cached_us": round(cached_s * 1e6, 3),
+            "precompiled_us": round(precompiled_s * 1e6, 3),
+            "speedup": round(reparse_s / precompiled_s, 1) if precompiled_s else None,
+        }
+    compile_iterations = max(1, iterations // 20)
+    results["compile_plan_us"] = round(_time_per_call(lambda: compile_plan(_SAMPLE_PLAN), compile_iterations) * 1e6, 3)
+    return results
+
+
+_E2E_GOAL = "find the cheapest phone on the fixture store"
+_E2E_READ_PROMPT = "Which product in the results is the cheapest phone, and what is its price?"
+_E2E_CHEAPEST_ANSWER = "Fixture Phone 128GB at 59999"
+
+
+def _e2e_plan(start_url: str) -> Dict[str, Any]:
+    return {"steps": [
+        {"action": "OPEN_BROWSER", "data": {"browser": "chrome"}},
+        {"action": "NAVIGATE_TO_URL", "data": {"url": start_url}},
+        {"action": "LABEL_AND_READ_SCREEN", "data": {"context_key_to_store_labels": "home_elements"}},
+        {"action": "TYPE_INTO_ELEMENT", "data": {"text": "phone", "locator": {"type": "label_number", "value": 3, "context_source": "home_elements"}, "submit_after_typing": True}},
+        {"action": "READ_SCREEN", "data": {"prompt_for_vision": _E2E_READ_PROMPT, "context_key_to_store": "cheapest"}},
+        {"action": "CONDITIONAL_JUMP", "data": {"condition": "{{cheapest}} == ''", "goto_step": 5}},
+        {"action": "CLICK_ELEMENT", "data": {"locator": {"type": "link_text", "value": "Fixture Phone 128GB"}}},
+        {"action": "ANSWER_USER", "data": {"response_template": "The cheapest phone is {cheapest}."}},
+    ]}
+
+
+def _percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    from batch_runner import percentile
+    return {"p50": percentile(values, 50), "p95": percentile(values, 95), "max": round(max(values), 4) if values else None}
+
+
+def _unthrottled_model_client():
+    # The fake models have no quota, and the real per-model rate limits would
+    # turn repeated runs into a measurement of the token bucket.
+    from model_client import ModelClient
+    return ModelClient(rate_limits_rpm={}, default_rpm=1_000_000, burst=1000)
+
+
+def _model_ms_in_step(step_span, spans) -> float:
+    # Model time overlapping the step, including calls a prefetch thread made
+    # on its behalf, so the executor's own per-action overhead can be separated
+    # from (fake) model latency.
+    overlap_ns = 0
+    for span in spans:
+        if span.name != "vision.call": continue
+        overlap_ns += max(0, min(span.end_ns, step_span.end_ns) - max(span.start_ns, step_span.start_ns))
+    return overlap_ns / 1e6
+
+
+def bench_e2e(runs: int = DEFAULT_E2E_RUNS, model_latency_s: float = DEFAULT_MODEL_LATENCY_S,
+              driver: str = "fake", with_caches: bool = False, stream_plan: bool = False) -> Dict[str, Any]:
+    # Plan-to-answer runs against the local fixture site with scripted models:
+    # no API key, no network beyond localhost and, with driver="fake", no Chrome.
+    import main
+    main.model_client = _unthrottled_model_client()
+    from fake_backends import FakeGenerativeModel, FakeWebDriver, FixtureServer, make_labeling_responder
+    from tracing import tracer
+
+    main.PLAN_CACHE_ENABLED = main.VISION_CACHE_ENABLED = main.SKILL_CACHE_ENABLED = with_caches
+    if with_caches:
+        from plan_cache import PlanCache
+        main.skill_cache = PlanCache(path=None)  # a skill recorded by another benchmark points at another fixture port
+    main.gemini_api_key = main.gemini_api_key or "offline-benchmark"
+    latencies, planning, execution, peaks = [], [], [], []
+    overhead_ms: Dict[str, List[float]] = {}
+    answers_ok = 0
+    with FixtureServer() as server:
+        plan_text = json.dumps(_e2e_plan(server.url("index.html")))
+        planning_model = FakeGenerativeModel([("USER'S GOAL", plan_text)], latency_s=model_latency_s, model_name="fake-planner")
+        vision_models = []
+
+        def run_once():
+            ctx = main.ExecutionContext(driver=FakeWebDriver() if driver == "fake" else None, headless=True, name="bench")
+            ctx.vision_model = FakeGenerativeModel([
+                ("interactive elements", make_labeling_responder(lambda: ctx.driver)),
+                (_E2E_READ_PROMPT, _E2E_CHEAPEST_ANSWER),
+            ], latency_s=model_latency_s, model_name="fake-vision")
+            vision_models.append(ctx.vision_model)
+            main.planning_model = planning_model
+            started = time.perf_counter()
+            if stream_plan:
+                # Execution starts with the first streamed step; "planning" is
+                # the time until that step arrived.
+                plan = main.get_gemini_plan_stream(_E2E_GOAL)
+                result = main.run_plan(plan, ctx)
+                planned = started + (plan.stats()["first_step_s"] or 0.0)
+            else:
+                plan = main.get_gemini_plan(_E2E_GOAL)
+                planned = time.perf_counter()
+                result = main.run_plan(plan["steps"], ctx)
+            finished = time.perf_counter()
+            main.close_context(ctx)
+            return result, started, planned, finished
+
+        for _ in range(runs):
+            tracer.clear()
+            result, started, planned, finished = run_once()
+            latencies.append(finished - started)
+            planning.append(planned - started)
+            execution.append(finished - planned)
+            answers_ok += result.get("final_answer") == f"The cheapest phone is {_E2E_CHEAPEST_ANSWER}."
+            spans = tracer.spans()
+            for span in spans:
+                if span.name == "step":
+                    overhead_ms.setdefault(span.attributes.get("action"), []).append(span.duration_ms - _model_ms_in_step(span, spans))
+
+        # Memory gets its own pass: tracemalloc slows allocation-heavy code
+        # (PIL, JSON) enough to distort the timings above.
+        tracemalloc.start()
+        for _ in range(runs):
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+            run_once()
+            peaks.append((tracemalloc.get_traced_memory()[1] - baseline) / 1024)
+        tracemalloc.stop()
+        tracer.clear()
+        main.overlay_renderer.flush(timeout=30)
+
+    return {
+        "runs": runs,
+        "driver": driver,
+        "model_latency_s": model_latency_s,
+        "with_caches": with_caches,
+        "stream_plan": stream_plan,
+        "correct_answers": answers_ok,
+        "plan_to_answer_s": _percentiles(latencies),
+        "planning_s": _percentiles(planning),
+        "execution_s": _percentiles(execution),
+        "per_action_overhead_ms": {action: _percentiles(values) for action, values in overhead_ms.items()},
+        "peak_memory_kib_per_run": _percentiles(peaks),
+        "planning_calls_per_run": round(len(planning_model.calls) / len(vision_models), 2),
+        "vision_calls_per_run": round(sum(len(model.calls) for model in vision_models) / len(vision_models), 2),
+        "overlays": main.overlay_renderer.stats(),
+        "vision_upload_bytes_per_run": round(sum(model.stats()["image_bytes"] for model in vision_models) / len(vision_models)),
+    }
+
+
+def bench_relabel(runs: int = DEFAULT_E2E_RUNS, model_latency_s: float = DEFAULT_MODEL_LATENCY_S,
+                  latency_per_image_kib_s: float = DEFAULT_MODEL_LATENCY_PER_IMAGE_KIB_S) -> Dict[str, Any]:
+    # Label a page, type into its search box, label it again: the follow-up
+    # look with region diffing on versus a full relabel.
+    import main
+    main.model_client = _unthrottled_model_client()
+    from fake_backends import FakeGenerativeModel, FakeWebDriver, FixtureServer, make_labeling_responder
+    from tracing import tracer
+
+    main.VISION_CACHE_ENABLED = False
+    results: Dict[str, Any] = {"runs": runs, "model_latency_s": model_latency_s, "latency_per_image_kib_s": latency_per_image_kib_s}
+    with FixtureServer() as server:
+        plan = [
+            {"action": "NAVIGATE_TO_URL", "data": {"url": server.url("index.html")}},
+            {"action": "LABEL_AND_READ_SCREEN", "data": {"context_key_to_store_labels": "home_elements"}},
+            {"action": "TYPE_INTO_ELEMENT", "data": {"text": "phone", "locator": {"type": "label_number", "value": 3, "context_source": "home_elements"}}},
+            {"action": "LABEL_AND_READ_SCREEN", "data": {"context_key_to_store_labels": "home_elements"}},
+        ]
+        for mode, enabled in (("full", False), ("incremental", True)):
+            main.REGION_DIFF_ENABLED = enabled
+            relabel_ms, vision_ms, upload_bytes = [], [], []
+            for _ in range(runs):
+                ctx = main.ExecutionContext(driver=FakeWebDriver(), name="bench")
+                ctx.vision_model = FakeGenerativeModel([("interactive elements", make_labeling_responder(lambda: ctx.driver))],
+                                                       latency_s=model_latency_s, latency_per_image_kib_s=latency_per_image_kib_s)
+                tracer.clear()
+                main.run_plan(plan, ctx)
+                main.close_context(ctx)
+                step_spans = [span for span in tracer.spans() if span.name == "step" and span.attributes.get("index") == 4]
+                relabel_ms.extend(span.duration_ms for span in step_spans)
+                vision_ms.extend(_model_ms_in_step(span, tracer.spans()) for span in step_spans)
+                upload_bytes.append(ctx.vision_model.calls[-1]["image_bytes"] if len(ctx.vision_model.calls) > 1 else 0)
+            results[mode] = {"relabel_step_ms": _percentiles(relabel_ms), "relabel_vision_ms": _percentiles(vision_ms),
+                             "relabel_upload_bytes": _percentiles(upload_bytes)}
+        main.REGION_DIFF_ENABLED = True
+    full, incremental = results["full"], results["incremental"]
+    if incremental["relabel_upload_bytes"]["p50"]:
+        results["upload_reduction"] = round(full["relabel_upload_bytes"]["p50"] / incremental["relabel_upload_bytes"]["p50"], 1)
+    return results
+
+
+def bench_model_client(calls: int = DEFAULT_MODEL_CLIENT_CALLS, model_latency_s: float = DEFAULT_MODEL_LATENCY_S,
+                       failure_rate: float = DEFAULT_MODEL_FAILURE_RATE, slow_rate: float = DEFAULT_MODEL_SLOW_RATE,
+                       slow_latency_s: float = DEFAULT_MODEL_SLOW_LATENCY_S) -> Dict[str, Any]:
+    # The same sequence of calls against a local fake Gemini endpoint that
+    # answers some requests with 429 and some slowly: plain generate_content
+    # versus the shared ModelClient (retries, backoff, hedging).
+    from fake_backends import FakeModelServer, HttpGenerativeModel
+    from batch_runner import percentile
+    from model_client import ModelClient
+
+    results: Dict[str, Any] = {"calls": calls, "model_latency_s": model_latency_s, "failure_rate": failure_rate,
+                               "slow_rate": slow_rate, "slow_latency_s": slow_latency_s}
+    for mode in ("direct", "client"):
+        client = ModelClient(backoff_base_s=model_latency_s, rate_limits_rpm={}, default_rpm=60000, burst=100, seed=1)
+        latencies_ms, failures = [], 0
+        with FakeModelServer(text="ok", latency_s=model_latency_s, failure_rate=failure_rate, slow_rate=slow_rate,
+                             slow_latency_s=slow_latency_s, seed=1) as server:
+            model = HttpGenerativeModel(server.url)
+            for _ in range(calls):
+                started = time.perf_counter()
+                try:
+                    if mode == "direct":
+                        model.generate_content("ping")
+                    else:
+                        client.generate(model, "fake-model", "ping", deadline_s=10 * slow_latency_s)
+                except Exception:  # ModelCallError, or whatever the fake server raised directly
+                    failures += 1
+                    continue
+                latencies_ms.append((time.perf_counter() - started) * 1000)
+            requests = server.requests
+        results[mode] = {"success_rate": round(1 - failures / calls, 3),
+                         "latency_ms": dict(_percentiles(latencies_ms), p99=percentile(latencies_ms, 99)),
+                         "server_requests": requests}
+        if mode == "client":
+            stats = client.stats()["fake-model"]
+            results[mode].update(retries=stats["retries"], hedges=stats["hedges"], hedge_wins=stats["hedge_wins"])
+    return results
+
+
+# What one cold CLI invocation does, run in a fresh interpreter: import the
+# agent, configure the models, start the browser, plan and execute one goal.
+_COLD_RUN_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import main
+from fake_backends import FakeGenerativeModel, FakeWebDriver, make_labeling_responder
+args = json.loads(sys.argv[1])
+main.PLAN_CACHE_ENABLED = main.VISION_CACHE_ENABLED = main.SKILL_CACHE_ENABLED = False
+main.gemini_api_key = "offline-benchmark"
+main.model_client = main.ModelClient(rate_limits_rpm={}, default_rpm=1_000_000, burst=1000)
+main.planning_model = FakeGenerativeModel([("USER'S GOAL", args["plan_text"])], latency_s=args["latency"])
+ctx = main.ExecutionContext(driver=FakeWebDriver() if args["driver"] == "fake" else main.create_chrome_driver(headless=True), headless=True, name="cold")
+ctx.vision_model = FakeGenerativeModel([("interactive elements", make_labeling_responder(lambda: ctx.driver)),
+                                        (args["read_prompt"], args["answer"])], latency_s=args["latency"])
+result = main.run_plan(main.get_gemini_plan(args["goal"])["steps"], ctx)
+main.close_context(ctx)
+main.overlay_renderer.shutdown()
+print("COLD_RESULT " + json.dumps({"total_s": time.perf_counter() - started, "final_answer": result["final_answer"]}))
+"""
+
+
+def bench_daemon(runs: int = DEFAULT_E2E_RUNS, model_latency_s: float = DEFAULT_MODEL_LATENCY_S, driver: str = "fake") -> Dict[str, Any]:
+    # The e2e goal as a cold CLI run (fresh interpreter, imports, browser
+    # start; measured from interpreter launch) versus a request to a daemon
+    # that already has all of that resident.
+    import main
+    main.model_client = _unthrottled_model_client()
+    from daemon import run_remote
+    from fake_backends import FakeGenerativeModel, FakeWebDriver, FixtureServer, make_labeling_responder
+
+    main.PLAN_CACHE_ENABLED = main.VISION_CACHE_ENABLED = main.SKILL_CACHE_ENABLED = False
+    main.gemini_api_key = main.gemini_api_key or "offline-benchmark"
+    expected = f"The cheapest phone is {_E2E_CHEAPEST_ANSWER}."
+    results: Dict[str, Any] = {"runs": runs, "driver": driver, "model_latency_s": model_latency_s}
+    with FixtureServer() as server:
+        plan_text = json.dumps(_e2e_plan(server.url("index.html")))
+        cold_s, cold_ok = [], 0
+        cold_args = json.dumps({"plan_text": plan_text, "latency": model_latency_s, "driver": driver, "goal": _E2E_GOAL,
+                                "read_prompt": _E2E_READ_PROMPT, "answer": _E2E_CHEAPEST_ANSWER})
+        repo_dir = os.path.dirname(os.path.abspath(__file__))
+        for _ in range(runs):
+            started = time.perf_counter()
+            completed = subprocess.run([sys.executable, "-W", "ignore", "-c", _COLD_RUN_SCRIPT, cold_args], capture_output=True,
+                                       text=True, cwd=os.getcwd(), env=dict(os.environ, PYTHONPATH=repo_dir))
+            cold_s.append(time.perf_counter() - started)
+            line = next((l for l in completed.stdout.splitlines() if l.startswith("COLD_RESULT ")), None)
+            cold_ok += line is not None and json.loads(line[len("COLD_RESULT "):])["final_answer"] == expected
+
+        def context_factory():
+            ctx = main.ExecutionContext(driver=FakeWebDriver() if driver == "fake" else main.create_chrome_driver(headless=True),
+                                        headless=True, name="daemon")
+            ctx.vision_model = FakeGenerativeModel([
+                ("interactive elements", make_labeling_responder(lambda: ctx.driver)),
+                (_E2E_READ_PROMPT, _E2E_CHEAPEST_ANSWER),
+            ], latency_s=model_latency_s, model_name="fake-vision")
+            return ctx
+
+        main.planning_model = FakeGenerativeModel([("USER'S GOAL", plan_text)], latency_s=model_latency_s, model_name="fake-planner")
+        daemon = main.create_daemon(port=0, context_factory=context_factory).start()
+        daemon.serve_in_background()
+        warm_s, first_event_s, warm_ok = [], [], 0
+        try:
+            for _ in range(runs):
+                started = time.perf_counter()
+                first_event = []
+                final = run_remote(goal=_E2E_GOAL, port=daemon.port,
+                                   on_event=lambda event: first_event or event["event"] != "step" or first_event.append(time.perf_counter()))
+                warm_s.append(time.perf_counter() - started)
+                if first_event:
+                    first_event_s.append(first_event[0] - started)
+                warm_ok += final["event"] == "result" and final["result"]["final_answer"] == expected
+            results["daemon"] = daemon.stats()
+        finally:
+            daemon.stop()
+        main.overlay_renderer.flush(timeout=30)
+    results["cold"] = {"correct_answers": cold_ok, "latency_s": _percentiles(cold_s)}
+    results["warm"] = {"correct_answers": warm_ok, "latency_s": _percentiles(warm_s), "first_step_event_s": _percentiles(first_event_s)}
+    if results["warm"]["latency_s"]["p50"]:
+        results["cold_to_warm_speedup"] = round(results["cold"]["latency_s"]["p50"] / results["warm"]["latency_s"]["p50"], 1)
+    return results
+
+
+def bench_parallel(runs: int = DEFAULT_E2E_RUNS, model_latency_s: float = DEFAULT_MODEL_LATENCY_S, sites: int = 3) -> Dict[str, Any]:
+    # A "compare prices across sites" plan: the same per-site steps run one
+    # after another versus as PARALLEL branches, each in its own fake session,
+    # with the two reads per site batched and (for comparison) unbatched.
+    import main
+    main.model_client = _unthrottled_model_client()
+    from fake_backends import FakeGenerativeModel, FakeWebDriver, FixtureServer, make_batch_responder
+    from read_batch import read_batch_stats
+
+    main.VISION_CACHE_ENABLED = False
+    prices = {1: "59999", 2: "69999", 3: "49999"}
+    results: Dict[str, Any] = {"runs": runs, "sites": sites, "model_latency_s": model_latency_s}
+    with FixtureServer() as server:
+        def site_steps(n: int) -> List[Dict[str, Any]]:
+            product = (n - 1) % 3 + 1
+            return [
+                {"action": "NAVIGATE_TO_URL", "data": {"url": server.url(f"product-{product}.html")}},
+                {"action": "READ_SCREEN", "data": {"prompt_for_vision": f"What is the price on site {n}?", "context_key_to_store": f"price_{n}"}},
+                {"action": "READ_SCREEN", "data": {"prompt_for_vision": f"Is the item on site {n} in stock?", "context_key_to_store": f"stock_{n}"}},
+            ]
+
+        answer = {"action": "ANSWER_USER", "data": {"response_template": " / ".join(f"{{price_{n}}}" for n in range(1, sites + 1))}}
+        plans = {
+            "sequential": [step for n in range(1, sites + 1) for step in site_steps(n)] + [answer],
+            "parallel": [{"action": "PARALLEL", "data": {"branches": [{"name": f"site-{n}", "steps": site_steps(n)} for n in range(1, sites + 1)]}}, answer],
+        }
+        expected = " / ".join(prices[(n - 1) % 3 + 1] for n in range(1, sites + 1))
+        rules = [(f"price on site {n}?", prices[(n - 1) % 3 + 1]) for n in range(1, sites + 1)] + [("in stock", "yes")]
+        # The batch rule comes first: a batched prompt quotes every question,
+        # so the per-question rules would otherwise match it too.
+        rules = [("question ids", make_batch_responder(rules))] + rules
+        for batched in (True, False):
+            main.READ_BATCH_ENABLED = batched
+            for plan_name, plan in plans.items():
+                mode = plan_name if batched else f"{plan_name}_unbatched"
+                latencies, correct = [], 0
+                ctx = main.ExecutionContext(driver=FakeWebDriver(), driver_factory=FakeWebDriver, name="bench")
+                # Branch contexts share the parent's model, so its call log covers them too.
+                ctx.vision_model = FakeGenerativeModel(rules, latency_s=model_latency_s, model_name="fake-vision")
+                stats_before = read_batch_stats()
+                for _ in range(runs):
+                    started = time.perf_counter()
+                    result = main.run_plan(plan, ctx)
+                    latencies.append(time.perf_counter() - started)
+                    correct += result["final_answer"] == expected
+                main.close_context(ctx)
+                stats_after = read_batch_stats()
+                results[mode] = {"correct_answers": correct, "plan_s": _percentiles(latencies),
+                                 "vision_calls_per_run": round(len(ctx.vision_model.calls) / runs, 2),
+                                 "batch_stats": {key: stats_after[key] - stats_before[key] for key in stats_after}}
+        main.READ_BATCH_ENABLED = True
+    if results["parallel"]["plan_s"]["p50"]:
+        results["speedup"] = round(results["sequential"]["plan_s"]["p50"] / results["parallel"]["plan_s"]["p50"], 2)
+        results["speedup_vs_unbatched_sequential"] = round(results["sequential_unbatched"]["plan_s"]["p50"] / results["parallel"]["plan_s"]["p50"], 2)
+    return results
+
+
+def bench_read_batch(runs: int = DEFAULT_E2E_RUNS, model_latency_s: float = DEFAULT_MODEL_LATENCY_S) -> Dict[str, Any]:
+    # Three READ_SCREEN steps in a row on a product page: one vision call per
+    # step versus one batched call for all three.
+    import main
+    from fake_backends import FakeGenerativeModel, FakeWebDriver, FixtureServer, make_batch_responder
+    from read_batch import read_batch_stats
+
+    main.VISION_CACHE_ENABLED = False
+    facts = {"What is the product name?": "Fixture Phone 128GB", "What is the price?": "59999", "Is it in stock?": "yes"}
+
+    results: Dict[str, Any] = {"runs": runs, "model_latency_s": model_latency_s, "questions": len(facts)}
+    with FixtureServer() as server:
+        plan = [{"action": "NAVIGATE_TO_URL", "data": {"url": server.url("product-1.html")}}]
+        plan += [{"action": "READ_SCREEN", "data": {"prompt_for_vision": question, "context_key_to_store": f"fact_{n}"}}
+                 for n, question in enumerate(facts, 1)]
+        plan.append({"action": "ANSWER_USER", "data": {"response_template": "{fact_1} costs {fact_2} (in stock: {fact_3})"}})
+        expected = "Fixture Phone 128GB costs 59999 (in stock: yes)"
+        for mode, enabled in (("separate", False), ("batched", True)):
+            main.READ_BATCH_ENABLED = enabled
+            latencies, correct, vision_calls = [], 0, 0
+            for _ in range(runs):
+                ctx = main.ExecutionContext(driver=FakeWebDriver(), name="bench")
+                ctx.vision_model = FakeGenerativeModel([("question ids", make_batch_responder(list(facts.items())))] + list(facts.items()),
+                                                       latency_s=model_latency_s, model_name="fake-vision")
+                started = time.perf_counter()
+                result = main.run_plan(plan, ctx)
+                latencies.append(time.perf_counter() - started)
+                correct += result["final_answer"] == expected
+                vision_calls += len(ctx.vision_model.calls)
+                main.close_context(ctx)
+            results[mode] = {"correct_answers": correct, "plan_s": _percentiles(latencies), "vision_calls_per_run": round(vision_calls / runs, 2)}
+        main.READ_BATCH_ENABLED = True
+    results["batch_stats"] = read_batch_stats()
+    return results
+
+
+def bench_page_text(runs: int = DEFAULT_E2E_RUNS, model_latency_s: float = DEFAULT_MODEL_LATENCY_S) -> Dict[str, Any]:
+    # Three facts from a long help page, read from a screenshot (one batched
+    # vision call) versus from the page text index (no model call), plus a
+    # SCROLL_PAGE_TO_TEXT with a misspelt heading.
+    import main
+    from fake_backends import FakeGenerativeModel, FakeWebDriver, FixtureServer, make_batch_responder
+    from page_text import page_text_stats
+
+    main.VISION_CACHE_ENABLED = False
+    facts = [("Return window", "How long is the return window?", "30 days from delivery"),
+             ("Warranty period", "How long is the warranty?", "12 months"),
+             ("Support email", "What is the support email address?", "help@fixture.example")]
+    vision_answers = {question: answer for _, question, answer in facts}
+
+    results: Dict[str, Any] = {"runs": runs, "model_latency_s": model_latency_s, "questions": len(facts)}
+    with FixtureServer() as server:
+        expected = "Returns: 30 days from delivery, warranty: 12 months, email: help@fixture.example"
+        for mode in ("vision", "text"):
+            plan = [{"action": "NAVIGATE_TO_URL", "data": {"url": server.url("guide.html")}},
+                    {"action": "SCROLL_PAGE_TO_TEXT", "data": {"text_to_find": "Makng a clam"}}]
+            for n, (query, question, _) in enumerate(facts, 1):
+                data = {"prompt_for_vision": question, "context_key_to_store": f"fact_{n}"}
+                if mode == "text":
+                    data.update(read_mode="text", text_query=query)
+                plan.append({"action": "READ_SCREEN", "data": data})
+            plan.append({"action": "ANSWER_USER", "data": {"response_template": "Returns: {fact_1}, warranty: {fact_2}, email: {fact_3}"}})
+            latencies, correct, scrolled, vision_calls = [], 0, 0, 0
+            for _ in range(runs):
+                driver = FakeWebDriver()
+                ctx = main.ExecutionContext(driver=driver, name="bench")
+                ctx.vision_model = FakeGenerativeModel([("question ids", make_batch_responder(list(vision_answers.items())))] + list(vision_answers.items()),
+                                                       latency_s=model_latency_s, model_name="fake-vision")
+                started = time.perf_counter()
+                result = main.run_plan(plan, ctx)
+                latencies.append(time.perf_counter() - started)
+                correct += result["final_answer"] == expected
+                scrolled += any(node["text"] == "Making a claim" for node in driver._visible_nodes()) and driver.scroll_y > 0
+                vision_calls += len(ctx.vision_model.calls)
+                main.close_context(ctx)
+            results[mode] = {"correct_answers": correct, "scrolled_to_text": scrolled, "plan_s": _percentiles(latencies),
+                             "vision_calls_per_run": round(vision_calls / runs, 2)}
+    results["index_stats"] = page_text_stats()
+    return results
+
+
+def bench_skill_replay(runs: int = DEFAULT_E2E_RUNS, model_latency_s: float = DEFAULT_MODEL_LATENCY_S) -> Dict[str, Any]:
+    # The e2e goal planned and labeled on every run, versus replayed from the
+    # skill recorded by the first run, plus one replay whose recorded selector
+    # no longer exists (repaired by labeling that step only).
+    import main
+    main.model_client = _unthrottled_model_client()
+    from fake_backends import FakeGenerativeModel, FakeWebDriver, FixtureServer, make_labeling_responder
+    from plan_cache import PlanCache
+    from skill_cache import skill_stats
+
+    main.PLAN_CACHE_ENABLED = main.VISION_CACHE_ENABLED = False
+    main.gemini_api_key = main.gemini_api_key or "offline-benchmark"
+    main.skill_cache = PlanCache(path=None)
+    expected = f"The cheapest phone is {_E2E_CHEAPEST_ANSWER}."
+    results: Dict[str, Any] = {"runs": runs, "model_latency_s": model_latency_s}
+    with FixtureServer() as server:
+        planning_model = FakeGenerativeModel([("USER'S GOAL", json.dumps(_e2e_plan(server.url("index.html"))))],
+                                             latency_s=model_latency_s, model_name="fake-planner")
+        main.planning_model = planning_model
+
+        def run_once():
+            ctx = main.ExecutionContext(driver=FakeWebDriver(), headless=True, name="bench")
+            ctx.vision_model = FakeGenerativeModel([
+                ("interactive elements", make_labeling_responder(lambda: ctx.driver)),
+                (_E2E_READ_PROMPT, _E2E_CHEAPEST_ANSWER),
+            ], latency_s=model_latency_s, model_name="fake-vision")
+            planning_calls = len(planning_model.calls)
+            started = time.perf_counter()
+            plan = main.get_gemini_plan(_E2E_GOAL)
+            result = main.run_plan(plan["steps"], ctx, goal=_E2E_GOAL)
+            elapsed = time.perf_counter() - started
+            main.close_context(ctx)
+            return result, elapsed, len(planning_model.calls) - planning_calls, len(ctx.vision_model.calls)
+
+        def measure(count):
+            latencies, correct, planning_calls, vision_calls = [], 0, 0, 0
+            for _ in range(count):
+                result, elapsed, planned, vision = run_once()
+                latencies.append(elapsed)
+                correct += result["final_answer"] == expected
+                planning_calls += planned
+                vision_calls += vision
+            return {"correct_answers": correct, "plan_to_answer_s": _percentiles(latencies),
+                    "planning_calls_per_run": round(planning_calls / count, 2), "vision_calls_per_run": round(vision_calls / count, 2)}
+
+        main.SKILL_CACHE_ENABLED = False
+        results["planned"] = measure(runs)
+        main.SKILL_CACHE_ENABLED = True
+        results["recording_run"] = measure(1)
+        results["replayed"] = measure(runs)
+        goal_template = main.normalize_goal(_E2E_GOAL)[0]
+        entry = main.skill_cache.get(goal_template)
+        skill = json.loads(entry["response_text"])
+        for step in skill["steps"]:
+            if "replay" in step and "locator" in step["data"]:
+                step["data"]["locator"]["value"], step["replay"]["xpath"] = "#search-box-renamed", None
+        main.skill_cache.put(goal_template, json.dumps(skill), entry["params"])
+        results["diverged"] = measure(1)
+        results["after_patch"] = measure(1)
+    results["skill_stats"] = skill_stats()
+    return results
+
+
+def bench_browser_profile(runs: int = DEFAULT_E2E_RUNS, server_latency_s: float = 0.02) -> Dict[str, Any]:
+    # A media-heavy page opened with each browser profile: how long the
+    # navigation step takes, what was fetched and blocked, and the page's JS
+    # heap. Blocked requests are never fetched, so bytes saved is the
+    # difference from the default profile.
+    import main
+    from browser_profile import BROWSER_PROFILES, session_memory
+    from fake_backends import FakeWebDriver, FixtureServer
+
+    main.VISION_CACHE_ENABLED = False
+    results: Dict[str, Any] = {"runs": runs, "server_latency_s": server_latency_s}
+    with FixtureServer(latency_s=server_latency_s) as server:
+        for profile in BROWSER_PROFILES:
+            plan = [{"action": "OPEN_BROWSER", "data": {"browser": "chrome", "profile": profile}},
+                    {"action": "NAVIGATE_TO_URL", "data": {"url": server.url("media.html")}},
+                    {"action": "READ_SCREEN", "data": {"prompt_for_vision": "What is the price?", "context_key_to_store": "price",
+                                                       "read_mode": "text", "text_query": "Price"}},
+                    {"action": "ANSWER_USER", "data": {"response_template": "{price}"}}]
+            navigation, plan_s, correct, memory, network = [], [], 0, [], []
+            for _ in range(runs):
+                ctx = main.ExecutionContext(name="bench")
+                ctx.driver_factory = lambda ctx=ctx: FakeWebDriver(page_load_strategy=ctx.browser_profile.page_load_strategy)
+                started = time.perf_counter()
+                result = main.run_plan(plan, ctx)
+                plan_s.append(time.perf_counter() - started)
+                navigation.append(result["steps"][1]["duration_s"])
+                correct += result["final_answer"] == "59999"
+                # Count what eager/none left loading in the background too.
+                while ctx.driver.ready_state != "complete":
+                    time.sleep(0.01)
+                ctx.network_log.drain(ctx.driver, "background", None, ctx.browser_profile)
+                memory.append(session_memory(ctx.driver))
+                network.append(ctx.network_log.summary())
+                main.close_context(ctx)
+            results[profile] = {
+                "correct_answers": correct,
+                "navigate_s": _percentiles(navigation),
+                "plan_s": _percentiles(plan_s),
+                "requests_per_run": round(sum(n["requests"] for n in network) / runs, 2),
+                "blocked_per_run": round(sum(n["blocked"] for n in network) / runs, 2),
+                "blocked_by_class": network[-1]["blocked_by_class"],
+                "bytes_loaded_per_run": round(sum(n["bytes_loaded"] for n in network) / runs),
+                "js_heap_bytes": round(sum(memory) / runs) if None not in memory else None,
+            }
+    for profile in BROWSER_PROFILES:
+        results[profile]["bytes_saved_per_run"] = results["default"]["bytes_loaded_per_run"] - results[profile]["bytes_loaded_per_run"]
+    return results
+
+
+def bench_screenshot(runs: int = DEFAULT_E2E_RUNS * 3) -> Dict[str, Any]:
+    # Capture plus encode per step with each screenshot backend, at device
+    # pixel ratios 1 and 2: "webdriver" moves a PNG out of the browser and
+    # re-encodes it here; "cdp" gets the upload-ready JPEG straight from
+    # Page.captureScreenshot. browser_bytes is what crossed the WebDriver
+    # connection (before base64), upload_bytes what the model receives.
+    # decoded_in_plan counts the screenshots a plan of reads and labelings
+    # (default settings, vision cache on) decoded in full outside the overlay
+    # renderer.
+    import main
+    from fake_backends import FakeWebDriver, FixtureServer
+
+    results: Dict[str, Any] = {"runs": runs}
+    with FixtureServer() as server:
+        for device_pixel_ratio in (1.0, 2.0):
+            by_backend: Dict[str, Any] = {}
+            for backend in ("webdriver", "cdp"):
+                main.SCREENSHOT_BACKEND = backend
+                driver = FakeWebDriver(device_pixel_ratio=device_pixel_ratio)
+                driver.get(server.url("guide.html"))
+                ctx = main.ExecutionContext(driver=driver, name="bench")
+                capture_ms, browser_bytes, upload_bytes, decoded = [], [], [], 0
+                for _ in range(runs):
+                    driver.mutations += 1  # a new frame each time, as after a step
+                    started = time.perf_counter()
+                    screenshot = main._capture_screenshot(ctx)
+                    capture_ms.append((time.perf_counter() - started) * 1000)
+                    browser_bytes.append(screenshot.original_bytes)
+                    upload_bytes.append(len(screenshot.data))
+                    decoded += screenshot.image_loaded
+                by_backend[backend] = {"capture_encode_ms": _percentiles(capture_ms), "size": list(screenshot.size),
+                                       "browser_bytes_per_step": round(sum(browser_bytes) / runs), "upload_bytes_per_step": round(sum(upload_bytes) / runs),
+                                       "decoded_on_executor": decoded}
+                if backend == "cdp":
+                    full_page = main._capture_screenshot(ctx, full_page=True)
+                    by_backend["cdp_full_page"] = {"size": list(full_page.size), "upload_bytes": len(full_page.data)}
+                main.close_context(ctx)
+                by_backend[backend]["decoded_in_plan"] = _screenshots_decoded_in_plan(server, device_pixel_ratio)
+            by_backend["browser_bytes_saved_per_step"] = by_backend["webdriver"]["browser_bytes_per_step"] - by_backend["cdp"]["browser_bytes_per_step"]
+            by_backend["upload_bytes_saved_per_step"] = by_backend["webdriver"]["upload_bytes_per_step"] - by_backend["cdp"]["upload_bytes_per_step"]
+            results[f"dpr_{device_pixel_ratio:g}"] = by_backend
+    main.SCREENSHOT_BACKEND = "cdp"
+    return results
+
+
+def _screenshots_decoded_in_plan(server, device_pixel_ratio: float) -> Dict[str, Any]:
+    # Reads, a batched read, two labelings and a relabel of the first key (the
+    # one step that needs the pixels, to diff it against the last labeling).
+    import main
+    from fake_backends import FakeGenerativeModel, FakeWebDriver, make_labeling_responder
+
+    plan = [{"action": "NAVIGATE_TO_URL", "data": {"url": server.url("index.html")}},
+            {"action": "READ_SCREEN", "data": {"prompt_for_vision": "What is the page title?", "context_key_to_store": "title"}},
+            {"action": "LABEL_AND_READ_SCREEN", "data": {"context_key_to_store_labels": "home"}},
+            {"action": "READ_SCREEN", "data": {"prompt_for_vision": "Is there a search box?", "context_key_to_store": "search"}},
+            {"action": "READ_SCREEN", "data": {"prompt_for_vision": "What is the page title?", "context_key_to_store": "title_again"}},
+            {"action": "LABEL_AND_READ_SCREEN", "data": {"context_key_to_store_labels": "home_again"}},
+            {"action": "LABEL_AND_READ_SCREEN", "data": {"context_key_to_store_labels": "home"}}]
+    driver = FakeWebDriver(device_pixel_ratio=device_pixel_ratio)
+    ctx = main.ExecutionContext(driver=driver, name="bench")
+    ctx.vision_model = FakeGenerativeModel([("interactive elements", make_labeling_responder(lambda: driver))], default_text="Fixture Shop")
+    captured, capture = [], main._capture_screenshot
+    main._capture_screenshot = lambda *args, **kwargs: captured.append(capture(*args, **kwargs)) or captured[-1]
+    try:
+        success = main.run_plan(plan, ctx)["success"]
+    finally:
+        main._capture_screenshot = capture
+        main.overlay_renderer.flush(timeout=30)
+        main.close_context(ctx)
+    return {"success": success, "steps": len(plan) - 1, "screenshots": len(captured), "decoded": sum(shot.image_loaded for shot in captured)}
+
+
+def bench_watchdog(runs: int = DEFAULT_E2E_RUNS, model_latency_s: float = DEFAULT_MODEL_LATENCY_S) -> Dict[str, Any]:
+    # Runaway plans on the fixture site and where the watchdog stops them: a
+    # retry loop whose answer never changes (loop detection), one whose answer
+    # changes every time (model-call budget), a scroll loop with loop
+    # detection off (step budget) and a vision call slower than the step
+    # deadline. Then the watchdog's cost on a plan that finishes normally.
+    import itertools
+    import main
+    main.model_client = _unthrottled_model_client()
+    from fake_backends import FakeGenerativeModel, FakeWebDriver, FixtureServer
+    from plan_watchdog import watchdog_stats
+
+    main.VISION_CACHE_ENABLED = False
+    defaults = (main.WATCHDOG_STEP_DEADLINE_S, main.WATCHDOG_MAX_STEPS, main.WATCHDOG_MAX_MODEL_CALLS, main.WATCHDOG_MAX_REPEATS, main.WATCHDOG_ENABLED)
+    results: Dict[str, Any] = {"model_latency_s": model_latency_s}
+    with FixtureServer() as server:
+        retry_loop = [{"action": "NAVIGATE_TO_URL", "data": {"url": server.url("guide.html")}},
+                      {"action": "READ_SCREEN", "data": {"prompt_for_vision": "Is the order status shown?", "context_key_to_store": "status"}},
+                      {"action": "CONDITIONAL_JUMP", "data": {"condition": "{{status}} != 'shipped'", "goto_step": 2}},
+                      {"action": "ANSWER_USER", "data": {"response_template": "Order {status}."}}]
+        scroll_loop = [{"action": "NAVIGATE_TO_URL", "data": {"url": server.url("guide.html")}},
+                       {"action": "SCROLL_PAGE_TO_TEXT", "data": {"text_to_find": "Tracking links"}},
+                       {"action": "CONDITIONAL_JUMP", "data": {"condition": "1 == 1", "goto_step": 2}}]
+        counter = itertools.count()
+        cases = {
+            "stuck_loop": (retry_loop, lambda parts: "not yet", {}),
+            "changing_loop": (retry_loop, lambda parts: f"not yet ({next(counter)})", {"WATCHDOG_MAX_MODEL_CALLS": 20}),
+            "step_budget": (scroll_loop, lambda parts: "", {"WATCHDOG_MAX_REPEATS": 10 ** 6, "WATCHDOG_MAX_STEPS": 50}),
+            "step_deadline": (retry_loop, lambda parts: "not yet", {"WATCHDOG_STEP_DEADLINE_S": 0.1, "model_latency_s": 0.5}),
+        }
+        for name, (plan, answer, overrides) in cases.items():
+            for key, value in overrides.items():
+                if key.startswith("WATCHDOG_"):
+                    setattr(main, key, value)
+            ctx = main.ExecutionContext(driver=FakeWebDriver(), name="bench")
+            ctx.vision_model = FakeGenerativeModel([("order status", answer)], latency_s=overrides.get("model_latency_s", model_latency_s))
+            started = time.perf_counter()
+            result = main.run_plan(plan, ctx)
+            abort = result.get("abort") or {}
+            results[name] = {"aborted": abort.get("reason"), "s_to_abort": round(time.perf_counter() - started, 3),
+                             "steps": len(result["steps"]), "model_calls": len(ctx.vision_model.calls),
+                             "slowest_step_s": result["watchdog"]["slowest_step_s"], "report": abort}
+            main.close_context(ctx)
+            (main.WATCHDOG_STEP_DEADLINE_S, main.WATCHDOG_MAX_STEPS, main.WATCHDOG_MAX_MODEL_CALLS, main.WATCHDOG_MAX_REPEATS,
+             main.WATCHDOG_ENABLED) = defaults
+
+        finishing = [{"action": "NAVIGATE_TO_URL", "data": {"url": server.url("guide.html")}},
+                     {"action": "SCROLL_PAGE_TO_TEXT", "data": {"text_to_find": "Warranty"}},
+                     {"action": "READ_SCREEN", "data": {"prompt_for_vision": "Warranty?", "context_key_to_store": "warranty",
+                                                        "read_mode": "text", "text_query": "Warranty period"}},
+                     {"action": "CONDITIONAL_JUMP", "data": {"condition": "{{warranty}} == ''", "goto_step": 3}},
+                     {"action": "ANSWER_USER", "data": {"response_template": "{warranty}"}}]
+        for enabled in (False, True):
+            main.WATCHDOG_ENABLED = enabled
+            latencies = []
+            for _ in range(runs):
+                ctx = main.ExecutionContext(driver=FakeWebDriver(), name="bench")
+                started = time.perf_counter()
+                main.run_plan(finishing, ctx)
+                latencies.append((time.perf_counter() - started) * 1000)
+                main.close_context(ctx)
+            results["watchdog_on" if enabled else "watchdog_off"] = {"plan_ms": _percentiles(latencies)}
+        main.WATCHDOG_ENABLED = defaults[4]
+    results["stats"] = watchdog_stats()
+    return results
+
+
+BENCHMARKS: Dict[str, Callable[[argparse.Namespace], Dict[str, Any]]] = {
+    "plan-eval": lambda args: bench_plan_eval(args.iterations),
+    "relabel": lambda args: bench_relabel(args.runs, args.model_latency),
+    "e2e": lambda args: bench_e2e(args.runs, args.model_latency, args.driver, args.with_caches, args.stream_plan),
+    "daemon": lambda args: bench_daemon(args.runs, args.model_latency, args.driver),
+    "parallel": lambda args: bench_parallel(args.runs, max(args.model_latency, 0.2)),
+    "read-batch": lambda args: bench_read_batch(args.runs, args.model_latency),
+    "page-text": lambda args: bench_page_text(args.runs, args.model_latency),
+    "skill-replay": lambda args: bench_skill_replay(args.runs, args.model_latency),
+    "browser-profile": lambda args: bench_browser_profile(args.runs),
+    "screenshot": lambda args: bench_screenshot(args.runs * 3),
+    "watchdog": lambda args: bench_watchdog(args.runs, args.model_latency),
+    "model-client": lambda args: bench_model_client(model_latency_s=args.model_latency),
+}
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _numeric_leaves(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    leaves = {}
+    for key, value in results.items():
+        path = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            leaves.update(_numeric_leaves(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            leaves[path] = value
+    return leaves
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    # Ratio current/baseline for every numeric metric both runs have; for
+    # timings and sizes anything above 1.0 is a regression.
+    old, new = _numeric_leaves(baseline.get("results", {})), _numeric_leaves(current.get("results", {}))
+    return {
+        path: {"baseline": old[path], "current": new[path], "ratio": round(new[path] / old[path], 3) if old[path] else None}
+        for path in sorted(old.keys() & new.keys())
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Micro and end-to-end benchmarks for the executor.")
+    parser.add_argument("benchmarks", nargs="*", default=list(BENCHMARKS), help=f"Which benchmarks to run: {', '.join(BENCHMARKS)}.")
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS, help="Iterations per micro-benchmark case.")
+    parser.add_argument("--runs", type=int, default=DEFAULT_E2E_RUNS, help="Plan-to-answer runs for e2e.")
+    parser.add_argument("--model-latency", type=float, default=DEFAULT_MODEL_LATENCY_S, help="Seconds each fake model call takes.")
+    parser.add_argument("--driver", choices=["fake", "chrome"], default="fake", help="Drive the fixture site with the fake WebDriver or headless Chrome.")
+    parser.add_argument("--with-caches", action="store_true", help="Keep the plan and vision caches on during e2e.")
+    parser.add_argument("--stream-plan", action="store_true", help="Stream the plan in e2e and start executing before it is complete.")
+    parser.add_argument("--output", help=f"Write the results as JSON to this path (default: {DEFAULT_RESULTS_DIR}/<commit>-<timestamp>.json).")
+    parser.add_argument("--compare", metavar="BASELINE", help="Print current/baseline ratios against an earlier results file.")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    all_results = {}
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            raise SystemExit(f"Unknown benchmark '{name}'. Choose from: {', '.join(BENCHMARKS)}.")
+        all_results[name] = BENCHMARKS[name](args)
+    commit = _git_commit()
+    report = {
+        "meta": {"commit": commit, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(), "platform": platform.platform()},
+        "results": all_results,
+    }
+    print(json.dumps(report, indent=2))
+    output_path = args.output
+    if not output_path:
+        os.makedirs(DEFAULT_RESULTS_DIR, exist_ok=True)
+        output_path = os.path.join(DEFAULT_RESULTS_DIR, f"{commit or 'local'}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to '{output_path}'.")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            comparison = compare_results(json.load(f), report)
+        for path, entry in comparison.items():
+            print(f"{path:<60} {entry['baseline']:>12} -> {entry['current']:>12}  x{entry['ratio']}")
@@ -0,0 +1,197 @@
+import fnmatch
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# --- Configuration ---
+BROWSER_WINDOW_SIZE = (1280, 800)
+PAGE_LOAD_STRATEGIES = ("normal", "eager", "none")
+# Chrome's URL-pattern syntax for Network.setBlockedURLs ("*" matches anything).
+# "third_party_scripts" can only be a list of known ad/analytics hosts and
+# script names: a pattern can't tell which origin is first-party.
+RESOURCE_CLASS_PATTERNS = {
+    "media": ["*.mp4*", "*.webm*", "*.m4v*", "*.mov*", "*.mp3*", "*.ogg*", "*.wav*", "*.m3u8*", "*.mpd*"],
+    "fonts": ["*.woff*", "*.ttf*", "*.otf*", "*.eot*"],
+    "images": ["*.png*", "*.jpg*", "*.jpeg*", "*.gif*", "*.webp*", "*.avif*", "*.ico*"],
+    "third_party_scripts": [
+        "*google-analytics.com/*", "*googletagmanager.com/*", "*doubleclick.net/*", "*googlesyndication.com/*",
+        "*googleadservices.com/*", "*connect.facebook.net/*", "*hotjar.com/*", "*cdn.segment.com/*",
+        "*scorecardresearch.com/*", "*clarity.ms/*", "*/analytics.js*", "*/gtag/js*", "*/pixel.js*",
+    ],
+}
+# Named profiles; a plan's OPEN_BROWSER data or the CLI can override any field.
+BROWSER_PROFILES = {
+    "default": {},
+    "fast": {"page_load_strategy": "eager", "block": ["media", "fonts", "third_party_scripts"], "disk_cache_mb": 256},
+    "minimal": {"page_load_strategy": "eager", "block": ["media", "fonts", "images", "third_party_scripts"], "disk_cache_mb": 64},
+}
+# Which document.readyState counts as loaded for the settle wait. With eager or
+# none, waiting for "complete" would wait for the subresources again.
+READY_STATES = {"normal": ("complete",), "eager": ("interactive", "complete"), "none": ("interactive", "complete")}
+
+
+class BrowserProfile:
+    # Launch options (fixed for the life of a browser session) and network
+    # blocking (applied over CDP, so it can change on a live session).
+    def __init__(self, name: str = "default", headless: bool = False, page_load_strategy: str = "normal",
+                 block: Sequence[str] = (), blocked_urls: Sequence[str] = (), disk_cache_mb: Optional[int] = None,
+                 window_size: Tuple[int, int] = BROWSER_WINDOW_SIZE, report_network: bool = True):
+        if page_load_strategy not in PAGE_LOAD_STRATEGIES:
+            raise ValueError(f"Unknown page_load_strategy '{page_load_strategy}'. Use one of: {', '.join(PAGE_LOAD_STRATEGIES)}.")
+        unknown = [resource_class for resource_class in block if resource_class not in RESOURCE_CLASS_PATTERNS]
+        if unknown:
+            raise ValueError(f"Unknown resource class(es) {unknown}. Use any of: {', '.join(RESOURCE_CLASS_PATTERNS)}.")
+        self.name = name
+        self.headless = bool(headless)
+        self.page_load_strategy = page_load_strategy
+        self.block = list(block)
+        self.blocked_urls = list(blocked_urls)
+        self.disk_cache_mb = disk_cache_mb
+        self.window_size = tuple(window_size)
+        self.report_network = report_network
+
+    @property
+    def blocked_url_patterns(self) -> List[str]:
+        patterns = [pattern for resource_class in self.block for pattern in RESOURCE_CLASS_PATTERNS[resource_class]]
+        return patterns + [url for url in self.blocked_urls if url not in patterns]
+
+    @property
+    def ready_states(self) -> Tuple[str, ...]:
+        return READY_STATES[self.page_load_strategy]
+
+    @property
+    def launch_options(self) -> Tuple[Any, ...]:
+        return self.headless, self.page_load_strategy, self.disk_cache_mb, self.window_size
+
+    def with_overrides(self, **overrides) -> "BrowserProfile":
+        fields = self.describe()
+        fields.update({key: value for key, value in overrides.items() if value is not None})
+        return BrowserProfile(**fields)
+
+    def describe(self) -> Dict[str, Any]:
+        return {"name": self.name, "headless": self.headless, "page_load_strategy": self.page_load_strategy, "block": list(self.block),
+                "blocked_urls": list(self.blocked_urls), "disk_cache_mb": self.disk_cache_mb, "window_size": self.window_size,
+                "report_network": self.report_network}
+
+
+def resolve_profile(spec: Any = None, base: Optional[BrowserProfile] = None) -> BrowserProfile:
+    # spec is a profile name, or a dict such as OPEN_BROWSER's data:
+    #   {"profile": "fast", "headless": true, "page_load_strategy": "none",
+    #    "block": ["media"], "blocked_urls": ["*ads.example*"], "disk_cache_mb": 64}
+    # Fields not given come from the named profile, else from base.
+    if spec is None or isinstance(spec, str):
+        spec = {"profile": spec or "default"}
+    if not isinstance(spec, dict):
+        raise ValueError(f"A browser profile must be a name or an object, not {type(spec).__name__}.")
+    if spec.get("profile") is not None:
+        if spec["profile"] not in BROWSER_PROFILES:
+            raise ValueError(f"Unknown browser profile '{spec['profile']}'. Use one of: {', '.join(BROWSER_PROFILES)}.")
+        profile = BrowserProfile(name=spec["profile"], **BROWSER_PROFILES[spec["profile"]])
+    else:
+        profile = base or BrowserProfile()
+    for key in ("block", "blocked_urls"):
+        if spec.get(key) is not None and (not isinstance(spec[key], list) or not all(isinstance(item, str) for item in spec[key])):
+            raise ValueError(f"'{key}' must be a list of strings.")
+    return profile.with_overrides(headless=spec.get("headless"), page_load_strategy=spec.get("page_load_strategy"),
+                                  block=spec.get("block"), blocked_urls=spec.get("blocked_urls"), disk_cache_mb=spec.get("disk_cache_mb"))
+
+
+def configure_chrome_options(options, profile: BrowserProfile, profile_dir: Optional[str] = None):
+    if profile.headless:
+        options.add_argument("--headless=new")
+    options.add_argument(f"--window-size={profile.window_size[0]},{profile.window_size[1]}")
+    options.page_load_strategy = profile.page_load_strategy
+    if profile.disk_cache_mb is not None:
+        options.add_argument(f"--disk-cache-size={int(profile.disk_cache_mb) * 1024 * 1024}")
+    if profile_dir:
+        # A persistent profile keeps cookies, logins and the HTTP cache across runs.
+        options.add_argument(f"--user-data-dir={os.path.abspath(profile_dir)}")
+    if profile.report_network:
+        # Network.* events land in the "performance" log, which NetworkLog reads.
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    return options
+
+
+def apply_network_blocking(driver, profile: BrowserProfile, previous: Optional[BrowserProfile] = None) -> bool:
+    patterns = profile.blocked_url_patterns
+    if not patterns and (previous is None or not previous.blocked_url_patterns):
+        return False
+    if not hasattr(driver, "execute_cdp_cmd"):
+        print(f"DEBUG: This browser has no CDP; not blocking {len(patterns)} URL pattern(s).")
+        return False
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+    return True
+
+
+def resource_class_of(url: str, profile: BrowserProfile) -> str:
+    for resource_class in profile.block:
+        if any(fnmatch.fnmatchcase(url, pattern) for pattern in RESOURCE_CLASS_PATTERNS[resource_class]):
+            return resource_class
+    return "blocked_urls"
+
+
+def session_memory(driver) -> Optional[int]:
+    # The page's JS heap as Chrome reports it; None without CDP.
+    try:
+        driver.execute_cdp_cmd("Performance.enable", {})
+        metrics = driver.execute_cdp_cmd("Performance.getMetrics", {}).get("metrics", [])
+    except Exception:
+        return None
+    return next((int(metric["value"]) for metric in metrics if metric.get("name") == "JSHeapUsedSize"), None)
+
+
+class NetworkLog:
+    # Requests loaded and blocked per navigation, from the Network.* events in
+    # Chrome's performance log. Blocked requests are never fetched, so only
+    # their count (by resource class) is known, not their size.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.records: List[Dict[str, Any]] = []
+
+    def drain(self, driver, action: str, url: Optional[str], profile: BrowserProfile) -> Optional[Dict[str, Any]]:
+        try:
+            entries = driver.get_log("performance")
+        except Exception:
+            return None  # no performance log on this session
+        requests, loaded, bytes_loaded, failed, blocked_by_class = {}, 0, 0, 0, {}
+        for entry in entries:
+            try:
+                message = json.loads(entry["message"])["message"]
+            except (KeyError, TypeError, json.JSONDecodeError):
+                continue
+            params = message.get("params") or {}
+            if message.get("method") == "Network.requestWillBeSent":
+                requests[params.get("requestId")] = params.get("request", {}).get("url", "")
+            elif message.get("method") == "Network.loadingFinished":
+                loaded += 1
+                bytes_loaded += int(params.get("encodedDataLength") or 0)
+            elif message.get("method") == "Network.loadingFailed":
+                if params.get("blockedReason"):
+                    resource_class = resource_class_of(requests.get(params.get("requestId"), ""), profile)
+                    blocked_by_class[resource_class] = blocked_by_class.get(resource_class, 0) + 1
+                else:
+                    failed += 1
+        record = {"action": action, "url": url, "requests": len(requests), "loaded": loaded, "bytes_loaded": bytes_loaded,
+                  "blocked": sum(blocked_by_class.values()), "blocked_by_class": blocked_by_class, "failed": failed}
+        with self._lock:
+            self.records.append(record)
+        return record
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            records = list(self.records)
+        blocked_by_class: Dict[str, int] = {}
+        for record in records:
+            for resource_class, count in record["blocked_by_class"].items():
+                blocked_by_class[resource_class] = blocked_by_class.get(resource_class, 0) + count
+        return {
+            "navigations": len(records),
+            "requests": sum(record["requests"] for record in records),
+            "loaded": sum(record["loaded"] for record in records),
+            "bytes_loaded": sum(record["bytes_loaded"] for record in records),
+            "blocked": sum(record["blocked"] for record in records),
+            "blocked_by_class": blocked_by_class,
+            "failed": sum(record["failed"] for record in records),
+        }
@@ -0,0 +1,258 @@
+import argparse
+import http.client
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, Optional
+
+# --- Configuration ---
+DAEMON_HOST = "127.0.0.1"  # localhost only: the daemon drives a logged-in browser
+DAEMON_PORT = 8765
+DAEMON_PROFILE_DIR = "browser_profile"  # persistent Chrome profile (cookies, cache) for the warm browser
+DAEMON_REQUEST_TIMEOUT_S = 600.0
+
+
+class AgentDaemon:
+    # Keeps one interpreter, the model handles and a warm browser resident and
+    # runs goals or JSON plans sent over localhost HTTP:
+    #   POST /run       {"goal": "..."} or {"plan": {"steps": [...]}}
+    #   GET  /status
+    #   POST /shutdown
+    # /run answers with newline-delimited JSON events ("accepted", "plan",
+    # "step" after every executed step, then "result" or "error"). There is a
+    # single browser, so runs are executed one at a time in arrival order.
+    def __init__(self, context_factory: Callable[[], Any], plan_fn: Callable[[str], Any], run_fn: Callable,
+                 is_valid_plan: Callable[[Any], bool], is_alive: Callable[[Any], bool] = None,
+                 close: Callable[[Any], None] = None, warm_up: Callable[[Any], None] = None,
+                 host: str = DAEMON_HOST, port: int = DAEMON_PORT):
+        self.context_factory = context_factory
+        self.plan_fn = plan_fn
+        self.run_fn = run_fn
+        self.is_valid_plan = is_valid_plan
+        self.is_alive = is_alive or (lambda ctx: True)
+        self.close = close or (lambda ctx: None)
+        self.warm_up = warm_up
+        self.host = host
+        self.port = port
+        self.context = None
+        self._run_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._started_at = None
+        self.warm_up_s = None
+        self.contexts_started = 0
+        self.runs = 0
+        self.failed = 0
+        self.queued = 0
+
+    def _ensure_context(self):
+        if self.context is not None and self.is_alive(self.context):
+            return
+        if self.context is not None:
+            print("DEBUG: Daemon browser is no longer alive. Starting a new one.")
+            self.close(self.context)
+        started = time.perf_counter()
+        self.context = self.context_factory()
+        if self.warm_up is not None:
+            self.warm_up(self.context)
+        with self._stats_lock:
+            self.contexts_started += 1
+            self.warm_up_s = round(time.perf_counter() - started, 3)
+        print(f"DEBUG: Daemon context ready in {self.warm_up_s}s.")
+
+    def start(self) -> "AgentDaemon":
+        self._ensure_context()
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/status":
+                    return self._send_json(404, {"error": f"Unknown path '{self.path}'."})
+                self._send_json(200, daemon.stats())
+
+            def do_POST(self):
+                if self.path == "/shutdown":
+                    self._send_json(200, {"stopping": True})
+                    threading.Thread(target=daemon.stop, daemon=True).start()
+                    return
+                if self.path != "/run":
+                    return self._send_json(404, {"error": f"Unknown path '{self.path}'."})
+                try:
+                    request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                except json.JSONDecodeError as e:
+                    return self._send_json(400, {"error": f"Invalid JSON: {e}"})
+                if not isinstance(request, dict) or not (request.get("goal") or request.get("plan")):
+                    return self._send_json(400, {"error": "Body needs a 'goal' or a 'plan'."})
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.end_headers()
+                daemon.handle_run(request, self._emit)
+
+            def _emit(self, event: Dict[str, Any]):
+                try:
+                    self.wfile.write((json.dumps(event, default=str) + "\n").encode("utf-8"))
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client went away; the run still finishes
+
+            def _send_json(self, status: int, body: Dict[str, Any]):
+                payload = json.dumps(body, default=str).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._started_at = time.perf_counter()
+        print(f"Agent daemon listening on http://{self.host}:{self.port} (POST /run, GET /status, POST /shutdown).")
+        return self
+
+    def serve_forever(self):
+        try:
+            self._server.serve_forever()
+        finally:
+            self._shutdown_context()
+
+    def serve_in_background(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, name="agent-daemon", daemon=True)
+        thread.start()
+        return thread
+
+    def handle_run(self, request: Dict[str, Any], emit: Callable[[Dict[str, Any]], None]):
+        received = time.perf_counter()
+        with self._stats_lock:
+            self.queued += 1
+            position = self.queued
+        emit({"event": "accepted", "queue_position": position})
+        with self._run_lock:
+            with self._stats_lock:
+                self.queued -= 1
+            try:
+                self._ensure_context()
+                plan = request.get("plan")
+                if plan is not None:
+                    steps = plan["steps"] if self.is_valid_plan(plan) else None
+                else:
+                    steps = self.plan_fn(request["goal"])
+                if steps is None:
+                    self._count(failed=True)
+                    emit({"event": "error", "error": "No valid plan with a 'steps' list."})
+                    return
+                emit({"event": "plan", "steps": len(steps), "complete": not hasattr(steps, "done") or steps.done})
+                self.context.on_step = lambda record: emit(dict(record, event="step"))
+                try:
+                    result = self.run_fn(steps, ctx=self.context, goal=request.get("goal"))
+                finally:
+                    self.context.on_step = None
+                self._count(failed=not result.get("success"))
+                emit({"event": "result", "result": result, "latency_s": round(time.perf_counter() - received, 4)})
+            except Exception as e:
+                self._count(failed=True)
+                print(f"DEBUG: Daemon run failed: {type(e).__name__}: {e}")
+                emit({"event": "error", "error": f"{type(e).__name__}: {e}"})
+
+    def _count(self, failed: bool):
+        with self._stats_lock:
+            self.runs += 1
+            self.failed += int(failed)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "uptime_s": round(time.perf_counter() - self._started_at, 1) if self._started_at else 0.0,
+                "runs": self.runs,
+                "failed": self.failed,
+                "queued": self.queued,
+                "contexts_started": self.contexts_started,
+                "warm_up_s": self.warm_up_s,
+            }
+
+    def _shutdown_context(self):
+        with self._run_lock:
+            if self.context is not None:
+                self.close(self.context)
+                self.context = None
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def iter_run_events(goal: Optional[str] = None, plan: Optional[Dict[str, Any]] = None, host: str = DAEMON_HOST,
+                    port: int = DAEMON_PORT, timeout_s: float = DAEMON_REQUEST_TIMEOUT_S) -> Iterator[Dict[str, Any]]:
+    # Client side of POST /run: yields the daemon's events as they arrive.
+    body = json.dumps({"plan": plan} if plan is not None else {"goal": goal}).encode("utf-8")
+    connection = http.client.HTTPConnection(host, port, timeout=timeout_s)
+    try:
+        connection.request("POST", "/run", body=body, headers={"Content-Type": "application/json"})
+        response = connection.getresponse()
+        if response.status != 200:
+            yield {"event": "error", "error": json.loads(response.read() or b"{}").get("error", f"HTTP {response.status}")}
+            return
+        for line in response:
+            if line.strip():
+                yield json.loads(line)
+    finally:
+        connection.close()
+
+
+def run_remote(goal: Optional[str] = None, plan: Optional[Dict[str, Any]] = None, host: str = DAEMON_HOST,
+               port: int = DAEMON_PORT, on_event: Callable[[Dict[str, Any]], None] = None) -> Dict[str, Any]:
+    # Returns the final "result" (or "error") event.
+    final = {"event": "error", "error": "The daemon closed the connection without a result."}
+    for event in iter_run_events(goal, plan, host, port):
+        if on_event is not None:
+            on_event(event)
+        if event["event"] in ("result", "error"):
+            final = event
+    return final
+
+
+def _print_event(event: Dict[str, Any]):
+    if event["event"] == "step":
+        status = "ok" if event.get("success") else "failed"
+        print(f"  Step {event['index']}: {event['action']} {status} ({event['duration_s']}s){' - ' + event['error'] if event.get('error') else ''}")
+    elif event["event"] == "plan":
+        print(f"Plan: {event['steps']} step(s){'' if event['complete'] else ' so far (streaming)'}")
+    elif event["event"] == "result":
+        result = event["result"]
+        print(f"Answer: {result.get('final_answer')}")
+        print(f"Finished in {event['latency_s']}s ({'ok' if result.get('success') else 'halted'}).")
+    elif event["event"] == "error":
+        print(f"Error: {event['error']}")
+
+
+if __name__ == "__main__":
+    # A thin client that only needs the standard library, so sending a goal
+    # doesn't pay for importing the agent. Start the daemon with `python main.py --daemon`.
+    parser = argparse.ArgumentParser(description="Send a goal or JSON plan to a running agent daemon.")
+    parser.add_argument("goal", nargs="?", help="Natural-language goal (or a JSON plan with a 'steps' list).")
+    parser.add_argument("--plan-file", help="Run the JSON plan in this file instead of a goal.")
+    parser.add_argument("--status", action="store_true", help="Print the daemon's status and exit.")
+    parser.add_argument("--stop", action="store_true", help="Ask the daemon to shut down.")
+    parser.add_argument("--host", default=DAEMON_HOST)
+    parser.add_argument("--port", type=int, default=DAEMON_PORT)
+    args = parser.parse_args()
+    if args.status or args.stop:
+        connection = http.client.HTTPConnection(args.host, args.port, timeout=10)
+        connection.request("GET" if args.status else "POST", "/status" if args.status else "/shutdown")
+        print(connection.getresponse().read().decode("utf-8"))
+        sys.exit(0)
+    if args.plan_file:
+        with open(args.plan_file, "r", encoding="utf-8") as f:
+            final_event = run_remote(plan=json.load(f), host=args.host, port=args.port, on_event=_print_event)
+    elif args.goal:
+        final_event = run_remote(goal=args.goal, host=args.host, port=args.port, on_event=_print_event)
+    else:
+        parser.error("Give a goal, --plan-file, --status or --stop.")
+    sys.exit(0 if final_event["event"] == "result" and final_event["result"].get("success") else 1)
@@ -0,0 +1,206 @@
+import json
+import re
+import sys
+from typing import Any, Dict, List
+
+# --- Configuration ---
+DOM_LABEL_MAX_ELEMENTS = 150
+DOM_LABEL_NAME_MAX_LENGTH = 80
+
+# Shortest selector that matches only this element: its id, a test/name/aria
+# attribute, or an nth-of-type path up to the nearest ancestor with an id.
+STABLE_SELECTOR_JS = r"""
+function cssEscape(value) {
+  return (window.CSS && CSS.escape) ? CSS.escape(value) : String(value).replace(/[^a-zA-Z0-9_-]/g, '\\$&');
+}
+function isUnique(selector) {
+  try { return document.querySelectorAll(selector).length === 1; } catch (e) { return false; }
+}
+function stableSelector(el) {
+  if (el.id && isUnique('#' + cssEscape(el.id))) return '#' + cssEscape(el.id);
+  const tag = el.tagName.toLowerCase();
+  for (const attr of ['data-testid', 'data-test', 'data-qa', 'name', 'aria-label']) {
+    const value = el.getAttribute(attr);
+    if (value) {
+      const selector = tag + '[' + attr + '="' + value.replace(/"/g, '\\"') + '"]';
+      if (isUnique(selector)) return selector;
+    }
+  }
+  const parts = [];
+  let node = el;
+  while (node && node.nodeType === 1 && node !== document.documentElement) {
+    if (node !== el && node.id && isUnique('#' + cssEscape(node.id))) {
+      parts.unshift('#' + cssEscape(node.id));
+      break;
+    }
+    let part = node.tagName.toLowerCase();
+    const parent = node.parentElement;
+    if (parent) {
+      const sameTag = Array.from(parent.children).filter(c => c.tagName === node.tagName);
+      if (sameTag.length > 1) part += ':nth-of-type(' + (sameTag.indexOf(node) + 1) + ')';
+    }
+    parts.unshift(part);
+    node = parent;
+  }
+  return parts.join(' > ');
+}
+"""
+
+# Runs in the page. One round trip returns every visible, topmost interactive
+# element in the viewport with its CSS-pixel rect, accessible name and a selector
+# that can be fed back to driver.find_element(By.CSS_SELECTOR, ...).
+COLLECT_INTERACTIVE_ELEMENTS_JS = r"""
+const maxElements = arguments[0];
+const maxNameLength = arguments[1];
+const query = [
+  'a[href]', 'button', 'input:not([type="hidden"])', 'select', 'textarea', 'summary',
+  '[role="button"]', '[role="link"]', '[role="checkbox"]', '[role="tab"]', '[role="menuitem"]',
+  '[contenteditable=""]', '[contenteditable="true"]', '[onclick]'
+].join(',');
+const viewportWidth = window.innerWidth || document.documentElement.clientWidth;
+const viewportHeight = window.innerHeight || document.documentElement.clientHeight;
+""" + STABLE_SELECTOR_JS + r"""
+function accessibleName(el) {
+  const labelledBy = el.getAttribute('aria-labelledby');
+  if (labelledBy) {
+    const text = labelledBy.split(/\s+/).map(id => {
+      const ref = document.getElementById(id);
+      return ref ? ref.innerText || ref.textContent : '';
+    }).join(' ').trim();
+    if (text) return text;
+  }
+  const direct = el.getAttribute('aria-label');
+  if (direct) return direct;
+  if (el.labels && el.labels.length) {
+    const text = Array.from(el.labels).map(l => l.innerText || l.textContent).join(' ').trim();
+    if (text) return text;
+  }
+  for (const attr of ['placeholder', 'alt', 'title']) {
+    if (el.getAttribute(attr)) return el.getAttribute(attr);
+  }
+  const img = el.querySelector && el.querySelector('img[alt]');
+  const text = (el.innerText || el.textContent || '').trim();
+  if (text) return text;
+  if (img && img.alt) return img.alt;
+  if (el.value && typeof el.value === 'string') return el.value;
+  return '';
+}
+function isVisible(el, rect) {
+  if (rect.width < 2 || rect.height < 2) return false;
+  if (rect.bottom <= 0 || rect.right <= 0 || rect.top >= viewportHeight || rect.left >= viewportWidth) return false;
+  const style = window.getComputedStyle(el);
+  if (style.visibility === 'hidden' || style.display === 'none' || parseFloat(style.opacity) === 0) return false;
+  const x = Math.min(Math.max(rect.left + rect.width / 2, 0), viewportWidth - 1);
+  const y = Math.min(Math.max(rect.top + rect.height / 2, 0), viewportHeight - 1);
+  const hit = document.elementFromPoint(x, y);
+  return !!hit && (hit === el || el.contains(hit) || hit.contains(el));
+}
+
+const results = [];
+const seen = new Set();
+for (const el of document.querySelectorAll(query)) {
+  if (results.length >= maxElements) break;
+  if (el.disabled) continue;
+  const rect = el.getBoundingClientRect();
+  if (!isVisible(el, rect)) continue;
+  let ancestor = el.parentElement, nested = false;
+  while (ancestor) {
+    if (seen.has(ancestor)) { nested = true; break; }
+    ancestor = ancestor.parentElement;
+  }
+  if (nested) continue;
+  seen.add(el);
+  results.push({
+    tag: el.tagName.toLowerCase(),
+    type: el.getAttribute('type') || '',
+    role: el.getAttribute('role') || '',
+    name: accessibleName(el).replace(/\s+/g, ' ').trim().slice(0, maxNameLength),
+    selector: stableSelector(el),
+    rect: [
+      Math.max(0, Math.round(rect.left)), Math.max(0, Math.round(rect.top)),
+      Math.min(viewportWidth, Math.round(rect.right)), Math.min(viewportHeight, Math.round(rect.bottom))
+    ]
+  });
+}
+return results;
+"""
+
+
+def _describe(candidate: Dict[str, Any]) -> str:
+    kind = candidate.get("role") or candidate.get("tag", "element")
+    if candidate.get("tag") == "input" and candidate.get("type"):
+        kind = f"input[type={candidate['type']}]"
+    elif candidate.get("tag") == "a":
+        kind = "link"
+    name = candidate.get("name")
+    return f"{kind} \"{name}\"" if name else kind
+
+
+def elements_map_from_candidates(candidates: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+    elements_map = {}
+    for number, candidate in enumerate(candidates, 1):
+        elements_map[number] = {
+            "number": number,
+            "description": _describe(candidate),
+            "box": list(candidate["rect"]),
+            "selector": candidate.get("selector"),
+            "source": "dom",
+        }
+    return elements_map
+
+
+def collect_dom_elements(driver, max_elements: int = DOM_LABEL_MAX_ELEMENTS) -> Dict[int, Dict[str, Any]]:
+    candidates = driver.execute_script(COLLECT_INTERACTIVE_ELEMENTS_JS, max_elements, DOM_LABEL_NAME_MAX_LENGTH) or []
+    return elements_map_from_candidates(candidates)
+
+
+def build_hybrid_prompt(elements_map: Dict[int, Dict[str, Any]]) -> str:
+    candidate_lines = "\n".join(f"{number}: {element['description']}" for number, element in elements_map.items())
+    return (
+        "The screenshot shows a webpage. These interactive elements were found in its DOM, numbered:\n"
+        f"{candidate_lines}\n"
+        "Using the screenshot, rank the elements from most to least useful for a user of this page and give each a short "
+        "description of its purpose. Use only the numbers listed above.\n"
+        'Return a single valid JSON object: {"elements": [{"number": 3, "description": "Search input field"}, ...]}'
+    )
+
+
+def apply_vision_ranking(elements_map: Dict[int, Dict[str, Any]], vision_text: str) -> Dict[int, Dict[str, Any]]:
+    # Keeps the DOM boxes and numbers; the model only supplies order and wording.
+    # Candidates the model skipped are kept at the end in DOM order.
+    json_match = re.search(r"```json\s*([\s\S]*?)\s*```", vision_text, re.DOTALL)
+    ranked = json.loads(json_match.group(1).strip() if json_match else vision_text).get("elements", [])
+    ranked_map = {}
+    for rank, item in enumerate(ranked, 1):
+        try:
+            number = int(item.get("number"))
+        except (TypeError, ValueError):
+            continue
+        if number not in elements_map or number in ranked_map: continue
+        element = dict(elements_map[number])
+        if item.get("description"):
+            element["description"] = item["description"]
+        element["rank"] = rank
+        element["source"] = "hybrid"
+        ranked_map[number] = element
+    for number, element in elements_map.items():
+        if number not in ranked_map:
+            ranked_map[number] = element
+    return ranked_map
+
+
+if __name__ == "__main__":
+    # Usage: python dom_labeler.py fixtures/labeling.html
+    import os
+    from selenium import webdriver
+
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless=new")
+    options.add_argument("--window-size=1280,800")
+    fixture_driver = webdriver.Chrome(options=options)
+    try:
+        fixture_driver.get("file://" + os.path.abspath(sys.argv[1]))
+        for number, element in collect_dom_elements(fixture_driver).items():
+            print(f"{number:>3}  {element['box']}  {element['description']}  ({element['selector']})")
+    finally:
+        fixture_driver.quit()
@@ -0,0 +1,830 @@
+import base64
+import fnmatch
+import functools
+import json
+import os
+import random
+import re
+import socket
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from html.parser import HTMLParser
+from http.server import BaseHTTPRequestHandler, SimpleHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from PIL import Image, ImageDraw, ImageFont
+from selenium.common.exceptions import InvalidSessionIdException, NoSuchElementException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.remote.command import Command
+
+from dom_labeler import COLLECT_INTERACTIVE_ELEMENTS_JS, collect_dom_elements
+from page_text import COLLECT_PAGE_TEXT_JS, SCROLL_TO_Y_JS
+from screenshot_pipeline import VIEWPORT_METRICS_JS
+from skill_cache import RESOLVE_ELEMENT_AT_POINT_JS
+
+# --- Configuration ---
+FIXTURE_SITE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "site")
+FAKE_VIEWPORT = (1280, 800)
+FAKE_ROW_HEIGHT = 40
+FAKE_CHAR_WIDTH = 9
+FAKE_MARGIN = 20
+FAKE_STREAM_CHUNK_CHARS = 64
+# Sizes of the synthetic files FixtureServer serves under /assets/, by extension.
+FAKE_ASSET_BYTES = {".css": 4 * 1024, ".js": 60 * 1024, ".woff2": 48 * 1024, ".jpg": 120 * 1024, ".png": 80 * 1024, ".mp4": 1536 * 1024}
+FAKE_HEAP_BASE_BYTES = 1_500_000
+FAKE_FONT_SIZE = 14  # CSS pixels; scaled with the device pixel ratio like real text
+
+_INTERACTIVE_TAGS = {"a", "button", "input", "select", "textarea"}
+_TEXT_TAGS = {"title", "h1", "h2", "h3", "h4", "h5", "h6", "p", "li", "span", "label", "td", "th", "option"}
+_VOID_TAGS = {"input", "br", "img", "meta", "link", "hr"}
+# Subresources that hold up DOMContentLoaded; everything else only holds up load.
+_PARSER_BLOCKING_TYPES = {"Script", "Stylesheet"}
+
+
+# --- Fake Gemini ---
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+ResponseRule = Tuple[str, Union[str, Callable[[List[Any]], str]]]
+
+
+class FakeGenerativeModel:
+    # Stands in for genai.GenerativeModel. The first rule whose needle appears in
+    # the text parts of the prompt answers; the answer is either canned text or
+    # a callable that receives the raw prompt parts (so it can look at images).
+    # latency_per_image_kib_s adds time proportional to the uploaded image
+    # bytes, as real vision calls get slower with larger images. With
+    # stream=True the latency is spread evenly over chunks of the answer.
+    def __init__(self, rules: Optional[List[ResponseRule]] = None, default_text: str = "{}",
+                 latency_s: float = 0.0, jitter_s: float = 0.0, model_name: str = "fake-model", seed: Optional[int] = None,
+                 stream_chunk_chars: int = FAKE_STREAM_CHUNK_CHARS, latency_per_image_kib_s: float = 0.0):
+        self.rules = list(rules or [])
+        self.default_text = default_text
+        self.latency_s = latency_s
+        self.jitter_s = jitter_s
+        self.model_name = model_name
+        self.stream_chunk_chars = stream_chunk_chars
+        self.latency_per_image_kib_s = latency_per_image_kib_s
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls: List[Dict[str, Any]] = []
+
+    def generate_content(self, contents, stream: bool = False, **kwargs):
+        parts = contents if isinstance(contents, list) else [contents]
+        prompt_text = "\n".join(part for part in parts if isinstance(part, str))
+        image_bytes = sum(len(part.get("data", b"")) for part in parts if isinstance(part, dict))
+        with self._lock:
+            delay = self.latency_s + (self._random.uniform(0, self.jitter_s) if self.jitter_s else 0.0)
+            delay += image_bytes / 1024 * self.latency_per_image_kib_s
+            self.calls.append({"prompt_chars": len(prompt_text), "image_bytes": image_bytes, "latency_s": delay})
+        if stream:
+            return self._stream(self._answer(parts, prompt_text), delay)
+        if delay > 0:
+            time.sleep(delay)
+        return FakeResponse(self._answer(parts, prompt_text))
+
+    def _answer(self, parts: List[Any], prompt_text: str) -> str:
+        for needle, answer in self.rules:
+            if needle in prompt_text:
+                return answer(parts) if callable(answer) else answer
+        return self.default_text
+
+    def _stream(self, text: str, delay: float):
+        chunks = [text[i:i + self.stream_chunk_chars] for i in range(0, len(text), self.stream_chunk_chars)] or [""]
+        for chunk in chunks:
+            if delay > 0:
+                time.sleep(delay / len(chunks))
+            yield FakeResponse(chunk)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": len(self.calls),
+                "image_bytes": sum(call["image_bytes"] for call in self.calls),
+                "latency_s": round(sum(call["latency_s"] for call in self.calls), 4),
+            }
+
+
+_CROP_PROMPT = re.compile(r"(\d+)x(\d+) crop taken at offset \((\d+), (\d+)\) of a (\d+)x(\d+) screenshot")
+
+
+def make_labeling_responder(driver_getter: Callable[[], Any]) -> Callable[[List[Any]], str]:
+    # Answers a labeling prompt the way a perfect vision model would: the
+    # page's own interactive elements, with boxes in uploaded-image pixels.
+    # For region crops (see region_diff.REGION_PROMPT_SUFFIX) only elements
+    # centred inside the crop are returned, in crop pixels.
+    def respond(parts: List[Any]) -> str:
+        driver = driver_getter()
+        prompt_text = "\n".join(part for part in parts if isinstance(part, str))
+        image_part = next((part for part in parts if isinstance(part, dict)), None)
+        crop = _CROP_PROMPT.search(prompt_text)
+        viewport_width = driver.execute_script("return window.innerWidth;")
+        if crop:
+            crop_w, crop_h, offset_x, offset_y, image_width, _ = map(int, crop.groups())
+        else:
+            image_width = Image.open(BytesIO(image_part["data"])).width if image_part is not None else viewport_width
+            crop_w = crop_h = None
+            offset_x = offset_y = 0
+        scale = image_width / (viewport_width or image_width)
+        elements = []
+        for element in collect_dom_elements(driver).values():
+            box = [round(v * scale) for v in element["box"]]
+            if crop_w is not None:
+                center_x, center_y = (box[0] + box[2]) / 2 - offset_x, (box[1] + box[3]) / 2 - offset_y
+                if not (0 <= center_x < crop_w and 0 <= center_y < crop_h): continue
+                box = [max(0, box[0] - offset_x), max(0, box[1] - offset_y), min(crop_w, box[2] - offset_x), min(crop_h, box[3] - offset_y)]
+            elements.append({"number": len(elements) + 1, "description": element["description"], "box": box})
+        return json.dumps({"elements": elements})
+    return respond
+
+
+_BATCH_QUESTION = re.compile(r'^"(q\d+)": (.+)$', re.MULTILINE)
+
+
+def make_batch_responder(rules: List[ResponseRule], default_text: str = "unknown") -> Callable[[List[Any]], str]:
+    # Answers a batched READ_SCREEN prompt (see read_batch.build_batch_prompt)
+    # with a JSON object, each question answered by the first of rules whose
+    # needle it contains, as if it had been asked on its own.
+    def respond(parts: List[Any]) -> str:
+        prompt_text = "\n".join(part for part in parts if isinstance(part, str))
+        images = [part for part in parts if not isinstance(part, str)]
+        answers = {}
+        for question_id, question in _BATCH_QUESTION.findall(prompt_text):
+            answer = next((answer for needle, answer in rules if needle in question), default_text)
+            answers[question_id] = answer([question] + images) if callable(answer) else answer
+        return json.dumps(answers)
+    return respond
+
+
+# --- Fake WebDriver ---
+
+@functools.lru_cache(maxsize=16)
+def _fake_font(size: int):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1 has only the fixed-size bitmap font
+        return ImageFont.load_default()
+
+
+class _PageParser(HTMLParser):
+    # Flattens a page into the nodes the fake browser lays out, one per row:
+    # interactive elements plus blocks of visible text.
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.nodes: List[Dict[str, Any]] = []
+        self.title = ""
+        self._stack: List[Dict[str, Any]] = []
+        self._form: Optional[Dict[str, Any]] = None
+        self._forms = 0
+        self.subresources: List[Tuple[str, str]] = []  # (url, CDP resource type) in document order
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {k: (v if v is not None else "") for k, v in attrs}
+        self._collect_subresource(tag, attrs)
+        if tag == "form":
+            self._forms += 1
+            self._form = {"id": self._forms, "action": attrs.get("action", ""), "method": attrs.get("method", "get")}
+            return
+        if tag in _INTERACTIVE_TAGS or tag in _TEXT_TAGS:
+            if tag == "input" and attrs.get("type") == "hidden":
+                node = {"tag": tag, "attrs": attrs, "text": "", "form": self._form, "hidden": True}
+            else:
+                node = {"tag": tag, "attrs": attrs, "text": "", "form": self._form, "hidden": False}
+            if tag != "title":
+                self.nodes.append(node)
+            if tag not in _VOID_TAGS:
+                self._stack.append(node)
+
+    def _collect_subresource(self, tag: str, attrs: Dict[str, str]):
+        if tag == "img" and attrs.get("src"):
+            self.subresources.append((attrs["src"], "Image"))
+        elif tag == "script" and attrs.get("src"):
+            self.subresources.append((attrs["src"], "Script"))
+        elif tag == "link" and attrs.get("href") and "stylesheet" in attrs.get("rel", "").split():
+            self.subresources.append((attrs["href"], "Stylesheet"))
+        elif tag == "link" and attrs.get("href") and attrs.get("rel") == "preload" and attrs.get("as") == "font":
+            self.subresources.append((attrs["href"], "Font"))
+        elif tag in ("video", "audio", "source") and attrs.get("src"):
+            self.subresources.append((attrs["src"], "Media"))
+
+    def handle_endtag(self, tag):
+        if tag == "form":
+            self._form = None
+            return
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i]["tag"] == tag:
+                del self._stack[i:]
+                break
+
+    def handle_data(self, data):
+        text = " ".join(data.split())
+        if not text or not self._stack: return
+        node = self._stack[-1]
+        node["text"] = f"{node['text']} {text}".strip()
+        if node["tag"] == "title":
+            self.title = node["text"]
+
+
+class FakeElement:
+    def __init__(self, driver: "FakeWebDriver", node: Dict[str, Any]):
+        self._driver = driver
+        self._node = node
+
+    @property
+    def tag_name(self) -> str:
+        return self._node["tag"]
+
+    @property
+    def text(self) -> str:
+        return self._node["text"]
+
+    @property
+    def rect(self) -> Dict[str, int]:
+        x0, y0, x1, y1 = self._driver._box(self._node)
+        return {"x": x0, "y": y0, "width": x1 - x0, "height": y1 - y0}
+
+    def get_attribute(self, name: str):
+        if name == "value": return self._node.get("value", self._node["attrs"].get("value"))
+        return self._node["attrs"].get(name)
+
+    def is_displayed(self) -> bool:
+        return not self._node["hidden"]
+
+    def is_enabled(self) -> bool:
+        return "disabled" not in self._node["attrs"]
+
+    def clear(self):
+        self._node["value"] = ""
+        self._driver.mutations += 1
+
+    def click(self):
+        self._driver._click(self._node)
+
+    def send_keys(self, *values):
+        self._driver.focused = self._node
+        self._driver._type("".join(str(v) for v in values))
+
+
+class FakeWebDriver:
+    # A browser without a browser: fetches real pages (typically from
+    # FixtureServer), lays every interactive element and text block out on its
+    # own row, renders that layout as the screenshot and answers the handful of
+    # scripts the executor runs. Link clicks, typing and form submits navigate
+    # like the real thing, so plans run end to end without Chrome. Subresources
+    # (scripts, stylesheets, images, fonts, media) are fetched too, honouring
+    # page_load_strategy and Network.setBlockedURLs, and show up as Network.*
+    # events in get_log("performance").
+    def __init__(self, viewport: Tuple[int, int] = FAKE_VIEWPORT, device_pixel_ratio: float = 1.0, fetch_timeout: float = 10.0,
+                 page_load_strategy: str = "normal"):
+        self.viewport = viewport
+        self.device_pixel_ratio = device_pixel_ratio
+        self.fetch_timeout = fetch_timeout
+        self.w3c = True
+        self.current_url = "about:blank"
+        self.page_source = ""
+        self.nodes: List[Dict[str, Any]] = []
+        self.focused: Optional[Dict[str, Any]] = None
+        self.mutations = 0
+        self.scroll_y = 0
+        self.navigations = 0
+        self.screenshots = 0
+        self._title = ""
+        self._pointer = (0, 0)
+        self._closed = False
+        self._screenshot_cache: Optional[Tuple[Any, bytes]] = None
+        self.page_load_strategy = page_load_strategy
+        self.ready_state = "complete"
+        self.blocked_urls: List[str] = []
+        self.script_bytes = 0
+        self._network_lock = threading.Lock()
+        self._performance_log: List[Dict[str, Any]] = []
+        self._request_ids = 0
+
+    @property
+    def title(self) -> str:
+        if self._closed:
+            raise InvalidSessionIdException("FakeWebDriver was quit.")
+        return self._title
+
+    def get(self, url: str):
+        request_id = self._log_request(url, "Document")
+        with urllib.request.urlopen(url, timeout=self.fetch_timeout) as response:
+            body = response.read()
+            self.current_url = response.geturl()
+        self._log_event("Network.loadingFinished", {"requestId": request_id, "encodedDataLength": len(body)})
+        html = body.decode("utf-8", errors="replace")
+        parser = _PageParser()
+        parser.feed(html)
+        self.page_source, self.nodes, self._title = html, [n for n in parser.nodes if n["text"] or n["tag"] in _INTERACTIVE_TAGS], parser.title
+        self.focused, self.mutations, self.scroll_y, self.script_bytes = None, 0, 0, 0
+        self.navigations += 1
+        # normal returns after every subresource; eager after the ones that
+        # block DOMContentLoaded; none straight away. The rest load behind
+        # readyState "interactive".
+        subresources = [(urllib.parse.urljoin(self.current_url, src), kind) for src, kind in parser.subresources]
+        if self.page_load_strategy == "normal":
+            now, later = subresources, []
+        elif self.page_load_strategy == "eager":
+            now = [item for item in subresources if item[1] in _PARSER_BLOCKING_TYPES]
+            later = [item for item in subresources if item[1] not in _PARSER_BLOCKING_TYPES]
+        else:
+            now, later = [], subresources
+        for subresource_url, kind in now:
+            self._fetch_subresource(subresource_url, kind, self.navigations)
+        if later:
+            self.ready_state = "interactive"
+            threading.Thread(target=self._finish_loading, args=(later, self.navigations), name="fake-subresources", daemon=True).start()
+        else:
+            self.ready_state = "complete"
+
+    def _finish_loading(self, subresources: List[Tuple[str, str]], generation: int):
+        for subresource_url, kind in subresources:
+            if generation != self.navigations: return
+            self._fetch_subresource(subresource_url, kind, generation)
+        if generation == self.navigations:
+            self.ready_state = "complete"
+
+    def _fetch_subresource(self, url: str, kind: str, generation: int):
+        request_id = self._log_request(url, kind)
+        if any(fnmatch.fnmatchcase(url, pattern) for pattern in self.blocked_urls):
+            self._log_event("Network.loadingFailed", {"requestId": request_id, "type": kind, "errorText": "net::ERR_BLOCKED_BY_CLIENT",
+                                                      "blockedReason": "inspector"})
+            return
+        try:
+            with urllib.request.urlopen(url, timeout=self.fetch_timeout) as response:
+                size = len(response.read())
+        except (urllib.error.URLError, OSError) as e:
+            self._log_event("Network.loadingFailed", {"requestId": request_id, "type": kind, "errorText": str(e)})
+            return
+        if kind == "Script" and generation == self.navigations:
+            self.script_bytes += size
+        self._log_event("Network.loadingFinished", {"requestId": request_id, "encodedDataLength": size})
+
+    def _log_request(self, url: str, kind: str) -> str:
+        with self._network_lock:
+            self._request_ids += 1
+            request_id = f"fake.{self._request_ids}"
+        self._log_event("Network.requestWillBeSent", {"requestId": request_id, "type": kind, "request": {"url": url}})
+        return request_id
+
+    def _log_event(self, method: str, params: Dict[str, Any]):
+        # Same shape as chromedriver's performance log entries.
+        entry = {"level": "INFO", "timestamp": int(time.time() * 1000),
+                 "message": json.dumps({"message": {"method": method, "params": params}, "webview": "fake"})}
+        with self._network_lock:
+            self._performance_log.append(entry)
+
+    def get_log(self, log_type: str) -> List[Dict[str, Any]]:
+        if log_type != "performance": return []
+        with self._network_lock:
+            entries, self._performance_log = self._performance_log, []
+        return entries
+
+    def execute_cdp_cmd(self, cmd: str, cmd_args: Dict[str, Any]) -> Dict[str, Any]:
+        if cmd == "Page.captureScreenshot":
+            return self._capture_screenshot(cmd_args)
+        if cmd == "Network.setBlockedURLs":
+            self.blocked_urls = list(cmd_args.get("urls", []))
+        elif cmd == "Performance.getMetrics":
+            # A stand-in for the page's JS heap: a fixed base plus the scripts
+            # the current document ran and its own markup.
+            heap = FAKE_HEAP_BASE_BYTES + 3 * self.script_bytes + 2 * len(self.page_source)
+            return {"metrics": [{"name": "JSHeapUsedSize", "value": heap}, {"name": "Nodes", "value": len(self.nodes)}]}
+        return {}
+
+    def quit(self):
+        self._closed = True
+
+    def _box(self, node: Dict[str, Any]) -> List[int]:
+        row = self.nodes.index(node)
+        top = FAKE_MARGIN + row * FAKE_ROW_HEIGHT - self.scroll_y
+        label = node["text"] or node["attrs"].get("placeholder", "") or node["tag"]
+        width = min(self.viewport[0] - 2 * FAKE_MARGIN, FAKE_CHAR_WIDTH * len(label) + 16)
+        return [FAKE_MARGIN, top, FAKE_MARGIN + width, top + FAKE_ROW_HEIGHT - 8]
+
+    def _visible_nodes(self) -> List[Dict[str, Any]]:
+        visible = []
+        for node in self.nodes:
+            if node["hidden"]: continue
+            box = self._box(node)
+            if box[3] > 0 and box[1] < self.viewport[1]:
+                visible.append(node)
+        return visible
+
+    def _node_at(self, x: float, y: float) -> Optional[Dict[str, Any]]:
+        for node in self._visible_nodes():
+            x0, y0, x1, y1 = self._box(node)
+            if x0 <= x <= x1 and y0 <= y <= y1:
+                return node
+        return None
+
+    def _selector(self, node: Dict[str, Any]) -> str:
+        if node["attrs"].get("id"): return f"#{node['attrs']['id']}"
+        if node["attrs"].get("name"): return f"{node['tag']}[name=\"{node['attrs']['name']}\"]"
+        same_tag = [n for n in self.nodes if n["tag"] == node["tag"]]
+        return f"{node['tag']}:nth-of-type({same_tag.index(node) + 1})"
+
+    def _candidates(self, max_elements: int, max_name_length: int) -> List[Dict[str, Any]]:
+        candidates = []
+        for node in self._visible_nodes():
+            if node["tag"] not in _INTERACTIVE_TAGS: continue
+            name = node["attrs"].get("aria-label") or node["attrs"].get("placeholder") or node["text"] or node.get("value", "")
+            box = self._box(node)
+            candidates.append({
+                "tag": node["tag"], "type": node["attrs"].get("type", ""), "role": node["attrs"].get("role", ""),
+                "name": name[:max_name_length], "selector": self._selector(node),
+                "rect": [box[0], max(0, box[1]), box[2], min(self.viewport[1], box[3])],
+            })
+            if len(candidates) >= max_elements: break
+        return candidates
+
+    def _page_text(self, max_blocks: int, max_chars: int) -> Dict[str, Any]:
+        blocks, headings, truncated = [], [], False
+        for node in self.nodes:
+            if node["hidden"] or not node["text"]: continue
+            if len(blocks) >= max_blocks:
+                truncated = True
+                break
+            level = int(node["tag"][1]) if re.fullmatch(r"h[1-6]", node["tag"]) else 0
+            if level:
+                del headings[level - 1:]
+                headings.extend([""] * (level - 1 - len(headings)) + [node["text"][:max_chars]])
+            x0, y0, x1, y1 = self._box(node)
+            blocks.append({"text": node["text"][:max_chars], "tag": node["tag"], "level": level,
+                           "section": [h for h in headings if h], "rect": [x0, y0 + self.scroll_y, x1, y1 + self.scroll_y]})
+        return {"url": self.current_url, "docId": self.navigations, "mutations": self.mutations, "scrollY": self.scroll_y,
+                "viewportHeight": self.viewport[1], "truncated": truncated, "blocks": blocks}
+
+    def _element_at(self, x: float, y: float) -> Optional[Dict[str, Any]]:
+        node = self._node_at(x, y)
+        if node is None: return None
+        attrs = node["attrs"]
+        xpath = f"//*[@id='{attrs['id']}']" if attrs.get("id") else f"//{node['tag']}[@name='{attrs['name']}']" if attrs.get("name") else None
+        return {"selector": self._selector(node), "xpath": xpath, "tag": node["tag"], "name": attrs.get("placeholder") or node["text"]}
+
+    def execute_script(self, script: str, *args):
+        if script == RESOLVE_ELEMENT_AT_POINT_JS:
+            return self._element_at(*args)
+        if script == COLLECT_PAGE_TEXT_JS:
+            return self._page_text(*args)
+        if script == SCROLL_TO_Y_JS:
+            self.scroll_y = max(0, min(int(args[0]), self._page_height() - self.viewport[1]))
+            return self.scroll_y
+        if "__miniSettle" in script:
+            return {"readyState": self.ready_state, "url": self.current_url, "docId": self.navigations, "mutations": self.mutations,
+                    "pending": 0, "quietMs": 60000}
+        if script == COLLECT_INTERACTIVE_ELEMENTS_JS:
+            return self._candidates(*args)
+        if script == VIEWPORT_METRICS_JS:
+            return [self.device_pixel_ratio, 0, self.scroll_y, self.viewport[0], self.viewport[1], self.viewport[0], self._page_height()]
+        if "devicePixelRatio" in script:
+            return self.device_pixel_ratio
+        if "innerWidth" in script:
+            return self.viewport[0]
+        if "innerHeight" in script:
+            return self.viewport[1]
+        return None
+
+    def _page_height(self) -> int:
+        return max(self.viewport[1], FAKE_MARGIN + len(self.nodes) * FAKE_ROW_HEIGHT)
+
+    def _render(self, clip: Tuple[float, float, float, float], scale: float) -> Image.Image:
+        # clip is (x, y, width, height) in document CSS pixels; the image is
+        # drawn straight at device pixels times scale, as Chrome does.
+        x, y, width, height = clip
+        factor = self.device_pixel_ratio * scale
+        image = Image.new("RGB", (max(1, round(width * factor)), max(1, round(height * factor))), "white")
+        draw = ImageDraw.Draw(image)
+        for node in self.nodes:
+            if node["hidden"]: continue
+            x0, y0, x1, y1 = self._box(node)
+            y0, y1 = y0 + self.scroll_y, y1 + self.scroll_y
+            if y1 <= y or y0 >= y + height or x1 <= x or x0 >= x + width: continue
+            box = [int((x0 - x) * factor), int((y0 - y) * factor), int((x1 - x) * factor), int((y1 - y) * factor)]
+            label = node.get("value") or node["text"] or node["attrs"].get("placeholder", "")
+            if node["tag"] in _INTERACTIVE_TAGS:
+                draw.rectangle(box, outline=(26, 115, 232), width=max(1, int(2 * factor)))
+            draw.text((box[0] + 6 * factor, box[1] + 8 * factor), label, fill="black", font=_fake_font(max(6, round(FAKE_FONT_SIZE * factor))))
+        return image
+
+    def get_screenshot_as_png(self) -> bytes:
+        self.screenshots += 1
+        key = (self.current_url, self.mutations, self.scroll_y)
+        if self._screenshot_cache is not None and self._screenshot_cache[0] == key:
+            return self._screenshot_cache[1]
+        buffer = BytesIO()
+        self._render((0, self.scroll_y, self.viewport[0], self.viewport[1]), 1.0).save(buffer, format="PNG")
+        self._screenshot_cache = (key, buffer.getvalue())
+        return self._screenshot_cache[1]
+
+    def _capture_screenshot(self, params: Dict[str, Any]) -> Dict[str, str]:
+        # Page.captureScreenshot: without captureBeyondViewport only the part
+        # of the clip inside the viewport has content.
+        self.screenshots += 1
+        clip = params.get("clip") or {"x": 0, "y": self.scroll_y, "width": self.viewport[0], "height": self.viewport[1], "scale": 1}
+        image = self._render((clip["x"], clip["y"], clip["width"], clip["height"]), clip.get("scale", 1))
+        if not params.get("captureBeyondViewport"):
+            factor = self.device_pixel_ratio * clip.get("scale", 1)
+            visible_top = max(0, round((self.scroll_y - clip["y"]) * factor))
+            visible_bottom = min(image.height, round((self.scroll_y + self.viewport[1] - clip["y"]) * factor))
+            if visible_top > 0 or visible_bottom < image.height:
+                blank = Image.new("RGB", image.size, "white")
+                if visible_bottom > visible_top:
+                    blank.paste(image.crop((0, visible_top, image.width, visible_bottom)), (0, visible_top))
+                image = blank
+        image_format = {"jpeg": "JPEG", "webp": "WEBP"}.get(params.get("format", "png"), "PNG")
+        buffer = BytesIO()
+        image.save(buffer, format=image_format, **({} if image_format == "PNG" else {"quality": params.get("quality", 80)}))
+        return {"data": base64.b64encode(buffer.getvalue()).decode("ascii")}
+
+    def find_elements(self, by: str = By.ID, value: str = None) -> List[FakeElement]:
+        return [FakeElement(self, node) for node in self.nodes if _matches(node, by, value, self)]
+
+    def find_element(self, by: str = By.ID, value: str = None) -> FakeElement:
+        elements = self.find_elements(by, value)
+        if not elements:
+            raise NoSuchElementException(f"No element matches {by}={value!r} on {self.current_url}")
+        return elements[0]
+
+    def execute(self, driver_command: str, params: Optional[Dict[str, Any]] = None):
+        # Only W3C action sequences (ActionChains) are needed by the executor.
+        if driver_command == Command.W3C_ACTIONS:
+            for device in (params or {}).get("actions", []):
+                for action in device.get("actions", []):
+                    self._perform_action(device.get("type"), action)
+        return {"value": None}
+
+    def _perform_action(self, device_type: str, action: Dict[str, Any]):
+        kind = action.get("type")
+        if device_type == "pointer":
+            if kind == "pointerMove":
+                if action.get("origin") == "pointer":
+                    self._pointer = (self._pointer[0] + action.get("x", 0), self._pointer[1] + action.get("y", 0))
+                else:
+                    self._pointer = (action.get("x", 0), action.get("y", 0))
+            elif kind == "pointerUp":
+                node = self._node_at(*self._pointer)
+                if node is not None:
+                    self._click(node)
+        elif device_type == "key" and kind == "keyDown":
+            self._type(action.get("value", ""))
+
+    def _click(self, node: Dict[str, Any]):
+        self.focused = node
+        attrs = node["attrs"]
+        if node["tag"] == "a" and attrs.get("href"):
+            self.get(urllib.parse.urljoin(self.current_url, attrs["href"]))
+        elif node["form"] is not None and (node["tag"] == "button" and attrs.get("type", "submit") == "submit"
+                                           or node["tag"] == "input" and attrs.get("type") == "submit"):
+            self._submit(node["form"])
+        else:
+            self.mutations += 1
+
+    def _type(self, text: str):
+        node = self.focused
+        for char in text:
+            if char == Keys.ENTER or char == Keys.RETURN:
+                if node is not None and node["form"] is not None:
+                    self._submit(node["form"])
+                    return
+            elif node is not None and node["tag"] in ("input", "textarea"):
+                node["value"] = node.get("value", "") + char
+                self.mutations += 1
+
+    def _submit(self, form: Dict[str, Any]):
+        fields = [(n["attrs"]["name"], n.get("value", n["attrs"].get("value", ""))) for n in self.nodes
+                  if n["form"] is form and n["attrs"].get("name") and n["tag"] in ("input", "select", "textarea")]
+        target = urllib.parse.urljoin(self.current_url, form["action"] or self.current_url)
+        self.get(target.split("?", 1)[0] + "?" + urllib.parse.urlencode(fields))
+
+
+_SIMPLE_CSS = re.compile(r"^(?P<tag>[a-z0-9]+)?(?:#(?P<id>[\w-]+))?(?:\[(?P<attr>[\w-]+)=[\"']?(?P<value>[^\"'\]]*)[\"']?\])?(?::nth-of-type\((?P<nth>\d+)\))?$")
+_SIMPLE_XPATH = re.compile(r"^//(?P<tag>[a-z0-9*]+)(?:\[@(?P<attr>[\w-]+)=[\"'](?P<value>[^\"']*)[\"']\])?$")
+
+
+def _matches(node: Dict[str, Any], by: str, value: str, driver: FakeWebDriver) -> bool:
+    attrs = node["attrs"]
+    if by == By.ID: return attrs.get("id") == value
+    if by == By.NAME: return attrs.get("name") == value
+    if by == By.CLASS_NAME: return value in attrs.get("class", "").split()
+    if by == By.LINK_TEXT: return node["tag"] == "a" and node["text"] == value
+    if by == By.PARTIAL_LINK_TEXT: return node["tag"] == "a" and value in node["text"]
+    if by == By.TAG_NAME: return node["tag"] == value
+    if by == By.CSS_SELECTOR:
+        m = _SIMPLE_CSS.match(value.strip())
+        if not m: return False
+        if m["tag"] and node["tag"] != m["tag"]: return False
+        if m["id"] and attrs.get("id") != m["id"]: return False
+        if m["attr"] and attrs.get(m["attr"]) != m["value"]: return False
+        if m["nth"]:
+            same_tag = [n for n in driver.nodes if n["tag"] == node["tag"]]
+            return same_tag.index(node) + 1 == int(m["nth"])
+        return True
+    if by == By.XPATH:
+        m = _SIMPLE_XPATH.match(value.strip())
+        if not m: return False
+        if m["tag"] != "*" and node["tag"] != m["tag"]: return False
+        return not m["attr"] or attrs.get(m["attr"]) == m["value"]
+    return False
+
+
+# --- Fixture site ---
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    # Anything under /assets/ is synthesized (see FAKE_ASSET_BYTES), so pages
+    # can reference heavy subresources without checking them in.
+    latency_s = 0.0
+
+    def do_GET(self):
+        if self.latency_s > 0:
+            time.sleep(self.latency_s)
+        path = urllib.parse.urlsplit(self.path).path
+        extension = os.path.splitext(path)[1]
+        if path.startswith("/assets/") and extension in FAKE_ASSET_BYTES:
+            self._send_asset(extension)
+            return
+        super().do_GET()
+
+    def _send_asset(self, extension: str):
+        size = FAKE_ASSET_BYTES[extension]
+        if extension in (".js", ".css"):
+            body = (b"/*" + b"x" * max(0, size - 5) + b"*/\n")[:size]
+        else:
+            body = bytes(size)
+        self.send_response(200)
+        self.send_header("Content-Type", self.guess_type("asset" + extension))
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer:
+    # Serves fixtures/site (or any directory) on an ephemeral localhost port.
+    # Query strings are ignored, so "search.html?q=..." always gets the same
+    # static results page.
+    def __init__(self, root: str = FIXTURE_SITE_DIR, latency_s: float = 0.0):
+        self.root = root
+        self.latency_s = latency_s
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "FixtureServer":
+        handler = type("FixtureHandler", (_QuietHandler,), {"latency_s": self.latency_s})
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(handler, directory=self.root))
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fixture-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def url(self, path: str = "") -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/{path.lstrip('/')}"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+# --- Fake model server ---
+
+class ResourceExhausted(Exception):
+    # Same class names as google.api_core.exceptions, which is how
+    # model_client recognises retryable errors.
+    pass
+
+
+class InternalServerError(Exception):
+    pass
+
+
+class ServiceUnavailable(Exception):
+    pass
+
+
+class InvalidArgument(Exception):
+    pass
+
+
+_HTTP_ERRORS = {400: InvalidArgument, 429: ResourceExhausted, 500: InternalServerError, 503: ServiceUnavailable}
+
+
+class FakeModelServer:
+    # A localhost HTTP endpoint standing in for the Gemini API, for exercising
+    # the model client's retries, deadlines and hedging over a real socket.
+    # Each request first consumes the next (status, delay_s) entry of the
+    # script; after that it fails with failure_rate (HTTP 429), is slow with
+    # slow_rate (slow_latency_s) and otherwise answers text after latency_s.
+    def __init__(self, text: str = "{}", latency_s: float = 0.0, script: Optional[List[Tuple[int, float]]] = None,
+                 failure_rate: float = 0.0, slow_rate: float = 0.0, slow_latency_s: float = 1.0, seed: Optional[int] = None):
+        self.text = text
+        self.latency_s = latency_s
+        self.script = list(script or [])
+        self.failure_rate = failure_rate
+        self.slow_rate = slow_rate
+        self.slow_latency_s = slow_latency_s
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def _next_behaviour(self) -> Tuple[int, float]:
+        with self._lock:
+            self.requests += 1
+            if self.script:
+                return self.script.pop(0)
+            roll = self._random.random()
+        if roll < self.failure_rate:
+            return 429, self.latency_s
+        if roll < self.failure_rate + self.slow_rate:
+            return 200, self.slow_latency_s
+        return 200, self.latency_s
+
+    def start(self) -> "FakeModelServer":
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                status, delay = fake._next_behaviour()
+                if delay > 0:
+                    time.sleep(delay)
+                body = json.dumps({"text": fake.text} if status == 200 else {"error": f"HTTP {status}"}).encode("utf-8")
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client gave up on this request (deadline or hedge)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="fake-model-server", daemon=True).start()
+        return self
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/generate"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+class HttpGenerativeModel:
+    # generate_content over HTTP against FakeModelServer, raising the same
+    # exception names the real SDK does for error statuses.
+    def __init__(self, url: str, timeout_s: float = 30.0):
+        self.url = url
+        self.timeout_s = timeout_s
+
+    def generate_content(self, contents, stream: bool = False, request_options: Optional[Dict[str, Any]] = None, **kwargs):
+        parts = contents if isinstance(contents, list) else [contents]
+        payload = json.dumps({
+            "prompt": "\n".join(part for part in parts if isinstance(part, str)),
+            "image_bytes": sum(len(part.get("data", b"")) for part in parts if isinstance(part, dict)),
+        }).encode("utf-8")
+        timeout_s = (request_options or {}).get("timeout") or self.timeout_s
+        request = urllib.request.Request(self.url, data=payload, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=max(0.001, timeout_s)) as response:
+                text = json.loads(response.read().decode("utf-8"))["text"]
+        except urllib.error.HTTPError as e:
+            raise _HTTP_ERRORS.get(e.code, InternalServerError)(f"HTTP {e.code} from fake model server") from e
+        except (socket.timeout, urllib.error.URLError) as e:
+            if isinstance(e, socket.timeout) or isinstance(getattr(e, "reason", None), socket.timeout):
+                raise TimeoutError(f"fake model server did not answer within {timeout_s:.2f}s") from e
+            raise ConnectionError(str(e)) from e
+        return iter([FakeResponse(text)]) if stream else FakeResponse(text)
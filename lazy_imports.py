@@ -0,0 +1,84 @@
+import importlib
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+_registry: List["LazyImport"] = []
+_registry_lock = threading.Lock()
+
+
+class LazyImport:
+    # Stands in for a module (or one attribute of it) and imports it on first
+    # attribute access or call, recording how long the import took. Exception
+    # classes can't be proxied (an except clause needs the real class), so
+    # use lazy_import("pkg.exceptions").SomeError for those.
+    def __init__(self, module_name: str, attribute: Optional[str] = None):
+        self._module_name = module_name
+        self._attribute = attribute
+        self._target = None
+        self._lock = threading.Lock()
+        self.import_ms: Optional[float] = None
+        self.already_imported = False
+        self.first_use: Optional[str] = None
+
+    @property
+    def label(self) -> str:
+        return f"{self._module_name}.{self._attribute}" if self._attribute else self._module_name
+
+    @property
+    def loaded(self) -> bool:
+        return self._target is not None
+
+    def _load(self, used_for: str):
+        if self._target is not None:
+            return self._target
+        with self._lock:
+            if self._target is None:
+                self.already_imported = self._module_name in sys.modules
+                started = time.perf_counter()
+                module = importlib.import_module(self._module_name)
+                target = getattr(module, self._attribute) if self._attribute else module
+                self.import_ms = round((time.perf_counter() - started) * 1000, 2)
+                self.first_use = used_for
+                self._target = target
+        return self._target
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self._load(f"{self.label}.{name}"), name)
+
+    def __call__(self, *args, **kwargs):
+        return self._load(f"{self.label}(...)")(*args, **kwargs)
+
+    def __repr__(self):
+        return f"<LazyImport {self.label} ({'loaded' if self.loaded else 'not loaded'})>"
+
+
+def lazy_import(module_name: str, attribute: Optional[str] = None) -> LazyImport:
+    proxy = LazyImport(module_name, attribute)
+    with _registry_lock:
+        _registry.append(proxy)
+    return proxy
+
+
+def lazy_import_stats() -> List[Dict[str, Any]]:
+    with _registry_lock:
+        proxies = list(_registry)
+    return [{"name": proxy.label, "loaded": proxy.loaded, "import_ms": proxy.import_ms,
+             "already_imported": proxy.already_imported, "first_use": proxy.first_use} for proxy in proxies]
+
+
+def format_startup_profile(eager_import_ms: float, ready_ms: Optional[float] = None) -> str:
+    # Laid out like `python -X importtime`: time in microseconds, then the name.
+    lines = ["Startup profile (us | import):", f"{round(eager_import_ms * 1000):>10} | main.py imports (eager)"]
+    for entry in lazy_import_stats():
+        if not entry["loaded"]:
+            lines.append(f"{'-':>10} | {entry['name']} (lazy, not imported)")
+        else:
+            note = "already imported" if entry["already_imported"] else f"first use: {entry['first_use']}"
+            lines.append(f"{round(entry['import_ms'] * 1000):>10} | {entry['name']} (lazy, {note})")
+    if ready_ms is not None:
+        lines.append(f"{round(ready_ms * 1000):>10} | ready for input")
+    return "\n".join(lines)
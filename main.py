@@ -1,29 +1,76 @@
-import google.generativeai as genai
-import json
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service as ChromeService
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, WebDriverException, NoSuchWindowException, InvalidSessionIdException
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.common.action_chains import ActionChains
 import time
+_imports_started = time.perf_counter()
+import json
 import re
-from io import BytesIO
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image
 from typing import Any, Dict, List, Union
-import ast
-import operator as op
 import os
+import argparse
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from plan_cache import PlanCache, normalize_goal, apply_params, parameterize_plan
+from vision_cache import VisionResponseCache, content_hash, perceptual_hash, perceptual_hash_of_bytes
+from screenshot_pipeline import SCREENSHOT_BACKEND, PreparedScreenshot, prepare_screenshot, capture_cdp_screenshot, capture_options, pipeline_stats, encode_image
+from dom_labeler import collect_dom_elements, build_hybrid_prompt, apply_vision_ranking
+from page_settle import SettleLog, wait_for_page_settle, read_settle_state
+from plan_watchdog import WATCHDOG_ENABLED, WATCHDOG_STEP_DEADLINE_S, WATCHDOG_MAX_STEPS, WATCHDOG_MAX_MODEL_CALLS, WATCHDOG_MAX_REPEATS, \
+    Watchdog, context_fingerprint, watchdog_stats
+from browser_profile import BROWSER_PROFILES, BrowserProfile, NetworkLog, resolve_profile, configure_chrome_options, apply_network_blocking
+from prefetch import SpeculativePrefetcher
+from overlay_renderer import OverlayRenderer
+from region_diff import REGION_DIFF_ENABLED, REGION_DIFF_MAX_CHANGED_FRACTION, REGION_DIFF_MAX_REGIONS, REGION_PROMPT_SUFFIX, \
+    LabelFrame, tile_hashes, changed_regions, merge_elements, record_relabel
+from tracing import tracer
+from page_text import PAGE_TEXT_INDEX_ENABLED, PageTextIndex, build_page_text_index, is_text_read, record_reuse, record_text_read, \
+    scroll_to_block, page_text_stats
+from skill_cache import SKILL_CACHE_PATH, SKILL_REPLAY_WAIT_S, SkillRecorder, resolve_element_at, pick_repair_target, record_skill_event, \
+    skill_stats
+from read_batch import READ_BATCH_ENABLED, read_screen_group, build_batch_prompt, split_batch_answer, record_read_batch, read_batch_stats
+from model_client import ModelClient, ModelCallError
+from plan_compiler import NOT_FOUND, _PATH_NOT_FOUND_MARKER_STR, compile_path, compile_template, compile_condition, compile_plan, compile_step
+from plan_stream import StepStreamParser, StreamingPlan
+from session_pool import SessionPool, DEFAULT_POOL_SIZE, DEFAULT_MAX_RUNS_PER_SESSION
+from batch_runner import run_batch, DEFAULT_BATCH_OUTPUT
+from daemon import AgentDaemon, DAEMON_HOST, DAEMON_PORT, DAEMON_PROFILE_DIR
+from lazy_imports import lazy_import, format_startup_profile
+
+# google.generativeai and selenium take most of the startup time; they are
+# imported on first use, so exiting right away or running a JSON plan without
+# vision steps never pays for the model SDK.
+genai = lazy_import("google.generativeai")
+webdriver = lazy_import("selenium.webdriver")
+By = lazy_import("selenium.webdriver.common.by", "By")
+WebDriverWait = lazy_import("selenium.webdriver.support.ui", "WebDriverWait")
+EC = lazy_import("selenium.webdriver.support.expected_conditions")
+Keys = lazy_import("selenium.webdriver.common.keys", "Keys")
+ActionChains = lazy_import("selenium.webdriver.common.action_chains", "ActionChains")
+selenium_errors = lazy_import("selenium.common.exceptions")
 
 # --- MODIFICATION: Import the API key securely from the apikey.py file ---
-from apikey import gemini_api_key
+try:
+    from apikey import gemini_api_key
+except ImportError:
+    # Offline runs (benchmark.py with fake backends) don't need a key.
+    gemini_api_key = os.environ.get("GEMINI_API_KEY", "")
+_startup_import_ms = (time.perf_counter() - _imports_started) * 1000
 
 # --- Configuration ---
 # The hardcoded API_KEY variable has been removed.
 VISION_IMAGE_RESIZE_WIDTH = 1024
 VISION_IMAGE_RESIZE_HEIGHT = 768
+PLANNING_MODEL_NAME = 'gemini-1.5-pro-latest'
+PLAN_CACHE_ENABLED = True
+SKILL_CACHE_ENABLED = True  # successful runs of a goal are recorded and replayed with DOM selectors instead of labeling calls
+VISION_CACHE_ENABLED = True
+LABELING_MODE = "vision"  # "vision", "dom" (no model call) or "hybrid" (DOM boxes, model ranks/describes)
+PREFETCH_ENABLED = True
+PLAN_STREAMING_ENABLED = True  # interactive mode starts executing steps while the plan is still being generated
+PLAN_CALL_DEADLINE_S = 90.0  # per planning call, retries included (first chunk only when streaming)
+VISION_CALL_DEADLINE_S = 30.0
+BROWSER_PROFILE = "default"  # see browser_profile.BROWSER_PROFILES; a plan's OPEN_BROWSER data can override it
+PARALLEL_MAX_BRANCHES = 4  # browser sessions running PARALLEL branches at once; more branches wait for a free one
 
 
 # --- The "Brain" of our Assistant ---
@@ -40,6 +87,8 @@ Each step must use one of the following actions:
 
 1. OPEN_BROWSER
    data: {{ "browser": "chrome" }}
+   Optional browser profile fields: "profile": "default" | "fast" | "minimal", "page_load_strategy": "normal" | "eager" | "none", "block": ["media", "fonts", "images", "third_party_scripts"], "headless": true | false, "disk_cache_mb": 256.
+   (Use "fast" for text and form tasks; keep "images" unblocked when the screenshot must show product photos or charts.)
 
 2. NAVIGATE_TO_URL
    data: {{ "url": "https://..." or "{{placeholder}}" }}
@@ -47,9 +96,10 @@ Each step must use one of the following actions:
 3. LABEL_AND_READ_SCREEN
    This is the most important action for understanding and interacting with a page. It takes a screenshot, asks the vision model to identify and label all interactive elements (buttons, links, inputs), and stores this information in the shared context.
    data: {{
-     "context_key_to_store_labels": "homepage_elements"
+     "context_key_to_store_labels": "homepage_elements",
+     "labeling_mode": "vision" | "dom" | "hybrid"
    }}
-   (The script will store the labeled elements map under this key. You can then refer to these elements by number in subsequent CLICK or TYPE actions.)
+   (The script will store the labeled elements map under this key. You can then refer to these elements by number in subsequent CLICK or TYPE actions. "labeling_mode" is optional; "dom" reads the elements from the page source instead of the screenshot and is much faster.)
 
 4. TYPE_INTO_ELEMENT
    Can use a visual label (preferred) OR a standard Selenium locator.
@@ -81,8 +131,19 @@ Each step must use one of the following actions:
      "prompt_for_vision": "What is the main headline of the article?",
      "context_key_to_store": "article_headline"
    }}
+   For plain text that is written on the page, read it from the page text instead (no screenshot, and the whole page, not just the visible part):
+   data: {{
+     "read_mode": "text",
+     "text_query": "Return window",
+     "text_scope": "value" | "section",
+     "prompt_for_vision": "How long is the return window?",
+     "context_key_to_store": "return_window"
+   }}
+   ("value" finds the text closest to text_query and stores what follows its label, e.g. "30 days" from "Return window: 30 days"; "section" stores all text under the heading closest to text_query. If nothing matches, prompt_for_vision is asked about a screenshot instead.)
+   A vision READ_SCREEN looks at the visible part of the page. Add "capture": "full_page" to look at the whole page in one screenshot (long tables, comparisons), or "region": [x_min, y_min, x_max, y_max] in CSS pixels of the screen to look at just that part (for example the box of a labeled element).
 
 7. SCROLL_PAGE_TO_TEXT
+   Scrolls the page so the text closest to text_to_find (exact or approximate) is near the top of the screen.
    data: {{ "text_to_find": "some unique text to scroll to" }}
 
 8. CONDITIONAL_JUMP
@@ -97,36 +158,96 @@ Each step must use one of the following actions:
      "response_template": "The headline is {{article_headline}}."
    }}
 
+10. PARALLEL
+   Runs independent step sequences at the same time, each in its own browser. Every branch starts with a copy of the shared context; when all branches are done, the keys they stored are merged back and the plan continues with the next step.
+   data: {{
+     "branches": [
+       {{ "name": "site_a", "steps": [ ...steps... ] }},
+       {{ "name": "site_b", "steps": [ ...steps... ] }}
+     ],
+     "context_key_to_store": "branch_outputs"
+   }}
+   (Use distinct context keys in each branch. goto_step inside a branch counts that branch's steps. Branches cannot contain PARALLEL. "context_key_to_store" is optional and stores each branch's outputs by branch name.)
+
 --- STRATEGY ---
 1. Navigate to a URL.
 2. Use `LABEL_AND_READ_SCREEN` to see what's on the page and get labels for interactive elements.
 3. Use `CLICK_ELEMENT` or `TYPE_INTO_ELEMENT` with the `label_number` to interact with the page.
 4. Repeat labeling and interacting as needed.
-5. Use `READ_SCREEN` for general text extraction if necessary.
+5. Use `READ_SCREEN` for general text extraction if necessary, with "read_mode": "text" when the answer is a labelled value or a section of plain text on the page. Use `SCROLL_PAGE_TO_TEXT` before labeling content further down a long page.
 6. End with `ANSWER_USER`.
+7. When the goal needs the same information from several independent sites (e.g. comparing prices), put one branch per site in a `PARALLEL` step instead of visiting them one after another.
 
 --- USER'S GOAL ---
 
 {user_goal}
 """
 
+LABELING_VISION_PROMPT = """
+            Analyze this screenshot of a webpage. Identify all interactive elements (like buttons, links, input fields, text areas).
+            For each element, provide its purpose, bounding box coordinates [x_min, y_min, x_max, y_max], and assign it a unique number.
+            Return a single valid JSON object with one key, "elements", which is an array of objects. Each object must have "number", "description", and "box" keys.
+            Example:
+            {
+              "elements": [
+                { "number": 1, "description": "Sign in button", "box": [850, 20, 950, 60] },
+                { "number": 2, "description": "Search input field", "box": [300, 30, 600, 70] }
+              ]
+            }
+            """
+
 # Global variables
-driver = None
 WAIT_TIME = 10
 vision_model_name = 'gemini-1.5-flash-latest'
-vision_model = None
-shared_context = {}
-_PATH_NOT_FOUND_MARKER_STR = "[{path} not found/extracted]"
-class _NotFoundType: pass
-NOT_FOUND = _NotFoundType()
-_OPERATORS = {
-    '==': op.eq,
-    '!=': op.ne,
-    '>': op.gt,
-    '<': op.lt,
-    '>=': op.ge,
-    '<=': op.le,
-}
+planning_model = None
+_genai_configured = False
+plan_cache = PlanCache()
+skill_cache = PlanCache(path=SKILL_CACHE_PATH)
+vision_cache = VisionResponseCache()
+overlay_renderer = OverlayRenderer()
+model_client = ModelClient()
+_run_ids = itertools.count(1)
+
+class ExecutionContext:
+    # Everything one plan run touches: its browser, its vision model handle and
+    # its shared_context. The CLI uses a single long-lived instance; the session
+    # pool gives every browser session its own.
+    def __init__(self, driver=None, vision_model=None, headless: bool = False, name: str = "default", driver_factory=None,
+                 browser_profile: BrowserProfile = None):
+        self.driver = driver
+        self.driver_factory = driver_factory  # makes this context's (and its branches') browsers; Chrome if None
+        self.vision_model = vision_model
+        self.headless = headless
+        self.browser_profile = browser_profile or resolve_profile(BROWSER_PROFILE)  # stays with the browser session across runs
+        self.network_log = NetworkLog()
+        self.name = name
+        self.shared_context: Dict[str, Any] = {}
+        self.label_frames: Dict[str, LabelFrame] = {}
+        self.settle_log = SettleLog()
+        self.driver_lock = threading.Lock()  # held while driving the browser; the prefetch thread holds it for its capture
+        self.prefetcher = SpeculativePrefetcher(name=f"prefetch-{name}", driver_lock=self.driver_lock)
+        self.current_step_index = None
+        self.run_id = None
+        self.on_step = None  # called with each step record as soon as the step finishes (daemon events)
+        self.branch_contexts: List["ExecutionContext"] = []  # idle sessions kept for the next PARALLEL step
+        self.page_text_index: PageTextIndex = None
+        self.recorder: SkillRecorder = None  # set by run_plan when the run may be recorded as a skill
+        self.deferred_labels: Dict[str, Dict[str, Any]] = {}  # labeling steps a replay skipped, by context key
+        self.watchdog: Watchdog = None  # bounds the current run; set by reset_for_run
+
+    def reset_for_run(self, parent_watchdog: Watchdog = None):
+        self.run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{self.name}-{next(_run_ids)}"
+        self.shared_context = {'execution_halted': False}
+        self.label_frames = {}
+        self.page_text_index = None
+        self.deferred_labels = {}
+        self.settle_log = SettleLog()
+        self.network_log = NetworkLog()
+        self.prefetcher.reset_stats()
+        self.current_step_index = None
+        self.watchdog = Watchdog(step_deadline_s=WATCHDOG_STEP_DEADLINE_S, max_steps=WATCHDOG_MAX_STEPS,
+                                 max_model_calls=WATCHDOG_MAX_MODEL_CALLS, max_repeats=WATCHDOG_MAX_REPEATS, enabled=WATCHDOG_ENABLED,
+                                 parent=parent_watchdog)
 
 def strip_json_comments(json_text: str) -> str:
     if json_text is None: return ""
@@ -141,50 +262,129 @@ def sanitize_json_string_for_loading(s: str) -> str:
     if s is None: return ""
     return re.sub(r'[\x00-\x08\x0B\x0C\x0E-\x1F]', '', s)
 
+def _ensure_genai_configured():
+    global _genai_configured
+    if not _genai_configured:
+        genai.configure(api_key=gemini_api_key)
+        _genai_configured = True
+
+def _get_planning_model():
+    global planning_model
+    if planning_model is None:
+        _ensure_genai_configured()
+        planning_model = genai.GenerativeModel(PLANNING_MODEL_NAME)
+        print("DEBUG: Planning model configured successfully.")
+    return planning_model
+
+def _clean_plan_response_text(raw_response_text: str) -> str:
+    text_after_markdown_strip = raw_response_text.strip()
+    if text_after_markdown_strip.startswith("```json"):
+        text_after_markdown_strip = text_after_markdown_strip[len("```json"):].strip()
+    if text_after_markdown_strip.endswith("```"):
+        text_after_markdown_strip = text_after_markdown_strip[:-len("```")].strip()
+    return sanitize_json_string_for_loading(text_after_markdown_strip)
+
+def is_valid_plan(plan_data) -> bool:
+    return isinstance(plan_data, dict) and isinstance(plan_data.get('steps'), list)
+
+def _get_cached_plan(goal_template: str, goal_params: List[str], cache: PlanCache = None, kind: str = "plan"):
+    cache = cache or plan_cache
+    entry = cache.get(goal_template)
+    if entry is None:
+        print(f"DEBUG: {kind.capitalize()} cache miss for '{goal_template}'. Stats: {cache.stats()}")
+        return None
+    try:
+        cached_plan = json.loads(_clean_plan_response_text(entry["response_text"]))
+    except (json.JSONDecodeError, KeyError, AttributeError) as e:
+        print(f"DEBUG: Discarding unreadable cached {kind} for '{goal_template}': {e}")
+        cache.invalidate(goal_template)
+        return None
+    if not is_valid_plan(cached_plan):
+        print(f"DEBUG: Discarding cached {kind} without a 'steps' list for '{goal_template}'.")
+        cache.invalidate(goal_template)
+        return None
+    cached_plan = apply_params(cached_plan, entry.get("params", []), goal_params)
+    if cached_plan is None:
+        print(f"DEBUG: Cached {kind} for '{goal_template}' cannot be re-parameterized with {goal_params}. Re-planning.")
+        return None
+    print(f"DEBUG: {kind.capitalize()} cache hit for '{goal_template}' (params {goal_params}). Stats: {cache.stats()}")
+    return cached_plan
+
 def get_gemini_plan(user_goal: str): # Function definition
-    global shared_context
-    shared_context = {}
-    print("DEBUG: get_gemini_plan function called (shared_context reset).")
+    with tracer.span("plan", goal_length=len(user_goal or "")) as plan_span:
+        plan_data = _get_gemini_plan(user_goal, plan_span)
+        plan_span.set("steps", len(plan_data["steps"]) if is_valid_plan(plan_data) else None)
+        return plan_data
+
+def _is_direct_json_plan(user_input: str) -> bool:
+    try:
+        return is_valid_plan(json.loads(user_input))
+    except (json.JSONDecodeError, TypeError):
+        return False
 
+def _get_plan_without_model(user_goal: str, plan_span):
+    # A JSON plan typed by the user or a cached plan; returns (plan or None,
+    # goal_template, goal_params).
     try:
         direct_plan = json.loads(user_goal)
         if isinstance(direct_plan, dict) and "steps" in direct_plan:
             print("DEBUG: User input is valid JSON plan. Using it directly.")
-            return direct_plan
+            plan_span.set("source", "direct")
+            return direct_plan, None, None
     except json.JSONDecodeError:
         print("DEBUG: User input is not a direct JSON plan. Proceeding to LLM for planning.")
         pass
 
+    goal_template, goal_params = normalize_goal(user_goal)
+    if SKILL_CACHE_ENABLED:
+        # A recorded skill replays with DOM selectors; it beats a cached plan,
+        # which would label the screen again before every click.
+        skill_plan = _get_cached_plan(goal_template, goal_params, skill_cache, kind="skill")
+        if skill_plan is not None:
+            record_skill_event("replays")
+            plan_span.set("source", "skill")
+            return skill_plan, goal_template, goal_params
+    if PLAN_CACHE_ENABLED:
+        cached_plan = _get_cached_plan(goal_template, goal_params)
+        plan_span.set("cache_hit", cached_plan is not None)
+        if cached_plan is not None:
+            plan_span.set("source", "cache")
+            return cached_plan, goal_template, goal_params
+    return None, goal_template, goal_params
+
+def _get_gemini_plan(user_goal: str, plan_span):
+    print("DEBUG: get_gemini_plan function called.")
+
+    known_plan, goal_template, goal_params = _get_plan_without_model(user_goal, plan_span)
+    if known_plan is not None:
+        return known_plan
+
+    plan_span.set("source", "model")
     print("🧠 Assistant is thinking...")
     json_string_for_parsing = None
-    text_after_markdown_strip = None
     raw_response_text = None
     try:
         # --- MODIFICATION: Use the imported key ---
         if not gemini_api_key:
             print("ERROR: API_KEY is not set in apikey.py or is empty.")
             return None
-        genai.configure(api_key=gemini_api_key)
-        planning_model = genai.GenerativeModel('gemini-1.5-pro-latest')
-        print("DEBUG: Planning model configured successfully.")
+        model = _get_planning_model()
 
         full_prompt = PROMPT_TEMPLATE.format(user_goal=user_goal)
 
         print("DEBUG: Sending prompt to Gemini for planning...")
-        response = planning_model.generate_content(full_prompt)
+        with tracer.span("plan.model_call", model=PLANNING_MODEL_NAME, prompt_chars=len(full_prompt)) as call_span:
+            response = model_client.generate(model, PLANNING_MODEL_NAME, full_prompt, deadline_s=PLAN_CALL_DEADLINE_S)
+            raw_response_text = response.text.strip()
+            call_span.set("response_chars", len(raw_response_text))
         print("DEBUG: Received planning response from Gemini.")
 
-        raw_response_text = response.text.strip()
         print(f"DEBUG: Raw response text from Gemini (before any cleaning):\n---\n{raw_response_text}\n---")
 
-        text_after_markdown_strip = raw_response_text
-        if text_after_markdown_strip.startswith("```json"):
-            text_after_markdown_strip = text_after_markdown_strip[len("```json"):].strip()
-        if text_after_markdown_strip.endswith("```"):
-            text_after_markdown_strip = text_after_markdown_strip[:-len("```")].strip()
-
-        json_string_for_parsing = sanitize_json_string_for_loading(text_after_markdown_strip)
+        json_string_for_parsing = _clean_plan_response_text(raw_response_text)
         plan_data = json.loads(json_string_for_parsing)
+        if PLAN_CACHE_ENABLED and is_valid_plan(plan_data):
+            plan_cache.put(goal_template, json.dumps(parameterize_plan(plan_data, goal_params)), goal_params)
         return plan_data
 
     except json.JSONDecodeError as e:
@@ -202,6 +402,55 @@ def get_gemini_plan(user_goal: str): # Function definition
         print(f"DEBUG: Exception in get_gemini_plan: {str(e)} (Type: {type(e).__name__})")
         return None
 
+def get_gemini_plan_stream(user_goal: str):
+    # Like get_gemini_plan, but returns a StreamingPlan right away and fills it
+    # from a streamed planning response on a background thread, so the executor
+    # can open the browser and navigate while the rest of the plan is generated.
+    with tracer.span("plan", goal_length=len(user_goal or ""), streaming=True) as plan_span:
+        known_plan, goal_template, goal_params = _get_plan_without_model(user_goal, plan_span)
+        if known_plan is not None:
+            return StreamingPlan.completed(known_plan["steps"]) if is_valid_plan(known_plan) else None
+        if not gemini_api_key:
+            print("ERROR: API_KEY is not set in apikey.py or is empty.")
+            return None
+        plan_span.set("source", "model_stream")
+    stream = StreamingPlan()
+    threading.Thread(target=_stream_plan_into, args=(stream, user_goal, goal_template, goal_params),
+                     name="plan-stream", daemon=True).start()
+    return stream
+
+def _stream_plan_into(stream: StreamingPlan, user_goal: str, goal_template: str, goal_params: List[str]):
+    print("🧠 Assistant is thinking (streaming)...")
+    parser = StepStreamParser()
+    try:
+        model = _get_planning_model()
+        full_prompt = PROMPT_TEMPLATE.format(user_goal=user_goal)
+        with tracer.span("plan.model_call", model=PLANNING_MODEL_NAME, prompt_chars=len(full_prompt), streaming=True) as call_span:
+            chunks = 0
+            for chunk in model_client.generate_stream(model, PLANNING_MODEL_NAME, full_prompt, deadline_s=PLAN_CALL_DEADLINE_S):
+                try:
+                    chunk_text = chunk.text
+                except ValueError:
+                    continue  # chunks without text parts (e.g. the final finish_reason chunk)
+                chunks += 1
+                for step in parser.feed(chunk_text):
+                    print(f"  Step {len(stream) + 1} arrived: {step.get('action')} - {json.dumps(step.get('data', {}))}")
+                    stream.append(step)
+            call_span.update(chunks=chunks, response_chars=len(parser.text), steps=parser.steps_parsed)
+        raw_response_text = parser.text.strip()
+        print(f"DEBUG: Raw streamed planning response:\n---\n{raw_response_text}\n---")
+        plan_data = json.loads(_clean_plan_response_text(raw_response_text))
+        if not is_valid_plan(plan_data):
+            raise ValueError("The planning response has no 'steps' list.")
+        if plan_data["steps"] != stream.steps:
+            raise ValueError("The streamed steps do not match the complete plan.")
+        if PLAN_CACHE_ENABLED:
+            plan_cache.put(goal_template, json.dumps(parameterize_plan(plan_data, goal_params)), goal_params)
+        stream.finish()
+    except Exception as e:
+        print(f"DEBUG: Exception while streaming the plan: {str(e)} (Type: {type(e).__name__})")
+        stream.finish(error=f"{type(e).__name__}: {e}")
+
 def get_selenium_by(locator_type_str: str):
     if locator_type_str == "id": return By.ID
     elif locator_type_str == "name": return By.NAME
@@ -214,137 +463,447 @@ def get_selenium_by(locator_type_str: str):
         print(f"Warning: Unknown locator type '{locator_type_str}'. Defaulting to By.ID.")
         return By.ID
 
+def create_chrome_driver(headless: bool = False, profile_dir: str = None, browser_profile: BrowserProfile = None):
+    browser_profile = browser_profile or resolve_profile(BROWSER_PROFILE)
+    if headless and not browser_profile.headless:
+        browser_profile = browser_profile.with_overrides(headless=True)
+    options = configure_chrome_options(webdriver.ChromeOptions(), browser_profile, profile_dir)
+    driver = webdriver.Chrome(service=webdriver.ChromeService(), options=options)
+    apply_network_blocking(driver, browser_profile)
+    return driver
+
 def is_browser_alive(driver_instance):
     if driver_instance is None: return False
     try:
         _ = driver_instance.title
         return True
-    except (NoSuchWindowException, InvalidSessionIdException, WebDriverException) as e:
+    except (selenium_errors.NoSuchWindowException, selenium_errors.InvalidSessionIdException, selenium_errors.WebDriverException) as e:
         print(f"DEBUG: Browser session appears to be dead or unresponsive. Error: {type(e).__name__} - {e}")
         return False
 
 def _get_value_from_path(context: Dict[str, Any], path_expression: str) -> Any:
     if not isinstance(path_expression, str) or not path_expression or not isinstance(context, dict):
         return NOT_FOUND
-    m = re.match(r"^\s*([a-zA-Z_]\w*)", path_expression)
-    if not m:
-        if path_expression.strip() in context:
-            return context[path_expression.strip()]
-        return NOT_FOUND
-    var_name = m.group(1)
-    if var_name not in context:
-        return NOT_FOUND
-    current = context[var_name]
-    remainder = path_expression[m.end():].strip()
-    token_pattern = re.compile(r"""
-        ^\s*(?:
-            (?:\.\s*([a-zA-Z_]\w*))
-          | (?:\[\s*(
-                (-?\d+)
-              | (?:(?P<quote_char>['"])(.*?)(?P=quote_char))
-              )\s*\])
-        )
-    """, re.VERBOSE)
-    temp_remaining_path = remainder
-    current_value_for_loop = current
-    while temp_remaining_path:
-        token_match = token_pattern.match(temp_remaining_path)
-        if not token_match:
-            if temp_remaining_path.strip():
-                print(f"DEBUG: _get_value_from_path: Invalid path segment at: '{temp_remaining_path}' in '{path_expression}'")
-            return NOT_FOUND
-        dot_attr = token_match.group(1)
-        numeric_idx_str = token_match.group(2)
-        bracket_str_key = token_match.group(4)
-        if dot_attr is not None:
-            if isinstance(current_value_for_loop, dict):
-                if dot_attr in current_value_for_loop: current_value_for_loop = current_value_for_loop[dot_attr]
-                else: print(f"DEBUG: _get_value_from_path (dot): Key '{dot_attr}' missing in dict. Path: '{path_expression}'"); return NOT_FOUND
-            else: print(f"DEBUG: _get_value_from_path (dot): Trying to access key '{dot_attr}' but current_value is {type(current_value_for_loop)}"); return NOT_FOUND
-        elif numeric_idx_str is not None:
-            try:
-                idx_int = int(numeric_idx_str)
-                if isinstance(current_value_for_loop, list):
-                    if -len(current_value_for_loop) <= idx_int < len(current_value_for_loop): current_value_for_loop = current_value_for_loop[idx_int]
-                    else: print(f"DEBUG: _get_value_from_path (index): Index {idx_int} out of range. Path: '{path_expression}'"); return NOT_FOUND
-                else: print(f"DEBUG: _get_value_from_path (index): Trying to index a non-list. Path: '{path_expression}'"); return NOT_FOUND
-            except ValueError: print(f"DEBUG: _get_value_from_path (index): Invalid integer '{numeric_idx_str}'. Path: '{path_expression}'"); return NOT_FOUND
-        elif bracket_str_key is not None:
-            if isinstance(current_value_for_loop, dict):
-                if bracket_str_key in current_value_for_loop: current_value_for_loop = current_value_for_loop[bracket_str_key]
-                else: print(f"DEBUG: _get_value_from_path (bracket_key): Key '{bracket_str_key}' not found. Path: '{path_expression}'"); return NOT_FOUND
-            else: print(f"DEBUG: _get_value_from_path (bracket_key): Trying to access key on non-dict. Path: '{path_expression}'"); return NOT_FOUND
-        else: print(f"DEBUG: _get_value_from_path - Unhandled token. Path: '{path_expression}'"); return NOT_FOUND
-        temp_remaining_path = temp_remaining_path[token_match.end():].strip()
-    if temp_remaining_path.strip():
-        print(f"DEBUG: _get_value_from_path - Unconsumed parts for '{path_expression}'. Unparsed: '{temp_remaining_path}'")
-        return NOT_FOUND
-    return current_value_for_loop
+    return compile_path(path_expression).resolve(context)
 
 def _resolve_placeholders(template_string: str, context: dict) -> str:
     if not isinstance(template_string, str): return template_string
-    def replacer(match):
-        ph_full_path = match.group(1).strip()
-        val = _get_value_from_path(context, ph_full_path)
-        if val is NOT_FOUND: return _PATH_NOT_FOUND_MARKER_STR.format(path=ph_full_path)
-        elif val is None: return "None"
-        elif isinstance(val, list):
-            if not val: return "[empty list]"
-            return ", ".join(map(str, val))
-        else: return str(val)
-    return re.sub(r"\{([^\{\}]+)\}", replacer, template_string)
+    return compile_template(template_string).render(context)
 
 def _evaluate_condition(condition_template: str, context: Dict[str, Any]) -> bool:
-    def evaluate_single_comparison(comp_str):
-        length_pattern = r"\{([^\{\}]+?)\}\.length\s*(==|!=|<=|>=|<|>)\s*(\d+)"
-        length_match = re.fullmatch(length_pattern, comp_str.strip())
-        if length_match:
-            list_path, op_str, val_str = length_match.groups()
-            list_val = _get_value_from_path(context, list_path.strip())
-            if not isinstance(list_val, list): return False
-            return _OPERATORS[op_str](len(list_val), int(val_str))
-        comp_pattern = r"(.+?)(==|!=|<=|>=|<|>)(.+)"
-        match = re.match(comp_pattern, comp_str)
-        if not match: return bool(_get_value_from_path(context, comp_str.strip()))
-        left_str, op_str, right_str = match.groups()
-        left = _resolve_placeholders(left_str.strip(), context)
-        right = _resolve_placeholders(right_str.strip(), context)
+    return compile_condition(condition_template).evaluate(context)
+
+def _parse_labeled_elements(extracted_text: str) -> Dict[int, Dict[str, Any]]:
+    json_match = re.search(r"```json\s*([\s\S]*?)\s*```", extracted_text, re.DOTALL)
+    json_str = json_match.group(1).strip() if json_match else extracted_text
+    labeled_elements_data = json.loads(json_str)
+    return {item['number']: item for item in labeled_elements_data.get('elements', [])}
+
+def _is_parsable_label_response(extracted_text: str) -> bool:
+    try:
+        _parse_labeled_elements(extracted_text)
+        return True
+    except (json.JSONDecodeError, KeyError, TypeError, AttributeError):
+        return False
+
+def _current_url(ctx: ExecutionContext):
+    try:
+        return ctx.driver.current_url
+    except selenium_errors.WebDriverException:
+        return None
+
+def _page_before_action(ctx: ExecutionContext):
+    # URL and settle-probe docId of the document an action starts on, so the
+    # settle wait can tell the document that replaces it from the old one.
+    state = read_settle_state(ctx.driver)
+    if state is None:
+        return _current_url(ctx), None
+    return state.get("url"), state.get("docId")
+
+def _wait_for_settle(ctx: ExecutionContext, action_type: str, previous_url=None, legacy_sleep_s=None, previous_doc_id=None):
+    with tracer.span("wait.settle", action=action_type) as wait_span:
+        record = wait_for_page_settle(ctx.driver, action_type, previous_url=previous_url, legacy_sleep_s=legacy_sleep_s,
+                                      ready_states=ctx.browser_profile.ready_states, previous_doc_id=previous_doc_id)
+        wait_span.update(settled=record["settled"], polls=record["polls"], url_changed=record["url_changed"], doc_changed=record["doc_changed"])
+    ctx.settle_log.add(record)
+    outcome = "settled" if record["settled"] else "hit its timeout"
+    url_note = " (URL changed)" if record["url_changed"] else " (new document)" if record["doc_changed"] else ""
+    print(f"DEBUG: Page {outcome} after {record['waited_s']:.2f}s{url_note} following {action_type}.")
+    if ctx.browser_profile.report_network and (action_type == "NAVIGATE_TO_URL" or record["url_changed"]):
+        traffic = ctx.network_log.drain(ctx.driver, action_type, record["url"], ctx.browser_profile)
+        if traffic is not None:
+            blocked_note = f", blocked {traffic['blocked']} {traffic['blocked_by_class']}" if traffic["blocked"] else ""
+            print(f"DEBUG: Network for {record['url']}: {traffic['loaded']} of {traffic['requests']} requests loaded, "
+                  f"{traffic['bytes_loaded']} bytes{blocked_note}.")
+    return record
+
+def _get_device_pixel_ratio(ctx: ExecutionContext) -> float:
+    try:
+        return float(ctx.driver.execute_script("return window.devicePixelRatio || 1;") or 1)
+    except Exception as e:
+        print(f"DEBUG: Could not read devicePixelRatio ({e}). Assuming 1.")
+        return 1.0
+
+def _capture_screenshot(ctx: ExecutionContext, region=None, full_page: bool = False) -> PreparedScreenshot:
+    prepared = _capture_prepared_screenshot(ctx, region, full_page)
+    prepared.page_url = _current_url(ctx)
+    return prepared
+
+def _capture_prepared_screenshot(ctx: ExecutionContext, region, full_page: bool) -> PreparedScreenshot:
+    if SCREENSHOT_BACKEND == "cdp" and hasattr(ctx.driver, "execute_cdp_cmd"):
         try:
-            num_left, num_right = float(left), float(right)
-            return _OPERATORS[op_str](num_left, num_right)
-        except (ValueError, TypeError):
-            return _OPERATORS[op_str](str(left), str(right))
-    normalized_condition = condition_template.replace("{{", "{").replace("}}", "}")
-    if "||" in normalized_condition:
-        return any(evaluate_single_comparison(part) for part in normalized_condition.split("||"))
-    if "&&" in normalized_condition:
-        return all(evaluate_single_comparison(part) for part in normalized_condition.split("&&"))
-    return evaluate_single_comparison(normalized_condition)
-
-
-def execute_action(step):
-    global driver
-    global vision_model
-    global shared_context
+            with tracer.span("screenshot.capture", backend="cdp", full_page=full_page) as capture_span:
+                prepared = capture_cdp_screenshot(ctx.driver, VISION_IMAGE_RESIZE_WIDTH, VISION_IMAGE_RESIZE_HEIGHT, region=region, full_page=full_page)
+                capture_span.update(bytes=len(prepared.data), mime_type=prepared.mime_type, width=prepared.size[0], height=prepared.size[1],
+                                    device_pixel_ratio=prepared.device_pixel_ratio)
+            print(f"DEBUG: Screenshot {prepared.original_size[0]}x{prepared.original_size[1]} -> {prepared.size[0]}x{prepared.size[1]} "
+                  f"{prepared.mime_type} from the browser: {len(prepared.data)} bytes.")
+            return prepared
+        except Exception as e:
+            print(f"DEBUG: CDP screenshot failed ({type(e).__name__}: {e}). Using the WebDriver screenshot.")
+    if full_page:
+        print("DEBUG: A WebDriver screenshot can't go beyond the viewport. Capturing the viewport only.")
+    with tracer.span("screenshot.capture", backend="webdriver") as capture_span:
+        screenshot_bytes = ctx.driver.get_screenshot_as_png()
+        device_pixel_ratio = _get_device_pixel_ratio(ctx)
+        capture_span.update(bytes=len(screenshot_bytes), device_pixel_ratio=device_pixel_ratio)
+    with tracer.span("screenshot.encode") as encode_span:
+        prepared = prepare_screenshot(screenshot_bytes, VISION_IMAGE_RESIZE_WIDTH, VISION_IMAGE_RESIZE_HEIGHT, device_pixel_ratio, region=region)
+        encode_span.update(mime_type=prepared.mime_type, original_bytes=prepared.original_bytes, bytes=len(prepared.data),
+                           width=prepared.size[0], height=prepared.size[1])
+    print(f"DEBUG: Screenshot {prepared.original_size[0]}x{prepared.original_size[1]} -> {prepared.size[0]}x{prepared.size[1]} {prepared.mime_type}: "
+          f"{prepared.original_bytes} -> {len(prepared.data)} bytes (saved {prepared.bytes_saved}, total saved {pipeline_stats()['bytes_saved']}).")
+    return prepared
+
+def _get_vision_model(ctx: ExecutionContext):
+    if ctx.vision_model is None:
+        print(f"DEBUG: Initializing vision model: {vision_model_name}")
+        # --- MODIFICATION: Use the imported key ---
+        _ensure_genai_configured()
+        ctx.vision_model = genai.GenerativeModel(vision_model_name)
+    return ctx.vision_model
+
+def _generate_vision_text(ctx: ExecutionContext, prompt: str, image_bytes: bytes, image: Image.Image = None, mime_type: str = "image/png", cache_if=None,
+                          tolerant: bool = False, page_url: str = None) -> str:
+    # tolerant lets the vision cache answer from a near-identical frame of the
+    # same page; only labeling asks for that, reads need the exact image (and
+    # hash its bytes). image is the decoded frame if one is already at hand;
+    # otherwise a tolerant lookup hashes a reduced decode of image_bytes.
+    # page_url is where the image was captured (this may run on the prefetch
+    # thread, which must not touch the browser after its capture).
+    with tracer.span("vision.call", model=vision_model_name, bytes=len(image_bytes), prompt_chars=len(prompt)) as vision_span:
+        phash = None
+        if VISION_CACHE_ENABLED:
+            page = page_url or ""
+            if not tolerant:
+                phash = content_hash(image_bytes)
+            else:
+                phash = perceptual_hash(image) if image is not None else perceptual_hash_of_bytes(image_bytes)
+            cached_text = vision_cache.get(page, phash, prompt, vision_model_name, tolerant=tolerant)
+            vision_span.set("cache_hit", cached_text is not None)
+            if cached_text is not None:
+                print(f"DEBUG: Vision cache hit (hash {phash:x} on {page}). Skipping vision call. Stats: {vision_cache.stats()}")
+                return cached_text
+        deadline_s = VISION_CALL_DEADLINE_S
+        if ctx.watchdog is not None:
+            ctx.watchdog.count_model_call()  # raises WatchdogAbort once the run's budget is spent
+            deadline_s = ctx.watchdog.model_deadline(deadline_s)
+        image_part = {"mime_type": mime_type, "data": image_bytes}
+        prompt_parts = [prompt, image_part]
+        vision_response = model_client.generate(_get_vision_model(ctx), vision_model_name, prompt_parts, deadline_s=deadline_s)
+        extracted_text = vision_response.text
+        vision_span.set("response_chars", len(extracted_text))
+    if phash is not None and (cache_if is None or cache_if(extracted_text)):
+        vision_cache.put(page, phash, prompt, vision_model_name, extracted_text)
+    return extracted_text
+
+def _is_prefetchable(ctx: ExecutionContext, step) -> bool:
+    if not isinstance(step, dict): return False
+    if step.get("action") == "READ_SCREEN":
+        # The prefetcher only shoots the viewport.
+        return not (PAGE_TEXT_INDEX_ENABLED and is_text_read(step)) and not capture_options(step.get("data") or {})
+    if step.get("action") != "LABEL_AND_READ_SCREEN": return False
+    if (step.get("replay") or {}).get("deferred"): return False  # a replay only labels to repair a diverged step
+    action_data = step.get("data") or {}
+    if action_data.get("labeling_mode", LABELING_MODE) != "vision": return False
+    # A relabel of a key labeled earlier in this run is usually incremental;
+    # a speculative full labeling call would only be wasted.
+    return not (REGION_DIFF_ENABLED and action_data.get("context_key_to_store_labels", "last_labeled_elements") in ctx.label_frames)
+
+def _analyze_screen(ctx: ExecutionContext, step, screenshot: PreparedScreenshot):
+    # The model half of READ_SCREEN and vision-mode LABEL_AND_READ_SCREEN, shared
+    # by the step itself and by the speculative prefetcher.
+    action_data = step.get("data", {})
+    if step.get("action") == "READ_SCREEN":
+        prompt = action_data.get("prompt_for_vision", "Describe what you see.")
+        return screenshot, _generate_vision_text(ctx, prompt, screenshot.data, mime_type=screenshot.mime_type, page_url=screenshot.page_url)
+    prompt = LABELING_VISION_PROMPT + f"The screenshot is {screenshot.size[0]}x{screenshot.size[1]} pixels; give box coordinates in those pixels.\n"
+    print("DEBUG: Sending screenshot to Gemini for element labeling...")
+    return screenshot, _generate_vision_text(ctx, prompt, screenshot.data, screenshot.loaded_image, screenshot.mime_type, cache_if=_is_parsable_label_response,
+                                           tolerant=True, page_url=screenshot.page_url)
+
+def _relabel_incrementally(ctx: ExecutionContext, context_key: str, screenshot: PreparedScreenshot):
+    # Relabels only the parts of the screen that changed since this context key
+    # was last labeled on the same URL. Returns the elements_map, or None when
+    # a full relabel is needed (nothing to diff against, too much changed,
+    # unparsable crops), and the screenshot's tile hashes if it got that far.
+    frame = ctx.label_frames.get(context_key)
+    if frame is None or frame.url != _current_url(ctx) or frame.size != screenshot.size:
+        return None, None
+    img = screenshot.image
+    frame_hashes = tile_hashes(img)
+    old_boxes = [element['image_box'] for element in frame.elements_map.values() if element.get('image_box')]
+    regions, changed_fraction = changed_regions(frame.hashes, frame_hashes, img.size, old_boxes)
+    if not regions:
+        print(f"DEBUG: Screen unchanged since '{context_key}' was labeled. Reusing its {len(frame.elements_map)} elements.")
+        record_relabel("unchanged", frame_size=img.size)
+        return {number: dict(element) for number, element in frame.elements_map.items()}, frame_hashes
+    if changed_fraction > REGION_DIFF_MAX_CHANGED_FRACTION or len(regions) > REGION_DIFF_MAX_REGIONS:
+        print(f"DEBUG: {changed_fraction:.0%} of the screen changed in {len(regions)} regions. Relabeling it fully.")
+        return None, frame_hashes
+    with tracer.span("label.incremental", regions=len(regions), changed_fraction=round(changed_fraction, 3)) as diff_span:
+        new_elements = []
+        upload_bytes = 0
+        try:
+            for region in regions:
+                crop = img.crop(region)
+                crop_bytes, crop_mime_type = encode_image(crop)
+                upload_bytes += len(crop_bytes)
+                prompt = LABELING_VISION_PROMPT + REGION_PROMPT_SUFFIX.format(
+                    width=crop.width, height=crop.height, x=region[0], y=region[1], full_width=img.width, full_height=img.height)
+                print(f"DEBUG: Sending changed region {region} to Gemini for element labeling...")
+                crop_text = _generate_vision_text(ctx, prompt, crop_bytes, crop, crop_mime_type, cache_if=_is_parsable_label_response, tolerant=True,
+                                                  page_url=screenshot.page_url)
+                for element in _parse_labeled_elements(crop_text).values():
+                    box = element.get('box')
+                    if not box or len(box) != 4: continue
+                    image_box = [box[0] + region[0], box[1] + region[1], box[2] + region[0], box[3] + region[1]]
+                    new_elements.append(dict(element, image_box=image_box, box=screenshot.to_viewport_box(image_box)))
+        except (json.JSONDecodeError, KeyError, TypeError, AttributeError) as e:
+            print(f"DEBUG: Could not parse a region labeling response ({e}). Relabeling the screen fully.")
+            return None, frame_hashes
+        diff_span.update(upload_bytes=upload_bytes, full_frame_bytes=len(screenshot.data), new_elements=len(new_elements))
+    record_relabel("incremental", regions, img.size)
+    elements_map = merge_elements(frame.elements_map, regions, new_elements)
+    print(f"DEBUG: Relabeled {len(regions)} changed region(s) ({changed_fraction:.0%} of the screen, {upload_bytes} bytes "
+          f"instead of {len(screenshot.data)}); {len(new_elements)} elements merged into '{context_key}'.")
+    return elements_map, frame_hashes
+
+def _page_fingerprint(ctx: ExecutionContext):
+    state = read_settle_state(ctx.driver)
+    if not isinstance(state, dict): return None
+    return state.get("url"), state.get("mutations")
+
+def _start_prefetch(ctx: ExecutionContext, step_index: int, step):
+    ctx.prefetcher.start(
+        f"step {step_index + 1}",
+        fingerprint_fn=lambda: _page_fingerprint(ctx),
+        capture_fn=lambda: _capture_screenshot(ctx),
+        analyze_fn=lambda screenshot: _analyze_screen(ctx, step, screenshot),
+    )
+
+def _take_prefetched_analysis(ctx: ExecutionContext, step):
+    step_index = ctx.current_step_index
+    if step_index is None: return None
+    analysis = ctx.prefetcher.take(f"step {step_index + 1}", lambda: _page_fingerprint(ctx))
+    if analysis is not None:
+        print(f"DEBUG: Using prefetched screen analysis for step {step_index + 1}.")
+    return analysis
+
+
+def _get_page_text_index(ctx: ExecutionContext) -> PageTextIndex:
+    # Built once per document and reused until the settle probe reports a new
+    # document or any DOM mutation since the build.
+    state = read_settle_state(ctx.driver)
+    if ctx.page_text_index is not None and ctx.page_text_index.is_current(state):
+        record_reuse()
+        return ctx.page_text_index
+    with tracer.span("page_text.build") as build_span:
+        ctx.page_text_index = build_page_text_index(ctx.driver)
+        build_span.update(blocks=len(ctx.page_text_index.blocks), truncated=ctx.page_text_index.truncated)
+    print(f"DEBUG: Indexed {len(ctx.page_text_index.blocks)} text blocks in {ctx.page_text_index.built_ms:.1f} ms. Stats: {page_text_stats()}")
+    return ctx.page_text_index
+
+def _read_page_text(ctx: ExecutionContext, action_data):
+    query = _resolve_placeholders(action_data.get("text_query", ""), ctx.shared_context)
+    if not query: return None
+    with tracer.span("page_text.read", scope=action_data.get("text_scope", "value")) as read_span:
+        index = _get_page_text_index(ctx)
+        answer = index.read_section(query) if action_data.get("text_scope") == "section" else index.read_value(query)
+        read_span.set("found", answer is not None)
+    return answer
+
+def _read_screen(ctx: ExecutionContext, step, screenshot: PreparedScreenshot = None):
+    action_data = step.get("data", {})
+    context_key_to_store = action_data.get("context_key_to_store", "last_vision_response")
+    if PAGE_TEXT_INDEX_ENABLED and is_text_read(step):
+        try:
+            answer = _read_page_text(ctx, action_data)
+        except Exception as e:
+            print(f"DEBUG: Could not read the page text ({type(e).__name__}: {e}).")
+            answer = None
+        if answer is not None:
+            record_text_read()
+            ctx.shared_context[context_key_to_store] = answer
+            print(f"Stored page text in '{context_key_to_store}': {answer[:150]}...")
+            return {"success": True}
+        print(f"DEBUG: No page text matches '{action_data.get('text_query')}'. Asking the vision model instead.")
+        if not action_data.get("prompt_for_vision"):
+            step = dict(step, data=dict(action_data, prompt_for_vision=f"What does the page say about '{action_data.get('text_query')}'?"))
+    try:
+        if screenshot is not None:
+            _, vision_text = _analyze_screen(ctx, step, screenshot)
+        else:
+            options = capture_options(action_data)
+            analysis = None if options else _take_prefetched_analysis(ctx, step)
+            _, vision_text = analysis or _analyze_screen(ctx, step, _capture_screenshot(ctx, **options))
+        ctx.shared_context[context_key_to_store] = vision_text
+        print(f"Stored vision response in '{context_key_to_store}': {vision_text[:150]}...")
+    except Exception as e:
+        print(f"Error in READ_SCREEN: {e}")
+        return {"success": False, "error": f"READ_SCREEN failed: {type(e).__name__}: {e}"}
+    return {"success": True}
+
+def _execute_read_batch(group: List[Dict[str, Any]], ctx: ExecutionContext) -> List[Dict[str, Any]]:
+    # Consecutive READ_SCREEN steps look at the same page, so they share one
+    # screenshot and one vision call whose JSON answer is split back into each
+    # step's context key. If the answer can't be split, every question is asked
+    # on its own (against the same screenshot).
+    if not is_browser_alive(ctx.driver):
+        return [execute_action(step, ctx) for step in group]
+    questions = [step.get("data", {}).get("prompt_for_vision", "Describe what you see.") for step in group]
+    print(f"Executing {len(group)} READ_SCREEN steps with one vision call.")
+    screenshot, answers = None, None
+    try:
+        screenshot = _capture_screenshot(ctx)
+        vision_text = _generate_vision_text(ctx, build_batch_prompt(questions), screenshot.data, mime_type=screenshot.mime_type,
+                                            cache_if=lambda text: split_batch_answer(text, len(group)) is not None, page_url=screenshot.page_url)
+        answers = split_batch_answer(vision_text, len(group))
+        if answers is None:
+            print(f"DEBUG: Could not split the batched vision answer into {len(group)} answers: {vision_text[:200]}")
+    except Exception as e:
+        print(f"DEBUG: Batched READ_SCREEN failed ({type(e).__name__}: {e}).")
+    record_read_batch(len(group), fallback=answers is None)
+    if answers is None:
+        print("DEBUG: Asking each READ_SCREEN question separately.")
+        return [_read_screen(ctx, step, screenshot) for step in group]
+    for step, answer in zip(group, answers):
+        context_key_to_store = step.get("data", {}).get("context_key_to_store", "last_vision_response")
+        ctx.shared_context[context_key_to_store] = answer
+        print(f"Stored vision response in '{context_key_to_store}': {answer[:150]}...")
+    return [{"success": True} for _ in group]
+
+def _interact_with_element(ctx: ExecutionContext, action_type: str, action_data, element, description: str):
+    if action_type == "CLICK_ELEMENT":
+        element.click()
+        print(f"Clicked {description}")
+        return
+    text_to_type = _resolve_placeholders(action_data.get("text", ""), ctx.shared_context)
+    element.clear()
+    element.send_keys(text_to_type)
+    print(f"Typed '{text_to_type}' into {description}")
+    if action_data.get("submit_after_typing"):
+        element.send_keys(Keys.ENTER)
+        print("Submitted form by pressing Enter.")
+
+def _record_label_target(ctx: ExecutionContext, element_data, click_x: int, click_y: int, context_source: str, label_number):
+    # Resolved before the click, while the labeled screen is still showing.
+    try:
+        target = {"selector": element_data["selector"]} if element_data.get("selector") else resolve_element_at(ctx.driver, click_x, click_y)
+    except Exception as e:
+        print(f"DEBUG: Could not resolve label '{label_number}' to a DOM element ({type(e).__name__}: {e}).")
+        target = None
+    if target is None:
+        ctx.recorder.problems.append(f"step {ctx.current_step_index + 1}: no element at ({click_x}, {click_y})")
+        return
+    ctx.recorder.record_target(ctx.current_step_index, target, element_data.get("description", ""), context_source, label_number)
+    print(f"DEBUG: Recorded label '{label_number}' of step {ctx.current_step_index + 1} as '{target['selector']}'.")
+
+def _execute_replayed_step(step, ctx: ExecutionContext):
+    # A label click/type from a recorded skill: find the recorded element by
+    # its selector (or XPath) without a screenshot. Only if it is gone does
+    # this step fall back to labeling.
+    action_type = step.get("action")
+    action_data = step.get("data", {})
+    replay = step["replay"]
+    selector = action_data.get("locator", {}).get("value")
+    locators = [(By.CSS_SELECTOR, selector)] + ([(By.XPATH, replay["xpath"])] if replay.get("xpath") else [])
+    url_before_action, doc_before_action = _page_before_action(ctx)
+    try:
+        element = WebDriverWait(ctx.driver, SKILL_REPLAY_WAIT_S).until(EC.any_of(*(EC.element_to_be_clickable(locator) for locator in locators)))
+        _interact_with_element(ctx, action_type, action_data, element, f"recorded element '{selector}' ({replay.get('description')})")
+    except selenium_errors.WebDriverException as e:
+        print(f"DEBUG: Recorded element '{selector}' is not usable ({type(e).__name__}).")
+        return _repair_replayed_step(step, ctx)
+    _wait_for_settle(ctx, action_type, previous_url=url_before_action, previous_doc_id=doc_before_action)
+    record_skill_event("replayed_steps")
+    return {"success": True, "replay": "selector"}
+
+def _repair_replayed_step(step, ctx: ExecutionContext):
+    # Labels the current screen (running the deferred labeling step), picks the
+    # element that matches the recorded description and runs the step as a
+    # label click, which records the new selector for the patched skill.
+    replay = step["replay"]
+    context_source = replay.get("context_source") or "last_labeled_elements"
+    label_step = ctx.deferred_labels.get(context_source) or {"action": "LABEL_AND_READ_SCREEN", "data": {"context_key_to_store_labels": context_source}}
+    print(f"Replay diverged at step {(ctx.current_step_index or 0) + 1}. Labeling the screen to find '{replay.get('description')}'.")
+    label_result = execute_action({key: value for key, value in label_step.items() if key != "replay"}, ctx)
+    number = pick_repair_target(ctx.shared_context.get(context_source) or {}, replay.get("description"), replay.get("label_number")) \
+        if label_result.get("success") else None
+    if number is None:
+        record_skill_event("failed_repairs")
+        return {"success": False, "replay": "diverged",
+                "error": f"Replay diverged: no element matching '{replay.get('description')}' after labeling the screen again."}
+    repaired_step = {"action": step.get("action"),
+                     "data": dict(step.get("data", {}), locator={"type": "label_number", "value": number, "context_source": context_source})}
+    result = execute_action(repaired_step, ctx)
+    if result.get("success"):
+        record_skill_event("repairs")
+        if ctx.recorder is not None and ctx.current_step_index is not None:
+            ctx.recorder.repaired.append(ctx.current_step_index)
+    else:
+        record_skill_event("failed_repairs")
+    return dict(result, replay="repaired" if result.get("success") else "diverged")
+
+def execute_action(step, ctx: ExecutionContext):
+    driver = ctx.driver
+    shared_context = ctx.shared_context
 
     action_type = step.get("action")
     action_data = step.get("data", {})
 
     if action_type == "OPEN_BROWSER":
+        try:
+            requested_profile = resolve_profile(action_data, base=ctx.browser_profile)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return {"success": False, "error": f"OPEN_BROWSER: {e}"}
         if driver is not None and is_browser_alive(driver):
             print("DEBUG: Browser already open. Skipping OPEN_BROWSER.")
+            if requested_profile.launch_options != ctx.browser_profile.launch_options:
+                print(f"DEBUG: Keeping the open browser's launch options; headless/page_load_strategy/disk cache from "
+                      f"profile '{requested_profile.name}' apply to the next browser this context opens.")
+            if requested_profile.blocked_url_patterns != ctx.browser_profile.blocked_url_patterns:
+                previous_profile = ctx.browser_profile
+                ctx.browser_profile = ctx.browser_profile.with_overrides(block=requested_profile.block, blocked_urls=requested_profile.blocked_urls)
+                apply_network_blocking(driver, ctx.browser_profile, previous=previous_profile)
             return {"success": True}
         try:
-            service = ChromeService()
-            driver = webdriver.Chrome(service=service)
-            print("Opened Chrome browser successfully.")
-            time.sleep(1)
+            ctx.browser_profile = requested_profile
+            ctx.driver = _new_driver(ctx)
+            print(f"Opened Chrome browser successfully (profile '{ctx.browser_profile.name}', page load '{ctx.browser_profile.page_load_strategy}', "
+                  f"{len(ctx.browser_profile.blocked_url_patterns)} blocked URL pattern(s)).")
+            _wait_for_settle(ctx, action_type, legacy_sleep_s=1)
         except Exception as e:
             print(f"Error opening Chrome browser: {e}")
-            driver = None
+            ctx.driver = None
             return {"success": False, "critical_error": True}
         return {"success": True}
 
+    if action_type == "PARALLEL":
+        # Branches bring their own browsers, so this one needn't be open.
+        return _execute_parallel(step, ctx)
+
     if not is_browser_alive(driver) and action_type not in ["ANSWER_USER", "OPEN_BROWSER"]:
         print(f"Browser session is dead. Cannot execute action: {action_type}.")
         shared_context['execution_halted'] = True
@@ -352,69 +911,66 @@ def execute_action(step):
 
     print(f"Executing action: {action_type} with data: {json.dumps(action_data)}")
 
+    replay = step.get("replay")
+    if replay and replay.get("deferred") and action_type == "LABEL_AND_READ_SCREEN":
+        ctx.deferred_labels[action_data.get("context_key_to_store_labels", "last_labeled_elements")] = step
+        record_skill_event("deferred_labels")
+        print("Skipping labeling: the replayed steps that used its labels have recorded selectors.")
+        return {"success": True, "skipped": True, "replay": "deferred"}
+    if replay and action_type in ("CLICK_ELEMENT", "TYPE_INTO_ELEMENT"):
+        return _execute_replayed_step(step, ctx)
+
     if action_type == "LABEL_AND_READ_SCREEN":
         context_key = action_data.get("context_key_to_store_labels", "last_labeled_elements")
         print(f"Executing LABEL_AND_READ_SCREEN. Storing results in context key: '{context_key}'")
         try:
-            screenshot_bytes = driver.get_screenshot_as_png()
-            img = Image.open(BytesIO(screenshot_bytes))
-            vision_prompt = """
-            Analyze this screenshot of a webpage. Identify all interactive elements (like buttons, links, input fields, text areas).
-            For each element, provide its purpose, bounding box coordinates [x_min, y_min, x_max, y_max], and assign it a unique number.
-            Return a single valid JSON object with one key, "elements", which is an array of objects. Each object must have "number", "description", and "box" keys.
-            Example:
-            {
-              "elements": [
-                { "number": 1, "description": "Sign in button", "box": [850, 20, 950, 60] },
-                { "number": 2, "description": "Search input field", "box": [300, 30, 600, 70] }
-              ]
-            }
-            """
-            if vision_model is None:
-                print(f"DEBUG: Initializing vision model: {vision_model_name}")
-                # --- MODIFICATION: Use the imported key ---
-                genai.configure(api_key=gemini_api_key)
-                vision_model = genai.GenerativeModel(vision_model_name)
-            
-            print("DEBUG: Sending screenshot to Gemini for element labeling...")
-            image_part = {"mime_type": "image/png", "data": screenshot_bytes}
-            prompt_parts = [vision_prompt, image_part]
-            vision_response = vision_model.generate_content(prompt_parts)
-            extracted_text = vision_response.text
-
-            print(f"🤖 Vision Model Response for labels:\n---\n{extracted_text}\n---")
-            json_match = re.search(r"```json\s*([\s\S]*?)\s*```", extracted_text, re.DOTALL)
-            json_str = json_match.group(1).strip() if json_match else extracted_text
-            labeled_elements_data = json.loads(json_str)
-            elements_map = {item['number']: item for item in labeled_elements_data.get('elements', [])}
+            labeling_mode = action_data.get("labeling_mode", LABELING_MODE)
+            if labeling_mode in ("dom", "hybrid"):
+                screenshot = _capture_screenshot(ctx)
+                elements_map = collect_dom_elements(driver)
+                print(f"DEBUG: Collected {len(elements_map)} interactive elements from the DOM.")
+                if labeling_mode == "hybrid" and elements_map:
+                    print("DEBUG: Sending screenshot to Gemini to rank DOM candidates...")
+                    ranking_text = _generate_vision_text(ctx, build_hybrid_prompt(elements_map), screenshot.data, screenshot.loaded_image, screenshot.mime_type,
+                                                        tolerant=True, page_url=screenshot.page_url)
+                    try:
+                        elements_map = apply_vision_ranking(elements_map, ranking_text)
+                    except (json.JSONDecodeError, AttributeError) as e:
+                        print(f"Warning: Could not parse vision ranking ({e}). Keeping DOM order.")
+                for element in elements_map.values():
+                    element['image_box'] = screenshot.to_image_box(element['box'])
+            else:
+                analysis = _take_prefetched_analysis(ctx, step)
+                elements_map = frame_hashes = None
+                if analysis is None:
+                    screenshot = _capture_screenshot(ctx)
+                    if REGION_DIFF_ENABLED and context_key in ctx.label_frames:
+                        elements_map, frame_hashes = _relabel_incrementally(ctx, context_key, screenshot)
+                    if elements_map is None:
+                        analysis = _analyze_screen(ctx, step, screenshot)
+                if elements_map is None:
+                    screenshot, extracted_text = analysis
+                    print(f"🤖 Vision Model Response for labels:\n---\n{extracted_text}\n---")
+                    elements_map = _parse_labeled_elements(extracted_text)
+                    for element in elements_map.values():
+                        box = element.get('box')
+                        if box and len(box) == 4:
+                            element['image_box'] = box
+                            element['box'] = screenshot.to_viewport_box(box)
+                    record_relabel("full", [(0, 0, screenshot.size[0], screenshot.size[1])], screenshot.size)
+                if REGION_DIFF_ENABLED:
+                    ctx.label_frames[context_key] = LabelFrame(_current_url(ctx), screenshot.size, frame_hashes, elements_map, source=screenshot)
 
             shared_context[context_key] = elements_map
             print(f"Successfully labeled {len(elements_map)} elements and stored in context['{context_key}'].")
 
-            draw = ImageDraw.Draw(img)
-            try:
-                font_path = "arial.ttf"
-                font = ImageFont.truetype(font_path, 16)
-            except IOError:
-                print("Warning: Arial font not found. Using default font for labels.")
-                font = ImageFont.load_default()
-
-            for number, element in elements_map.items():
-                box = element.get('box')
-                if not box or len(box) != 4: continue
-                draw.rectangle(box, outline="red", width=3)
-                label_pos = (box[0], box[1] - 20 if box[1] > 20 else box[1])
-                text_bbox = draw.textbbox(label_pos, str(number), font=font)
-                draw.rectangle((text_bbox[0]-2, text_bbox[1]-2, text_bbox[2]+2, text_bbox[3]+2), fill="red")
-                draw.text(label_pos, str(number), fill="white", font=font)
-
-            labeled_screenshot_path = "screenshot_with_labels.png"
-            img.save(labeled_screenshot_path)
-            print(f"Saved labeled screenshot to '{labeled_screenshot_path}'.")
-            shared_context[f"{context_key}_summary"] = f"Found and labeled {len(elements_map)} elements. See screenshot_with_labels.png for details."
+            with tracer.span("overlay.submit", elements=len(elements_map)):
+                overlay_path = overlay_renderer.submit(screenshot.overlay_source, elements_map, ctx.run_id or ctx.name, ctx.current_step_index, context_key)
+            overlay_note = f" See {overlay_path} for details." if overlay_path else ""
+            shared_context[f"{context_key}_summary"] = f"Found and labeled {len(elements_map)} elements.{overlay_note}"
         except Exception as e:
             print(f"Error during LABEL_AND_READ_SCREEN: {e}")
-            return {"success": False}
+            return {"success": False, "error": f"LABEL_AND_READ_SCREEN failed: {type(e).__name__}: {e}"}
         return {"success": True}
 
     elif action_type == "CLICK_ELEMENT" or action_type == "TYPE_INTO_ELEMENT":
@@ -443,10 +999,23 @@ def execute_action(step):
                 return {"success": False}
             click_x = (box[0] + box[2]) // 2
             click_y = (box[1] + box[3]) // 2
+            if ctx.recorder is not None and ctx.current_step_index is not None:
+                _record_label_target(ctx, element_data, click_x, click_y, context_source, locator_value)
+            url_before_action, doc_before_action = _page_before_action(ctx)
             try:
-                actions = ActionChains(driver)
-                actions.move_by_offset(click_x, click_y).click().move_by_offset(-click_x, -click_y).perform()
-                print(f"Performed click on labeled element '{locator_value}' at approx ({click_x}, {click_y}).")
+                clicked_by_selector = False
+                selector = element_data.get('selector')
+                if selector:
+                    try:
+                        driver.find_element(By.CSS_SELECTOR, selector).click()
+                        clicked_by_selector = True
+                        print(f"Clicked labeled element '{locator_value}' via its DOM selector '{selector}'.")
+                    except selenium_errors.WebDriverException as e:
+                        print(f"DEBUG: Selector click for label '{locator_value}' failed ({type(e).__name__}). Falling back to coordinates.")
+                if not clicked_by_selector:
+                    actions = ActionChains(driver)
+                    actions.move_by_offset(click_x, click_y).click().move_by_offset(-click_x, -click_y).perform()
+                    print(f"Performed click on labeled element '{locator_value}' at approx ({click_x}, {click_y}).")
                 if action_type == "TYPE_INTO_ELEMENT":
                     text_to_type_template = action_data.get("text", "")
                     text_to_type = _resolve_placeholders(text_to_type_template, shared_context)
@@ -456,7 +1025,7 @@ def execute_action(step):
                     if action_data.get("submit_after_typing"):
                         ActionChains(driver).send_keys(Keys.ENTER).perform()
                         print("Submitted form by pressing Enter.")
-                time.sleep(1)
+                _wait_for_settle(ctx, action_type, previous_url=url_before_action, previous_doc_id=doc_before_action, legacy_sleep_s=1)
                 return {"success": True}
             except Exception as e:
                 print(f"Error interacting with labeled element '{locator_value}': {e}")
@@ -466,25 +1035,17 @@ def execute_action(step):
             if not all([locator_type, locator_value_resolved]):
                 print(f"Missing locator_type or resolved locator_value for {action_type}.")
                 return {"success": True, "skipped": True}
+            url_before_action, doc_before_action = _page_before_action(ctx)
             try:
                 by_type = get_selenium_by(locator_type)
                 if action_type == "CLICK_ELEMENT":
                     element = WebDriverWait(driver, WAIT_TIME).until(EC.element_to_be_clickable((by_type, locator_value_resolved)))
-                    element.click()
-                    print(f"Clicked element found by {locator_type}: '{locator_value_resolved}'")
-                elif action_type == "TYPE_INTO_ELEMENT":
+                else:
                     element = WebDriverWait(driver, WAIT_TIME).until(EC.visibility_of_element_located((by_type, locator_value_resolved)))
-                    text_to_type_template = action_data.get("text", "")
-                    text_to_type = _resolve_placeholders(text_to_type_template, shared_context)
-                    element.clear()
-                    element.send_keys(text_to_type)
-                    print(f"Typed '{text_to_type}' into element found by {locator_type}: '{locator_value_resolved}'")
-                    if action_data.get("submit_after_typing"):
-                        element.send_keys(Keys.ENTER)
-                        print("Submitted form by pressing Enter.")
-                time.sleep(2)
+                _interact_with_element(ctx, action_type, action_data, element, f"element found by {locator_type}: '{locator_value_resolved}'")
+                _wait_for_settle(ctx, action_type, previous_url=url_before_action, previous_doc_id=doc_before_action, legacy_sleep_s=2)
                 return {"success": True}
-            except TimeoutException:
+            except selenium_errors.TimeoutException:
                 print(f"Timeout: Element not found/visible/clickable for {action_type} ({locator_type}='{locator_value_resolved}')")
                 return {"success": True, "skipped": True}
             except Exception as e:
@@ -497,34 +1058,38 @@ def execute_action(step):
         if url and not _PATH_NOT_FOUND_MARKER_STR.format(path='')[:-1] in url:
             driver.get(url)
             print(f"Navigated to URL: {url}")
-            time.sleep(1)
+            _wait_for_settle(ctx, action_type, legacy_sleep_s=1)
         else:
             print(f"Skipping navigation due to unresolved placeholder in URL: {url_template}")
         return {"success": True}
 
     elif action_type == "READ_SCREEN":
-        custom_vision_prompt = action_data.get("prompt_for_vision", "Describe what you see.")
-        context_key_to_store = action_data.get("context_key_to_store", "last_vision_response")
+        return _read_screen(ctx, step)
+
+    elif action_type == "SCROLL_PAGE_TO_TEXT":
+        text_to_find = _resolve_placeholders(action_data.get("text_to_find", ""), shared_context)
+        if not text_to_find:
+            print("Missing text_to_find for SCROLL_PAGE_TO_TEXT.")
+            return {"success": True, "skipped": True}
         try:
-            screenshot_bytes = driver.get_screenshot_as_png()
-            if vision_model is None:
-                # --- MODIFICATION: Use the imported key ---
-                genai.configure(api_key=gemini_api_key)
-                vision_model = genai.GenerativeModel(vision_model_name)
-            image_part = {"mime_type": "image/png", "data": screenshot_bytes}
-            prompt_parts = [custom_vision_prompt, image_part]
-            vision_response = vision_model.generate_content(prompt_parts)
-            shared_context[context_key_to_store] = vision_response.text
-            print(f"Stored vision response in '{context_key_to_store}': {vision_response.text[:150]}...")
+            match = _get_page_text_index(ctx).find(text_to_find)
+            if match is None:
+                print(f"No text on the page matches '{text_to_find}'. Not scrolling.")
+                return {"success": True, "skipped": True}
+            block, score = match
+            scroll_y = scroll_to_block(driver, block)
+            print(f"Scrolled to '{block['text'][:80]}' (match {score}, section '{' > '.join(block['section'])}', scrollY {scroll_y}).")
+            _wait_for_settle(ctx, action_type)
         except Exception as e:
-            print(f"Error in READ_SCREEN: {e}")
+            print(f"Error in SCROLL_PAGE_TO_TEXT: {e}")
+            return {"success": False, "error": f"SCROLL_PAGE_TO_TEXT failed: {type(e).__name__}: {e}"}
         return {"success": True}
 
     elif action_type == "ANSWER_USER":
         response_template = action_data.get("response_template", "Task completed.")
         final_answer = _resolve_placeholders(response_template, shared_context)
         print(f"\n🤖 Assistant to User: {final_answer}\n")
-        return {"success": True}
+        return {"success": True, "final_answer": final_answer}
 
     elif action_type == "CONDITIONAL_JUMP":
         condition_template = action_data.get("condition")
@@ -539,33 +1104,348 @@ def execute_action(step):
         print(f"Unknown or not-yet-implemented action type: {action_type}")
         return {"success": True, "skipped": True}
 
+def run_plan(steps: Union[List[Dict[str, Any]], StreamingPlan], ctx: ExecutionContext, goal: str = None) -> Dict[str, Any]:
+    # Given the goal the plan was made for, a clean run is recorded as a skill
+    # (see skill_cache.py) that later runs of the same goal template replay.
+    ctx.recorder = SkillRecorder() if SKILL_CACHE_ENABLED and goal and not _is_direct_json_plan(goal) else None
+    with tracer.span("run", session=ctx.name, steps=len(steps) if isinstance(steps, list) else None) as run_span:
+        result = _run_plan(steps, ctx)
+        run_span.update(success=result["success"], executed_steps=len(result["steps"]))
+    if ctx.recorder is not None:
+        _remember_skill(goal, steps.steps if isinstance(steps, StreamingPlan) else steps, result, ctx.recorder)
+        ctx.recorder = None
+    return result
+
+def _remember_skill(goal: str, steps: List[Dict[str, Any]], result: Dict[str, Any], recorder: SkillRecorder):
+    goal_template, goal_params = normalize_goal(goal)
+    replayed = any(isinstance(step, dict) and "replay" in step for step in steps)
+    clean = result["success"] and all(record["success"] and (not record["skipped"] or record.get("replay") == "deferred")
+                                      for record in result["steps"])
+    if not clean:
+        record_skill_event("not_recorded")
+        if replayed:
+            print(f"DEBUG: Replaying the skill for '{goal_template}' failed. Dropping it; the goal will be planned again.")
+            skill_cache.invalidate(goal_template)
+        return
+    if replayed and not recorder.repaired:
+        return  # replayed as recorded; nothing to patch
+    replay_steps = recorder.build(steps)
+    if replay_steps is None:
+        record_skill_event("not_recorded")
+        print(f"DEBUG: Not recording a skill for '{goal_template}': {'; '.join(recorder.problems) or 'the replay plan does not check'}.")
+        return
+    if not any("replay" in step for step in replay_steps):
+        return  # nothing to replay differently from the cached plan
+    skill_cache.put(goal_template, json.dumps(parameterize_plan({"steps": replay_steps}, goal_params)), goal_params)
+    record_skill_event("recorded")
+    patched = f" (patched step(s) {', '.join(str(index + 1) for index in recorder.repaired)})" if recorder.repaired else ""
+    print(f"DEBUG: Recorded skill for '{goal_template}' with {len(recorder.targets)} selector step(s){patched}. Stats: {skill_stats()}")
+
+def _check_plan(steps: List[Dict[str, Any]]) -> List[str]:
+    compiled_plan = compile_plan(steps)
+    for warning in compiled_plan.warnings:
+        print(f"Warning: {warning}")
+    for error in compiled_plan.errors:
+        print(f"Plan error: {error}")
+    return compiled_plan.errors
+
+def _next_step(steps, index: int):
+    if isinstance(steps, StreamingPlan):
+        return steps.get(index)
+    return steps[index] if index < len(steps) else None
+
+def _run_plan(steps: Union[List[Dict[str, Any]], StreamingPlan], ctx: ExecutionContext, shared_context: Dict[str, Any] = None,
+              parent_watchdog: Watchdog = None) -> Dict[str, Any]:
+    ctx.reset_for_run(parent_watchdog)
+    if shared_context is not None:
+        ctx.shared_context = shared_context
+    run_started = time.perf_counter()
+    streaming = isinstance(steps, StreamingPlan)
+    plan_errors = [] if streaming else _check_plan(steps)
+    if plan_errors:
+        print("Refusing to execute a plan with errors.")
+        return {
+            "success": False,
+            "halted": True,
+            "plan_errors": plan_errors,
+            "final_answer": None,
+            "steps": [],
+            "duration_s": round(time.perf_counter() - run_started, 4),
+            "settle": ctx.settle_log.summary(),
+        }
+    # A streamed plan is checked step by step as it arrives, and as a whole
+    # (context keys, jump targets) once the stream is complete.
+    stream_checked = not streaming
+    step_records = []
+    final_answer = None
+    halted = False
+    current_step_index = 0
+
+    while True:
+        if ctx.shared_context.get('execution_halted', False):
+            print("DEBUG: Plan execution was previously halted.")
+            halted = True
+            break
+
+        step_to_execute = _next_step(steps, current_step_index)
+        if not stream_checked:
+            if steps.done:
+                stream_checked = True
+                plan_errors = [f"Plan stream failed: {steps.error}"] if steps.error else _check_plan(steps.steps)
+            elif step_to_execute is not None:
+                plan_errors = compile_step(step_to_execute, current_step_index + 1)[1]
+                for error in plan_errors:
+                    print(f"Plan error: {error}")
+            elif steps.error:
+                plan_errors = [f"Plan stream failed: {steps.error}"]
+            if plan_errors:
+                print("Halting streamed plan execution due to plan errors.")
+                halted = True
+                break
+        if step_to_execute is None:
+            break
+
+        # Steps of a streamed plan are only batched once the whole plan is checked.
+        read_group = read_screen_group(steps, current_step_index) if READ_BATCH_ENABLED and stream_checked else []
+        if not ctx.watchdog.begin_step(current_step_index, step_to_execute.get("action"), max(1, len(read_group))):
+            print(f"Halting plan execution: {ctx.watchdog.abort['message']}")
+            halted = True
+            break
+        step_started = time.perf_counter()
+        ctx.current_step_index = current_step_index
+        # Waits for a prefetch capture still in flight; the step may then use its result.
+        with ctx.driver_lock:
+            if len(read_group) > 1:
+                with tracer.span("step", index=current_step_index + 1, action="READ_SCREEN", batched=len(read_group), session=ctx.name) as step_span:
+                    executed = list(zip(read_group, _execute_read_batch(read_group, ctx)))
+                    step_span.update(success=all(result.get("success", False) for _, result in executed))
+            else:
+                with tracer.span("step", index=current_step_index + 1, action=step_to_execute.get("action"), session=ctx.name) as step_span:
+                    action_result_obj = execute_action(step_to_execute, ctx)
+                    step_span.update(success=bool(action_result_obj.get("success", False)), skipped=bool(action_result_obj.get("skipped", False)))
+                executed = [(step_to_execute, action_result_obj)]
+        step_duration_s = time.perf_counter() - step_started
+        ctx.watchdog.end_step(len(executed))
+        for offset, (executed_step, action_result_obj) in enumerate(executed):
+            step_records.append({
+                "index": current_step_index + offset + 1,
+                "action": executed_step.get("action"),
+                "success": bool(action_result_obj.get("success", False)),
+                "skipped": bool(action_result_obj.get("skipped", False)),
+                "duration_s": round(step_duration_s / len(executed), 4),
+            })
+            if len(executed) > 1:
+                step_records[-1]["batched"] = len(executed)
+            if action_result_obj.get("error"):
+                step_records[-1]["error"] = action_result_obj["error"]
+            if action_result_obj.get("branches"):
+                step_records[-1]["branches"] = action_result_obj["branches"]
+            if action_result_obj.get("replay"):
+                step_records[-1]["replay"] = action_result_obj["replay"]
+            if ctx.on_step is not None:
+                ctx.on_step(step_records[-1])
+            if "final_answer" in action_result_obj:
+                final_answer = action_result_obj["final_answer"]
+
+        if not action_result_obj.get("success", False) and action_result_obj.get("critical_error", False):
+            print("Halting plan execution due to critical error.")
+            halted = True
+            break
+        if ctx.watchdog.abort is not None:
+            print(f"Halting plan execution: {ctx.watchdog.abort['message']}")
+            halted = True
+            break
+
+        jump_target = action_result_obj.get("jump_to_step")
+        if jump_target is not None:
+            target_0_indexed = jump_target - 1
+            if 0 <= target_0_indexed and (target_0_indexed < len(steps) or streaming and not steps.done):
+                if target_0_indexed <= current_step_index and not ctx.watchdog.check_jump(
+                        target_0_indexed, context_fingerprint(ctx.shared_context), _page_fingerprint(ctx)):
+                    print(f"Halting plan execution: {ctx.watchdog.abort['message']}")
+                    halted = True
+                    break
+                current_step_index = target_0_indexed
+            else:
+                print(f"DEBUG: Invalid jump target {jump_target}. Proceeding sequentially.")
+                current_step_index += 1
+        else:
+            current_step_index += len(executed)
+
+        # A READ_SCREEN that starts a batch is answered by the batched call, not a prefetch.
+        next_is_batch = READ_BATCH_ENABLED and stream_checked and len(read_screen_group(steps, current_step_index)) > 1
+        if PREFETCH_ENABLED and current_step_index < len(steps) and _is_prefetchable(ctx, steps[current_step_index]) \
+                and not next_is_batch and is_browser_alive(ctx.driver):
+            _start_prefetch(ctx, current_step_index, steps[current_step_index])
+
+    ctx.prefetcher.discard()
+    ctx.current_step_index = None
+    if not halted:
+        print("Finished executing all planned steps.")
+    settle_summary = ctx.settle_log.summary()
+    print(f"DEBUG: Page settle summary for this plan: {settle_summary}")
+    result = {
+        "success": not halted,
+        "halted": halted,
+        "final_answer": final_answer,
+        "steps": step_records,
+        "duration_s": round(time.perf_counter() - run_started, 4),
+        "settle": settle_summary,
+        "network": ctx.network_log.summary(),
+        "prefetch": ctx.prefetcher.stats(),
+        "models": model_client.stats(),
+        "watchdog": ctx.watchdog.summary(),
+    }
+    if ctx.watchdog.abort is not None:
+        result["abort"] = ctx.watchdog.abort
+        print(f"DEBUG: Watchdog abort report: {json.dumps(ctx.watchdog.abort)}. Totals: {watchdog_stats()}")
+    if plan_errors:
+        result["plan_errors"] = plan_errors
+    if streaming:
+        result["plan_stream"] = steps.stats()
+    return result
+
+def _new_driver(ctx: ExecutionContext):
+    if ctx.driver_factory is None:
+        return create_chrome_driver(headless=ctx.headless, browser_profile=ctx.browser_profile)
+    driver = ctx.driver_factory()
+    apply_network_blocking(driver, ctx.browser_profile)
+    return driver
+
+def _acquire_branch_context(ctx: ExecutionContext) -> ExecutionContext:
+    if ctx.branch_contexts:
+        return ctx.branch_contexts.pop()
+    # Branches share the parent's model handle; vision calls go through
+    # model_client, which lets them run concurrently.
+    return ExecutionContext(vision_model=ctx.vision_model, headless=ctx.headless, driver_factory=ctx.driver_factory, browser_profile=ctx.browser_profile,
+                            name=f"{ctx.name}-branch-{next(_run_ids)}")
+
+def _run_branch(name: str, branch_steps: List[Dict[str, Any]], branch_ctx: ExecutionContext, base_context: Dict[str, Any],
+                parent_watchdog: Watchdog = None) -> Dict[str, Any]:
+    with tracer.span("branch", branch=name, session=branch_ctx.name) as branch_span:
+        if not is_browser_alive(branch_ctx.driver):
+            with tracer.span("branch.open_browser"):
+                branch_ctx.driver = _new_driver(branch_ctx)
+        # The branch gets its own top-level copy of the context: values are
+        # shared until the branch stores a key, and stores never reach the
+        # parent or the other branches until the join. Model calls count
+        # against the parent run's budget.
+        result = _run_plan(branch_steps, branch_ctx, shared_context=dict(base_context), parent_watchdog=parent_watchdog)
+        branch_span.update(success=result["success"], steps=len(result["steps"]))
+    return result
+
+def _execute_parallel(step, ctx: ExecutionContext) -> Dict[str, Any]:
+    action_data = step.get("data", {})
+    branches = action_data.get("branches") or []
+    names = [str(branch.get("name") or f"branch-{number}") for number, branch in enumerate(branches, 1)]
+    print(f"Forking {len(branches)} branches: {', '.join(names)}")
+    base_context = dict(ctx.shared_context)
+    branch_ctxs = [_acquire_branch_context(ctx) for _ in branches]
+    outcomes = []
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(len(branches), PARALLEL_MAX_BRANCHES)), thread_name_prefix="branch") as pool:
+            futures = [pool.submit(_run_branch, name, branch["steps"], branch_ctx, base_context, ctx.watchdog)
+                       for name, branch, branch_ctx in zip(names, branches, branch_ctxs)]
+            for name, branch_ctx, future in zip(names, branch_ctxs, futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {"success": False, "halted": True, "steps": [], "final_answer": None, "duration_s": None,
+                              "error": f"{type(e).__name__}: {e}"}
+                outcomes.append((name, result, branch_ctx.shared_context))
+    finally:
+        for branch_ctx in branch_ctxs:
+            if is_browser_alive(branch_ctx.driver):
+                ctx.branch_contexts.append(branch_ctx)
+            else:
+                close_context(branch_ctx)
+
+    # Join: every key a branch stored (new, or rebound to a different object)
+    # is merged into the parent in branch order; conflicting values are reported.
+    merged, owners, conflicts, outputs, summaries = {}, {}, [], {}, []
+    for name, result, branch_context in outcomes:
+        written = {key: value for key, value in branch_context.items()
+                   if key != "execution_halted" and (key not in base_context or base_context[key] is not value)}
+        for key, value in written.items():
+            if key in merged and merged[key] != value:
+                conflicts.append(f"'{key}' from '{owners[key]}' overwritten by '{name}'")
+            merged[key], owners[key] = value, name
+        outputs[name] = written
+        summaries.append({"name": name, "success": result.get("success", False), "halted": result.get("halted", False),
+                          "steps": len(result.get("steps", [])), "duration_s": result.get("duration_s"),
+                          "final_answer": result.get("final_answer")})
+        if result.get("error"):
+            summaries[-1]["error"] = result["error"]
+    ctx.shared_context.update(merged)
+    if action_data.get("context_key_to_store"):
+        ctx.shared_context[action_data["context_key_to_store"]] = outputs
+    for conflict in conflicts:
+        print(f"Warning: PARALLEL join conflict: {conflict}.")
+    failed = [summary["name"] for summary in summaries if not summary["success"]]
+    print(f"Joined {len(summaries)} branches: merged {len(merged)} key(s){f', failed: {failed}' if failed else ''}.")
+    result = {"success": not failed, "branches": summaries}
+    if conflicts:
+        result["conflicts"] = conflicts
+    if failed:
+        result["error"] = f"PARALLEL branches failed: {', '.join(failed)}"
+    return result
+
+def close_context(ctx: ExecutionContext):
+    for branch_ctx in ctx.branch_contexts:
+        close_context(branch_ctx)
+    ctx.branch_contexts = []
+    ctx.prefetcher.shutdown()
+    if ctx.driver is not None:
+        try:
+            ctx.driver.quit()
+        except selenium_errors.WebDriverException as e:
+            print(f"DEBUG: Error while closing browser for context '{ctx.name}': {e}")
+        ctx.driver = None
+
+def create_session_pool(size: int, max_runs_per_session: int = DEFAULT_MAX_RUNS_PER_SESSION) -> SessionPool:
+    def context_factory(session_id: int) -> ExecutionContext:
+        return ExecutionContext(driver=create_chrome_driver(headless=True), headless=True, name=f"session-{session_id}")
+    return SessionPool(
+        size,
+        context_factory=context_factory,
+        is_alive=lambda ctx: is_browser_alive(ctx.driver),
+        close=close_context,
+        max_runs_per_session=max_runs_per_session,
+    )
+
 def main():
-    global driver
     print("DEBUG: Main function started...")
     print("Hello! I am your AI Assistant. How can I help you today?")
     print("Type 'exit' to quit.")
 
-    current_step_index = 0
-    actual_steps = None
-
-    while True:
-        if current_step_index == 0:
+    ctx = ExecutionContext()
+    try:
+        while True:
             user_input = input("You: ")
             if user_input.lower() == 'exit':
-                if driver and is_browser_alive(driver):
-                    print("Closing browser...")
-                    driver.quit()
                 print("Goodbye!")
                 break
-            
+
             # --- MODIFICATION: Use the imported key ---
-            if not gemini_api_key:
+            # A JSON plan typed at the prompt runs without a key unless it has vision steps.
+            if not gemini_api_key and not _is_direct_json_plan(user_input):
                 print("CRITICAL ERROR: API Key is not set in apikey.py. Please edit the file.")
                 break
 
+            if PLAN_STREAMING_ENABLED:
+                streamed_plan = get_gemini_plan_stream(user_goal=user_input)
+                if streamed_plan is None:
+                    print("Sorry, I couldn't create a valid plan for that.\n")
+                    continue
+                print("\n📝 Executing the plan as it is generated...")
+                result = run_plan(streamed_plan, ctx, goal=user_input)
+                if result.get("plan_errors") and not result["steps"]:
+                    print("Sorry, I couldn't create a valid plan for that.\n")
+                continue
+
             parsed_plan = get_gemini_plan(user_goal=user_input)
 
-            if parsed_plan and isinstance(parsed_plan.get('steps'), list):
+            if parsed_plan and is_valid_plan(parsed_plan):
                 actual_steps = parsed_plan['steps']
                 print("\n📝 Here is the plan I came up with:")
                 for i, step_item in enumerate(actual_steps, 1):
@@ -573,52 +1453,119 @@ def main():
                 print("\nAttempting to execute the plan...")
             else:
                 print("Sorry, I couldn't create a valid plan for that.\n")
-                actual_steps = None
-                continue
-
-            shared_context['execution_halted'] = False
-            current_step_index = 0
-
-        if actual_steps and current_step_index < len(actual_steps):
-            step_to_execute = actual_steps[current_step_index]
-
-            if shared_context.get('execution_halted', False):
-                print("DEBUG: Plan execution was previously halted.")
-                current_step_index = 0
-                actual_steps = None
                 continue
 
-            action_result_obj = execute_action(step_to_execute)
+            run_plan(actual_steps, ctx, goal=user_input)
+    finally:
+        # However the loop ends (exit, no API key, Ctrl+C, EOF), close the
+        # branch browsers of PARALLEL steps and the prefetch thread as well.
+        if ctx.driver is not None or ctx.branch_contexts:
+            print("Closing browser...")
+        close_context(ctx)
 
-            if not action_result_obj.get("success", False) and action_result_obj.get("critical_error", False):
-                print("Halting plan execution due to critical error.")
-                current_step_index = 0
-                actual_steps = None
-                continue
-
-            jump_target = action_result_obj.get("jump_to_step")
-            if jump_target is not None:
-                target_0_indexed = jump_target - 1
-                if 0 <= target_0_indexed < len(actual_steps):
-                    current_step_index = target_0_indexed
-                else:
-                    print(f"DEBUG: Invalid jump target {jump_target}. Proceeding sequentially.")
-                    current_step_index += 1
-            else:
-                current_step_index += 1
-
-            if current_step_index >= len(actual_steps):
-                print("Finished executing all planned steps.")
-                current_step_index = 0
-                actual_steps = None
-        else:
-            current_step_index = 0
-            actual_steps = None
-
-    if driver and is_browser_alive(driver):
-        print("Final cleanup: Closing browser...")
-        driver.quit()
+def run_batch_mode(input_path: str, output_path: str, concurrency: int, max_runs_per_session: int):
+    pool = create_session_pool(concurrency, max_runs_per_session)
+    try:
+        return run_batch(input_path, output_path, pool, plan_fn=get_gemini_plan, run_fn=run_plan, is_valid_plan=is_valid_plan)
+    finally:
+        pool.shutdown()
+
+def _plan_steps_for_daemon(user_goal: str):
+    if PLAN_STREAMING_ENABLED:
+        return get_gemini_plan_stream(user_goal=user_goal)
+    parsed_plan = get_gemini_plan(user_goal=user_goal)
+    return parsed_plan["steps"] if is_valid_plan(parsed_plan) else None
+
+def _warm_up_context(ctx: ExecutionContext):
+    # Pay for configuring the model handles before the first request, not during it.
+    if gemini_api_key:
+        _get_planning_model()
+        _get_vision_model(ctx)
+
+def create_daemon(host: str = DAEMON_HOST, port: int = DAEMON_PORT, profile_dir: str = DAEMON_PROFILE_DIR,
+                  headless: bool = False, context_factory=None) -> AgentDaemon:
+    def default_context_factory() -> ExecutionContext:
+        return ExecutionContext(driver=create_chrome_driver(headless=headless, profile_dir=profile_dir), headless=headless, name="daemon")
+    return AgentDaemon(
+        context_factory=context_factory or default_context_factory,
+        plan_fn=_plan_steps_for_daemon,
+        run_fn=run_plan,
+        is_valid_plan=is_valid_plan,
+        is_alive=lambda ctx: is_browser_alive(ctx.driver),
+        close=close_context,
+        warm_up=_warm_up_context,
+        host=host,
+        port=port,
+    )
+
+def run_daemon_mode(host: str, port: int, profile_dir: str, headless: bool):
+    daemon = create_daemon(host, port, profile_dir or None, headless)
+    daemon.start()
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        print("Stopping the daemon...")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Mini, the AI web assistant.")
+    parser.add_argument("--batch", metavar="JSONL", help="Run goals or plans from a JSONL file instead of the interactive prompt.")
+    parser.add_argument("--output", default=DEFAULT_BATCH_OUTPUT, help="Where --batch writes one result record per line.")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_POOL_SIZE, help="Number of headless browser sessions for --batch.")
+    parser.add_argument("--trace-out", metavar="PATH", help="Write collected trace spans on exit: JSONL if PATH ends in .jsonl, otherwise Chrome trace-event JSON for about:tracing/Perfetto.")
+    parser.add_argument("--no-overlays", action="store_true", help="Don't write labeled screenshots (debug artifacts) at all.")
+    parser.add_argument("--no-skill-cache", action="store_true", help="Don't record successful runs as replayable skills or replay them.")
+    parser.add_argument("--no-stream-plan", action="store_true", help="Wait for the complete plan before executing it (interactive mode).")
+    parser.add_argument("--daemon", action="store_true", help="Stay resident with a warm browser and accept goals/plans over localhost HTTP (see daemon.py).")
+    parser.add_argument("--port", type=int, default=DAEMON_PORT, help="Port for --daemon.")
+    parser.add_argument("--profile-dir", default=DAEMON_PROFILE_DIR, help="Persistent Chrome profile for --daemon; empty for a throwaway profile.")
+    parser.add_argument("--headless", action="store_true", help="Run the --daemon browser headless.")
+    parser.add_argument("--browser-profile", choices=sorted(BROWSER_PROFILES), help=f"Browser profile for every session (default '{BROWSER_PROFILE}'): "
+                        "page-load strategy, blocked resource classes, disk cache. A plan's OPEN_BROWSER data can override it.")
+    parser.add_argument("--screenshot-backend", choices=("cdp", "webdriver"), help=f"How screenshots are taken (default '{SCREENSHOT_BACKEND}'): "
+                        "'cdp' has Chrome clip, scale and JPEG-encode them; 'webdriver' takes a PNG and re-encodes it here.")
+    parser.add_argument("--max-steps", type=int, help=f"Stop a plan run after this many executed steps, jumps included (default {WATCHDOG_MAX_STEPS}).")
+    parser.add_argument("--max-model-calls", type=int, help=f"Stop a plan run after this many vision calls (default {WATCHDOG_MAX_MODEL_CALLS}).")
+    parser.add_argument("--step-deadline", type=float, help=f"Wall-clock seconds one step may take before the run is stopped (default {WATCHDOG_STEP_DEADLINE_S:g}).")
+    parser.add_argument("--profile-startup", action="store_true", help="Print import timings at startup and, on exit, which heavy dependencies were loaded lazily.")
+    parser.add_argument("--max-runs-per-session", type=int, default=DEFAULT_MAX_RUNS_PER_SESSION, help="Recycle a browser session after this many runs.")
+    return parser.parse_args(argv)
+
+def apply_watchdog_args(args):
+    # 0 is a limit too: --max-model-calls 0 runs a plan without vision calls.
+    global WATCHDOG_MAX_STEPS, WATCHDOG_MAX_MODEL_CALLS, WATCHDOG_STEP_DEADLINE_S
+    if args.max_steps is not None:
+        WATCHDOG_MAX_STEPS = args.max_steps
+    if args.max_model_calls is not None:
+        WATCHDOG_MAX_MODEL_CALLS = args.max_model_calls
+    if args.step_deadline is not None:
+        WATCHDOG_STEP_DEADLINE_S = args.step_deadline
 
 if __name__ == "__main__":
     print("DEBUG: Script started...")
-    main()
+    args = parse_args()
+    if args.no_overlays:
+        overlay_renderer.enabled = False
+    if args.no_stream_plan:
+        PLAN_STREAMING_ENABLED = False
+    if args.no_skill_cache:
+        SKILL_CACHE_ENABLED = False
+    if args.browser_profile:
+        BROWSER_PROFILE = args.browser_profile
+    if args.screenshot_backend:
+        SCREENSHOT_BACKEND = args.screenshot_backend
+    apply_watchdog_args(args)
+    if args.profile_startup:
+        print(format_startup_profile(_startup_import_ms, (time.perf_counter() - _imports_started) * 1000))
+    try:
+        if args.daemon:
+            run_daemon_mode(DAEMON_HOST, args.port, args.profile_dir, args.headless)
+        elif args.batch:
+            run_batch_mode(args.batch, args.output, args.concurrency, args.max_runs_per_session)
+        else:
+            main()
+    finally:
+        overlay_renderer.shutdown()
+        if args.trace_out:
+            tracer.export(args.trace_out)
+        if args.profile_startup:
+            print(format_startup_profile(_startup_import_ms))
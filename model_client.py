@@ -0,0 +1,305 @@
+import bisect
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional
+
+from tracing import tracer
+
+# --- Configuration ---
+MODEL_RATE_LIMITS_RPM = {  # requests per minute per model; others use MODEL_DEFAULT_RPM
+    "gemini-1.5-pro-latest": 60,
+    "gemini-1.5-flash-latest": 300,
+}
+MODEL_DEFAULT_RPM = 120
+MODEL_RATE_BURST = 5
+MODEL_MAX_CONCURRENCY = 8  # in-flight calls per model, hedges included
+MODEL_MAX_RETRIES = 3
+MODEL_BACKOFF_BASE_S = 0.5
+MODEL_BACKOFF_MAX_S = 8.0
+MODEL_DEFAULT_DEADLINE_S = 60.0
+MODEL_HEDGING_ENABLED = True
+MODEL_HEDGE_PERCENTILE = 95  # send a duplicate once a call is slower than this percentile...
+MODEL_HEDGE_MIN_SAMPLES = 20  # ...of at least this many earlier calls to the same model
+
+# Matched by class name so google.api_core doesn't have to be imported here;
+# the fake backends raise classes with the same names.
+RETRYABLE_ERROR_NAMES = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError", "DeadlineExceeded",
+    "GatewayTimeout", "BadGateway", "Aborted", "Unavailable",
+}
+_LATENCY_BUCKETS_MS = [25, 50, 100, 200, 400, 800, 1600, 3200, 6400, 12800, 25600, 51200]
+
+
+class ModelCallError(Exception):
+    def __init__(self, model_name: str, attempts: int, last_error: Optional[BaseException], reason: str = "failed"):
+        self.model_name = model_name
+        self.attempts = attempts
+        self.last_error = last_error
+        self.reason = reason
+        detail = f"{type(last_error).__name__}: {last_error}" if last_error is not None else "no attempt completed"
+        super().__init__(f"{model_name} call {reason} after {attempts} attempt(s) ({detail})")
+
+
+class _AttemptTimeout(Exception):
+    pass
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, (TimeoutError, ConnectionError, _AttemptTimeout)): return True
+    return any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(error).__mro__)
+
+
+class TokenBucket:
+    def __init__(self, rate_per_s: float, burst: int):
+        self.rate_per_s = rate_per_s
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate_per_s)
+        self._updated = now
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait_s = (1 - self._tokens) / self.rate_per_s
+            if deadline is not None:
+                if now + wait_s > deadline: return False
+            time.sleep(wait_s)
+
+
+class LatencyHistogram:
+    # Fixed log-spaced buckets; percentiles are the upper bound of the bucket
+    # the rank falls in, which is plenty for hedging thresholds and reports.
+    def __init__(self, bounds_ms: List[int] = _LATENCY_BUCKETS_MS):
+        self.bounds_ms = bounds_ms
+        self.counts = [0] * (len(bounds_ms) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        ms = seconds * 1000
+        with self._lock:
+            self.counts[bisect.bisect_left(self.bounds_ms, ms)] += 1
+            self.total += 1
+            self.sum_ms += ms
+
+    def percentile(self, pct: float) -> Optional[float]:
+        with self._lock:
+            if not self.total: return None
+            rank = max(1, round(pct / 100 * self.total))
+            seen = 0
+            for index, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank:
+                    bound_ms = self.bounds_ms[index] if index < len(self.bounds_ms) else self.bounds_ms[-1] * 2
+                    return bound_ms / 1000
+        return None
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            labels = [f"<={b}ms" for b in self.bounds_ms] + [f">{self.bounds_ms[-1]}ms"]
+            buckets = {label: count for label, count in zip(labels, self.counts) if count}
+            mean_ms = round(self.sum_ms / self.total, 1) if self.total else None
+        return {"count": self.total, "mean_ms": mean_ms, "p50_s": self.percentile(50), "p95_s": self.percentile(95),
+                "p99_s": self.percentile(99), "buckets": buckets}
+
+
+class _ModelState:
+    def __init__(self, model_name: str, rpm: float, burst: int, max_concurrency: int):
+        self.limiter = TokenBucket(rpm / 60.0, burst)
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.histogram = LatencyHistogram()
+        self.lock = threading.Lock()
+        self.counters = {"calls": 0, "attempts": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "failures": 0, "throttled_s": 0.0}
+
+    def count(self, key: str, amount=1):
+        with self.lock:
+            self.counters[key] += amount
+
+
+class ModelClient:
+    # One shared layer in front of every generate_content call: a token bucket
+    # per model, bounded in-flight calls, jittered exponential backoff on
+    # retryable errors (429/5xx/timeouts), a deadline per call and, once enough
+    # latencies are known, a hedged duplicate for calls slower than the p95.
+    def __init__(self, max_retries: int = MODEL_MAX_RETRIES, backoff_base_s: float = MODEL_BACKOFF_BASE_S,
+                 backoff_max_s: float = MODEL_BACKOFF_MAX_S, hedging: bool = MODEL_HEDGING_ENABLED,
+                 rate_limits_rpm: Optional[Dict[str, float]] = None, default_rpm: float = MODEL_DEFAULT_RPM,
+                 burst: int = MODEL_RATE_BURST, max_concurrency: int = MODEL_MAX_CONCURRENCY, seed: Optional[int] = None):
+        self.max_retries = max_retries
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self.hedging = hedging
+        self.rate_limits_rpm = dict(MODEL_RATE_LIMITS_RPM if rate_limits_rpm is None else rate_limits_rpm)
+        self.default_rpm = default_rpm
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self._random = random.Random(seed)
+        self._states: Dict[str, _ModelState] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency * 2, thread_name_prefix="model-call")
+
+    def _state(self, model_name: str) -> _ModelState:
+        with self._lock:
+            state = self._states.get(model_name)
+            if state is None:
+                rpm = self.rate_limits_rpm.get(model_name, self.default_rpm)
+                state = self._states[model_name] = _ModelState(model_name, rpm, self.burst, self.max_concurrency)
+            return state
+
+    def _backoff(self, attempt: int) -> float:
+        with self._lock:
+            return self._random.uniform(0, min(self.backoff_max_s, self.backoff_base_s * 2 ** (attempt - 1)))
+
+    def _throttle(self, state: _ModelState, deadline: float) -> bool:
+        started = time.monotonic()
+        acquired = state.limiter.acquire(timeout=max(0.0, deadline - started))
+        waited = time.monotonic() - started
+        if waited > 0.001:
+            state.count("throttled_s", waited)
+        return acquired
+
+    def _submit(self, state: _ModelState, model, contents, timeout_s: float, kwargs):
+        def call():
+            started = time.perf_counter()
+            try:
+                response = model.generate_content(contents, request_options={"timeout": timeout_s}, **kwargs)
+                _ = response.text  # surface blocked/empty responses inside the attempt
+                state.histogram.record(time.perf_counter() - started)
+                return response
+            finally:
+                state.slots.release()
+        return self._executor.submit(call)
+
+    def _attempt(self, state: _ModelState, model_name: str, model, contents, deadline: float, kwargs):
+        remaining = deadline - time.monotonic()
+        if not state.slots.acquire(timeout=max(0.0, remaining)):
+            raise _AttemptTimeout(f"no free {model_name} slot before the deadline")
+        futures = [self._submit(state, model, contents, remaining, kwargs)]
+        hedge_after = state.histogram.percentile(MODEL_HEDGE_PERCENTILE) if self.hedging else None
+        if hedge_after is not None and state.histogram.total >= MODEL_HEDGE_MIN_SAMPLES and hedge_after < remaining:
+            done, _ = wait(futures, timeout=hedge_after)
+            # A hedge only goes out if it fits the rate limit and a slot right now.
+            if not done and state.limiter.try_acquire():
+                if state.slots.acquire(blocking=False):
+                    futures.append(self._submit(state, model, contents, deadline - time.monotonic(), kwargs))
+                    state.count("hedges")
+        pending = list(futures)
+        last_error = None
+        while pending:
+            done, _ = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                raise _AttemptTimeout(f"{model_name} call exceeded its deadline")
+            for future in done:
+                pending.remove(future)
+                if future.exception() is None:
+                    if future is not futures[0]:
+                        state.count("hedge_wins")
+                    return future.result()
+                last_error = future.exception()
+        raise last_error
+
+    def generate(self, model, model_name: str, contents, deadline_s: float = MODEL_DEFAULT_DEADLINE_S, **kwargs):
+        state = self._state(model_name)
+        state.count("calls")
+        deadline = time.monotonic() + deadline_s
+        last_error: Optional[BaseException] = None
+        attempt = 0
+        while attempt <= self.max_retries:
+            attempt += 1
+            if not self._throttle(state, deadline):
+                break
+            state.count("attempts")
+            with tracer.span("model.attempt", model=model_name, attempt=attempt) as attempt_span:
+                try:
+                    return self._attempt(state, model_name, model, contents, deadline, kwargs)
+                except Exception as e:
+                    last_error = e
+                    attempt_span.set("error", f"{type(e).__name__}: {e}")
+            if not is_retryable(last_error):
+                state.count("failures")
+                raise ModelCallError(model_name, attempt, last_error, reason="failed with a non-retryable error") from last_error
+            delay = self._backoff(attempt)
+            if attempt > self.max_retries or time.monotonic() + delay >= deadline:
+                break
+            state.count("retries")
+            print(f"DEBUG: {model_name} attempt {attempt} failed ({type(last_error).__name__}). Retrying in {delay:.2f}s.")
+            time.sleep(delay)
+        state.count("failures")
+        reason = "ran out of retries" if attempt > self.max_retries else "hit its deadline"
+        raise ModelCallError(model_name, attempt, last_error, reason=reason) from last_error
+
+    def generate_stream(self, model, model_name: str, contents, deadline_s: float = MODEL_DEFAULT_DEADLINE_S, **kwargs) -> Iterator[Any]:
+        # Retries only until the first chunk arrives; after that a failure is
+        # the caller's to handle. The slot is held for the whole stream. The
+        # deadline covers the first chunk only.
+        state = self._state(model_name)
+        state.count("calls")
+        deadline = time.monotonic() + deadline_s
+        last_error: Optional[BaseException] = None
+        attempt = 0
+        while attempt <= self.max_retries:
+            attempt += 1
+            if not self._throttle(state, deadline) or not state.slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                break
+            state.count("attempts")
+            started = time.perf_counter()
+            try:
+                chunks = iter(model.generate_content(contents, stream=True, request_options={"timeout": deadline - time.monotonic()}, **kwargs))
+                first_chunk = next(chunks, None)
+            except Exception as e:
+                state.slots.release()
+                last_error = e
+                if not is_retryable(e):
+                    state.count("failures")
+                    raise ModelCallError(model_name, attempt, e, reason="failed with a non-retryable error") from e
+                delay = self._backoff(attempt)
+                if attempt > self.max_retries or time.monotonic() + delay >= deadline:
+                    break
+                state.count("retries")
+                print(f"DEBUG: {model_name} stream attempt {attempt} failed ({type(e).__name__}). Retrying in {delay:.2f}s.")
+                time.sleep(delay)
+                continue
+            return self._rest_of_stream(state, first_chunk, chunks, started)
+        state.count("failures")
+        raise ModelCallError(model_name, attempt, last_error, reason="could not start streaming")
+
+    def _rest_of_stream(self, state: _ModelState, first_chunk, chunks, started: float) -> Iterator[Any]:
+        try:
+            if first_chunk is not None:
+                yield first_chunk
+                yield from chunks
+            state.histogram.record(time.perf_counter() - started)
+        finally:
+            state.slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            states = dict(self._states)
+        report = {}
+        for model_name, state in states.items():
+            with state.lock:
+                counters = dict(state.counters)
+            counters["throttled_s"] = round(counters["throttled_s"], 3)
+            report[model_name] = dict(counters, latency=state.histogram.snapshot())
+        return report
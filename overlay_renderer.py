@@ -0,0 +1,167 @@
+import os
+import queue
+import re
+import shutil
+import threading
+from functools import lru_cache
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from PIL import Image, ImageDraw, ImageFont
+
+# --- Configuration ---
+OVERLAY_ENABLED = True
+OVERLAY_DIR = "overlays"
+OVERLAY_FORMAT = "PNG"  # "PNG", "JPEG" or "WEBP"
+OVERLAY_QUALITY = 80  # JPEG/WEBP only
+OVERLAY_RETENTION_RUNS = 20  # newest run directories kept; 0 keeps everything
+OVERLAY_QUEUE_SIZE = 8
+OVERLAY_FONT_SIZE = 16
+OVERLAY_FONT_CANDIDATES = ("arial.ttf", "DejaVuSans.ttf")
+
+_EXTENSIONS = {"PNG": "png", "JPEG": "jpg", "WEBP": "webp"}
+_UNSAFE_FILENAME_CHARS = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+@lru_cache(maxsize=8)
+def get_label_font(size: int = OVERLAY_FONT_SIZE):
+    for font_path in OVERLAY_FONT_CANDIDATES:
+        try:
+            return ImageFont.truetype(font_path, size)
+        except IOError:
+            continue
+    print("Warning: Arial font not found. Using default font for labels.")
+    return ImageFont.load_default()
+
+
+def draw_labels(image: Image.Image, labels: List[Tuple[Any, List[int]]], font=None) -> Image.Image:
+    font = font or get_label_font()
+    draw = ImageDraw.Draw(image)
+    for number, box in labels:
+        draw.rectangle(box, outline="red", width=3)
+        label_pos = (box[0], box[1] - 20 if box[1] > 20 else box[1])
+        text_bbox = draw.textbbox(label_pos, str(number), font=font)
+        draw.rectangle((text_bbox[0]-2, text_bbox[1]-2, text_bbox[2]+2, text_bbox[3]+2), fill="red")
+        draw.text(label_pos, str(number), fill="white", font=font)
+    return image
+
+
+def _safe_name(value: Any) -> str:
+    return _UNSAFE_FILENAME_CHARS.sub("_", str(value)).strip("_") or "run"
+
+
+class OverlayRenderer:
+    # Draws the numbered boxes over labeled screenshots and writes them to
+    # <output_dir>/<run_id>/step-NN-<context key>.<ext> on a background thread.
+    # submit() never blocks: when the queue is full the frame is dropped and
+    # counted, because a debug artifact is never worth stalling a plan for.
+    def __init__(self, output_dir: str = OVERLAY_DIR, fmt: str = OVERLAY_FORMAT, quality: int = OVERLAY_QUALITY,
+                 retention_runs: int = OVERLAY_RETENTION_RUNS, queue_size: int = OVERLAY_QUEUE_SIZE, enabled: bool = OVERLAY_ENABLED):
+        fmt = fmt.upper()
+        if fmt not in _EXTENSIONS:
+            raise ValueError(f"Unsupported overlay format '{fmt}'. Choose from: {', '.join(_EXTENSIONS)}.")
+        self.output_dir = output_dir
+        self.fmt = fmt
+        self.quality = quality
+        self.retention_runs = retention_runs
+        self.enabled = enabled
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._known_runs: List[str] = []
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def path_for(self, run_id: str, step_index: Optional[int], context_key: str) -> str:
+        step_part = f"step-{step_index + 1:02d}" if step_index is not None else "step-xx"
+        filename = f"{step_part}-{_safe_name(context_key)}.{_EXTENSIONS[self.fmt]}"
+        return os.path.join(self.output_dir, _safe_name(run_id), filename)
+
+    def submit(self, image: Union[Image.Image, bytes], elements_map: Dict[int, Dict[str, Any]], run_id: str,
+               step_index: Optional[int], context_key: str) -> Optional[str]:
+        if not self.enabled: return None
+        labels = [(number, list(element["image_box"])) for number, element in elements_map.items()
+                  if element.get("image_box") and len(element["image_box"]) == 4]
+        path = self.path_for(run_id, step_index, context_key)
+        self._ensure_worker()
+        try:
+            # The worker draws on its own copy; the caller's image is left
+            # untouched for caches and later diffs. Encoded bytes (the same
+            # object that was uploaded) are decoded on the worker instead.
+            self._queue.put_nowait({"image": image, "labels": labels, "path": path, "run_id": _safe_name(run_id)})
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            print(f"DEBUG: Overlay queue full. Dropped labeled screenshot for '{path}'.")
+            return None
+        with self._lock:
+            self.submitted += 1
+        return path
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._work, name="overlay-renderer", daemon=True)
+                self._thread.start()
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None: return
+                self._render(job)
+            except Exception as e:
+                with self._lock:
+                    self.failed += 1
+                print(f"DEBUG: Could not write overlay '{job['path']}': {type(e).__name__}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _render(self, job: Dict[str, Any]):
+        source = job["image"]
+        image = Image.open(BytesIO(source)).convert("RGB") if isinstance(source, (bytes, bytearray, memoryview)) else source.copy()
+        image = draw_labels(image, job["labels"])
+        os.makedirs(os.path.dirname(job["path"]), exist_ok=True)
+        if self.fmt == "PNG":
+            image.save(job["path"], format="PNG")
+        else:
+            image.convert("RGB").save(job["path"], format=self.fmt, quality=self.quality)
+        with self._lock:
+            self.written += 1
+        self._enforce_retention(job["run_id"])
+
+    def _enforce_retention(self, run_id: str):
+        if self.retention_runs <= 0: return
+        if run_id in self._known_runs: return
+        self._known_runs.append(run_id)
+        try:
+            run_dirs = [os.path.join(self.output_dir, name) for name in os.listdir(self.output_dir)]
+        except OSError:
+            return
+        run_dirs = sorted((d for d in run_dirs if os.path.isdir(d)), key=os.path.getmtime)
+        for stale_dir in run_dirs[:-self.retention_runs]:
+            shutil.rmtree(stale_dir, ignore_errors=True)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        # Waits until every queued frame is written (or the timeout passes).
+        if self._thread is None: return True
+        done = threading.Event()
+        threading.Thread(target=lambda: (self._queue.join(), done.set()), daemon=True).start()
+        return done.wait(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"enabled": self.enabled, "submitted": self.submitted, "written": self.written,
+                    "dropped": self.dropped, "failed": self.failed, "queued": self._queue.qsize()}
+
+    def shutdown(self, timeout: Optional[float] = 10.0):
+        if self._thread is None: return
+        self.flush(timeout)
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        self._thread = None
@@ -0,0 +1,153 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+# --- Configuration ---
+SETTLE_POLL_INTERVAL = 0.05
+SETTLE_QUIET_WINDOW_MS = 300
+SETTLE_MAX_WAIT = 15.0
+SETTLE_DEFAULT_TIMEOUT = 5.0
+# Per-action wait ceilings (seconds) and how long the DOM must stay unchanged.
+SETTLE_TIMEOUTS = {
+    "OPEN_BROWSER": 2.0,
+    "NAVIGATE_TO_URL": 10.0,
+    "CLICK_ELEMENT": 5.0,
+    "TYPE_INTO_ELEMENT": 3.0,
+    "SCROLL_PAGE_TO_TEXT": 2.0,
+}
+SETTLE_QUIET_WINDOWS_MS = {
+    "OPEN_BROWSER": 0,
+    "TYPE_INTO_ELEMENT": 150,
+    "SCROLL_PAGE_TO_TEXT": 150,
+}
+
+# Installed once per document. Counts DOM mutations and in-flight fetch/XHR
+# requests so the poller can tell when the page has gone quiet. Re-installed
+# automatically after a navigation replaces the document, which also gets a
+# fresh docId (so same-URL reloads are told apart).
+SETTLE_PROBE_JS = r"""
+if (!window.__miniSettle) {
+  const state = { docId: Math.random().toString(36).slice(2), mutations: 0, lastMutation: performance.now(), pending: 0 };
+  window.__miniSettle = state;
+  try {
+    new MutationObserver(() => { state.mutations++; state.lastMutation = performance.now(); })
+      .observe(document, { subtree: true, childList: true, attributes: true, characterData: true });
+  } catch (e) {}
+  if (window.fetch) {
+    const originalFetch = window.fetch;
+    window.fetch = function () {
+      state.pending++;
+      return originalFetch.apply(this, arguments).finally(() => { state.pending = Math.max(0, state.pending - 1); });
+    };
+  }
+  // Set when a navigation starts to replace this document; until the new
+  // document answers (with another docId) the page is not settled.
+  const markUnloading = () => { state.unloading = true; };
+  window.addEventListener('beforeunload', markUnloading);
+  window.addEventListener('pagehide', markUnloading);
+  window.addEventListener('pageshow', () => { state.unloading = false; });  // back/forward cache restore
+  const originalSend = XMLHttpRequest.prototype.send;
+  XMLHttpRequest.prototype.send = function () {
+    state.pending++;
+    this.addEventListener('loadend', () => { state.pending = Math.max(0, state.pending - 1); }, { once: true });
+    return originalSend.apply(this, arguments);
+  };
+}
+const s = window.__miniSettle;
+// A new wait starts its quiet window now, so a click that navigates a moment
+// later is not mistaken for an already-settled page.
+if (arguments[0]) s.lastMutation = performance.now();
+return {
+  readyState: document.readyState,
+  url: location.href,
+  docId: s.docId,
+  unloading: !!s.unloading,
+  mutations: s.mutations,
+  pending: s.pending,
+  quietMs: performance.now() - s.lastMutation
+};
+"""
+
+
+class SettleLog:
+    def __init__(self):
+        self.records: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, record: Dict[str, Any]):
+        with self._lock:
+            self.records.append(record)
+
+    def reset(self):
+        with self._lock:
+            self.records = []
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            records = list(self.records)
+        waited = sum(r["waited_s"] for r in records)
+        legacy = sum(r.get("legacy_sleep_s") or 0 for r in records)
+        return {
+            "waits": len(records),
+            "timeouts": sum(1 for r in records if r["timed_out"]),
+            "total_wait_s": round(waited, 3),
+            "legacy_sleep_s": round(legacy, 3),
+            "saved_s": round(legacy - waited, 3),
+        }
+
+
+def read_settle_state(driver, restart_quiet_window: bool = False) -> Optional[Dict[str, Any]]:
+    try:
+        return driver.execute_script(SETTLE_PROBE_JS, restart_quiet_window)
+    except Exception:
+        # Mid-navigation the old document is gone and the new one is not ready.
+        return None
+
+
+def wait_for_page_settle(driver, action_type: str, previous_url: Optional[str] = None,
+                         timeout: Optional[float] = None, legacy_sleep_s: Optional[float] = None,
+                         ready_states: Sequence[str] = ("complete",), previous_doc_id: Optional[str] = None) -> Dict[str, Any]:
+    # previous_url/previous_doc_id describe the document the action started on
+    # (see read_settle_state). Once that document is seen unloading, only a
+    # different docId (the new document, in one of ready_states) can settle,
+    # so a click that starts a navigation is not reported settled on the old
+    # page. A URL change with the same docId is a same-document (pushState or
+    # hash) navigation and settles as usual.
+    if timeout is None:
+        timeout = SETTLE_TIMEOUTS.get(action_type, SETTLE_DEFAULT_TIMEOUT)
+    timeout = min(timeout, SETTLE_MAX_WAIT)
+    quiet_window_ms = SETTLE_QUIET_WINDOWS_MS.get(action_type, SETTLE_QUIET_WINDOW_MS)
+    started = time.perf_counter()
+    deadline = started + timeout
+    state = None
+    settled = False
+    polls = 0
+    leaving_doc_id = None
+    while True:
+        state = read_settle_state(driver, restart_quiet_window=(polls == 0))
+        polls += 1
+        if state is not None and state.get("unloading"):
+            leaving_doc_id = state.get("docId")
+        replaced = leaving_doc_id is None or (state is not None and state.get("docId") != leaving_doc_id)
+        if state is not None and replaced and not state.get("unloading") and state.get("readyState") in ready_states \
+                and not state.get("pending") and state.get("quietMs", 0) >= quiet_window_ms:
+            settled = True
+            break
+        if time.perf_counter() >= deadline:
+            break
+        time.sleep(SETTLE_POLL_INTERVAL)
+    waited = time.perf_counter() - started
+    current_url = state.get("url") if state else None
+    current_doc_id = state.get("docId") if state else None
+    return {
+        "action": action_type,
+        "waited_s": round(waited, 4),
+        "settled": settled,
+        "timed_out": not settled,
+        "polls": polls,
+        "url_changed": previous_url is not None and current_url is not None and current_url != previous_url,
+        "url": current_url,
+        "doc_changed": previous_doc_id is not None and current_doc_id is not None and current_doc_id != previous_doc_id,
+        "pending_requests": state.get("pending") if state else None,
+        "legacy_sleep_s": legacy_sleep_s,
+    }
@@ -0,0 +1,214 @@
+import difflib
+import re
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# --- Configuration ---
+PAGE_TEXT_INDEX_ENABLED = True
+PAGE_TEXT_MAX_BLOCKS = 3000
+PAGE_TEXT_MAX_BLOCK_CHARS = 400
+PAGE_TEXT_MATCH_THRESHOLD = 0.75  # fuzzy score (0-1) a block needs to count as a match
+PAGE_TEXT_SCROLL_MARGIN = 80  # CSS pixels left above the matched block after scrolling
+
+# Runs in the page. One round trip returns every visible block of text (the
+# nearest block-level ancestor of each text node, so inline markup doesn't
+# split sentences) with its document-coordinate rect and the heading path it
+# sits under. The settle probe's document id and mutation counter come back
+# with it, so the index can tell when it has gone stale.
+COLLECT_PAGE_TEXT_JS = r"""
+const maxBlocks = arguments[0];
+const maxChars = arguments[1];
+const BLOCK_TAGS = /^(P|LI|TD|TH|H[1-6]|DT|DD|LABEL|BUTTON|A|DIV|SECTION|ARTICLE|HEADER|FOOTER|NAV|MAIN|ASIDE|FIGCAPTION|BLOCKQUOTE|PRE|CAPTION|OPTION|SUMMARY|LEGEND)$/;
+const SKIP_TAGS = /^(SCRIPT|STYLE|NOSCRIPT|TEMPLATE|SVG)$/;
+const root = document.body || document.documentElement;
+const blocks = new Map();
+const entries = [];
+const headings = [];
+const walker = document.createTreeWalker(root, NodeFilter.SHOW_TEXT, {
+  acceptNode(node) { return node.nodeValue.trim() ? NodeFilter.FILTER_ACCEPT : NodeFilter.FILTER_REJECT; }
+});
+let node;
+let truncated = false;
+while ((node = walker.nextNode())) {
+  let el = node.parentElement;
+  if (!el || SKIP_TAGS.test(el.tagName) || el.closest('script,style,noscript,template,svg')) continue;
+  while (el !== root && !BLOCK_TAGS.test(el.tagName) && el.parentElement) el = el.parentElement;
+  let entry = blocks.get(el);
+  if (!entry) {
+    if (entries.length >= maxBlocks) { truncated = true; break; }
+    const style = getComputedStyle(el);
+    const r = el.getBoundingClientRect();
+    if (style.display === 'none' || style.visibility === 'hidden' || (r.width === 0 && r.height === 0)) continue;
+    const tag = el.tagName.toLowerCase();
+    const level = /^h[1-6]$/.test(tag) ? Number(tag[1]) : 0;
+    entry = { text: '', tag: tag, level: level, section: [],
+              rect: [r.left + scrollX, r.top + scrollY, r.right + scrollX, r.bottom + scrollY] };
+    blocks.set(el, entry);
+    entries.push(entry);
+  }
+  entry.text = (entry.text + ' ' + node.nodeValue).replace(/\s+/g, ' ').trim().slice(0, maxChars);
+}
+for (const entry of entries) {
+  if (entry.level) { headings.length = entry.level - 1; headings[entry.level - 1] = entry.text; }
+  entry.section = headings.filter(Boolean);
+}
+const s = window.__miniSettle;
+return {
+  url: location.href,
+  docId: s ? s.docId : null,
+  mutations: s ? s.mutations : null,
+  scrollY: window.scrollY,
+  viewportHeight: window.innerHeight,
+  truncated: truncated,
+  blocks: entries
+};
+"""
+
+SCROLL_TO_Y_JS = "window.scrollTo(0, arguments[0]); return window.scrollY;"
+
+_WORD = re.compile(r"\w+")
+
+_stats_lock = threading.Lock()
+_stats = {"builds": 0, "reuses": 0, "lookups": 0, "matches": 0, "text_reads": 0, "build_ms": 0.0}
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(_WORD.findall((text or "").casefold()))
+
+
+def text_similarity(query: str, text: str) -> float:
+    # 1.0 when the (normalized) query appears verbatim; otherwise the best
+    # difflib ratio between the query and any run of words in the text of
+    # the same length, so a typo or a reworded label still matches.
+    query, text = normalize_text(query), normalize_text(text)
+    if not query or not text: return 0.0
+    if query in text: return 1.0
+    query_words, text_words = query.split(), text.split()
+    width = len(query_words)
+    best = 0.0
+    matcher = difflib.SequenceMatcher(autojunk=False)
+    matcher.set_seq2(query)
+    for start in range(max(1, len(text_words) - width + 1)):
+        matcher.set_seq1(" ".join(text_words[start:start + width]))
+        if matcher.real_quick_ratio() <= best or matcher.quick_ratio() <= best: continue
+        best = max(best, matcher.ratio())
+    return best
+
+
+class PageTextIndex:
+    # The text of one document as returned by COLLECT_PAGE_TEXT_JS. It stays
+    # valid while the page is the same document (settle probe docId) and its
+    # mutation counter hasn't moved.
+    def __init__(self, snapshot: Dict[str, Any], built_ms: float = 0.0):
+        self.url = snapshot.get("url")
+        self.document_id = snapshot.get("docId")
+        self.mutations = snapshot.get("mutations")
+        self.truncated = bool(snapshot.get("truncated"))
+        self.blocks: List[Dict[str, Any]] = snapshot.get("blocks") or []
+        self.built_ms = built_ms
+
+    def is_current(self, settle_state: Optional[Dict[str, Any]]) -> bool:
+        if not settle_state or self.document_id is None: return False
+        return (settle_state.get("url") == self.url and settle_state.get("docId") == self.document_id
+                and settle_state.get("mutations") == self.mutations)
+
+    def find(self, query: str, threshold: float = PAGE_TEXT_MATCH_THRESHOLD, headings_only: bool = False) -> Optional[Tuple[Dict[str, Any], float]]:
+        # Best-scoring block; ties go to the shorter (more specific) block, then
+        # to the one nearer the top of the page.
+        with _stats_lock:
+            _stats["lookups"] += 1
+        best, best_key = None, None
+        for block in self.blocks:
+            if headings_only and not block.get("level"): continue
+            score = text_similarity(query, block["text"])
+            if score < threshold: continue
+            key = (score, -len(block["text"]), -block["rect"][1])
+            if best_key is None or key > best_key:
+                best, best_key = (block, round(score, 3)), key
+        if best is not None:
+            with _stats_lock:
+                _stats["matches"] += 1
+        return best
+
+    def read_value(self, query: str, threshold: float = PAGE_TEXT_MATCH_THRESHOLD) -> Optional[str]:
+        # "Price: 59999" read with the query "price" gives "59999"; a block that
+        # doesn't start with the query is returned whole.
+        match = self.find(query, threshold)
+        if match is None: return None
+        text = match[0]["text"]
+        label = re.match(r"^\s*" + r"\W*".join(re.escape(word) for word in normalize_text(query).split()) + r"\s*[:\-–=]\s*(.+)$",
+                         text, re.IGNORECASE)
+        return label.group(1).strip() if label else text
+
+    def read_section(self, heading_query: str, threshold: float = PAGE_TEXT_MATCH_THRESHOLD) -> Optional[str]:
+        match = self.find(heading_query, threshold, headings_only=True)
+        if match is None: return None
+        heading = match[0]
+        path = heading["section"]
+        start = self.blocks.index(heading) + 1
+        lines = []
+        for block in self.blocks[start:]:
+            if block["section"][:len(path)] != path: break
+            lines.append(block["text"])
+        return "\n".join(lines)
+
+
+def is_text_read(step: Any) -> bool:
+    # A READ_SCREEN answered from the page text instead of a screenshot.
+    return isinstance(step, dict) and step.get("action") == "READ_SCREEN" and (step.get("data") or {}).get("read_mode") == "text"
+
+
+def build_page_text_index(driver, max_blocks: int = PAGE_TEXT_MAX_BLOCKS, max_chars: int = PAGE_TEXT_MAX_BLOCK_CHARS) -> PageTextIndex:
+    started = time.perf_counter()
+    snapshot = driver.execute_script(COLLECT_PAGE_TEXT_JS, max_blocks, max_chars) or {}
+    built_ms = (time.perf_counter() - started) * 1000
+    with _stats_lock:
+        _stats["builds"] += 1
+        _stats["build_ms"] += built_ms
+    return PageTextIndex(snapshot, built_ms)
+
+
+def record_reuse():
+    with _stats_lock:
+        _stats["reuses"] += 1
+
+
+def record_text_read():
+    with _stats_lock:
+        _stats["text_reads"] += 1
+
+
+def scroll_to_block(driver, block: Dict[str, Any], margin: int = PAGE_TEXT_SCROLL_MARGIN) -> Any:
+    return driver.execute_script(SCROLL_TO_Y_JS, max(0, int(block["rect"][1]) - margin))
+
+
+def page_text_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["build_ms"] = round(stats["build_ms"], 2)
+    return stats
+
+
+if __name__ == "__main__":
+    # Usage: python page_text.py fixtures/site/guide.html "return window" [more queries...]
+    import os
+    from selenium import webdriver
+    from page_settle import read_settle_state
+
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless=new")
+    options.add_argument("--window-size=1280,800")
+    fixture_driver = webdriver.Chrome(options=options)
+    try:
+        fixture_driver.get("file://" + os.path.abspath(sys.argv[1]))
+        read_settle_state(fixture_driver)
+        index = build_page_text_index(fixture_driver)
+        print(f"{len(index.blocks)} blocks in {index.built_ms:.1f} ms")
+        for query in sys.argv[2:]:
+            match = index.find(query)
+            print(f"{query!r}: {match[0]['text']!r} (score {match[1]}, y {match[0]['rect'][1]:.0f}, section {' > '.join(match[0]['section'])})"
+                  if match else f"{query!r}: no match")
+    finally:
+        fixture_driver.quit()
@@ -0,0 +1,212 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+# --- Configuration ---
+PLAN_CACHE_PATH = "plan_cache.json"
+PLAN_CACHE_MEMORY_ENTRIES = 128
+PLAN_CACHE_DISK_ENTRIES = 1000
+PLAN_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+PLAN_CACHE_FORMAT = 2  # entries of any other format (e.g. numbers rewritten anywhere in the plan) are dropped
+
+_NUMBER_PATTERN = re.compile(r"(?<![\w.])\d+(?:\.\d+)?(?![\w]|\.\d)")
+_PARAM_TOKEN = "<n>"
+_PARAM_PLACEHOLDER = "<<param:{}>>"
+_PARAM_PLACEHOLDER_PATTERN = re.compile(r"<<param:(\d+)>>")
+_CONTEXT_PLACEHOLDER_PATTERN = re.compile(r"(\{[^{}]*\})")
+# Step data fields a number from the goal ends up in; URLs (query string only)
+# and link-text locators are handled separately.
+_GOAL_DERIVED_FIELDS = ("text", "prompt_for_vision", "text_query", "text_to_find", "response_template", "condition")
+_TEXT_LOCATOR_TYPES = ("link_text", "partial_link_text")
+
+
+def normalize_goal(user_goal: str) -> Tuple[str, List[str]]:
+    # "Find the  Top 5 laptops" and "find the top 3 laptops " share the template
+    # "find the top <n> laptops"; the numbers are returned as parameters.
+    if user_goal is None: return "", []
+    collapsed = " ".join(user_goal.split()).lower()
+    params = _NUMBER_PATTERN.findall(collapsed)
+    template = _NUMBER_PATTERN.sub(_PARAM_TOKEN, collapsed)
+    return template, params
+
+
+def parameterize_plan(plan_data: Any, params: List[str]) -> Any:
+    # Replaces the goal's numbers with <<param:N>> placeholders, but only where
+    # a plan takes them from the goal: typed text, prompts, text to find,
+    # answers, conditions, link texts and URL query strings. Numbers in
+    # selectors, XPaths, URL paths and {context} placeholders belong to the
+    # page and are left alone.
+    if not params or not isinstance(plan_data, dict) or not isinstance(plan_data.get("steps"), list):
+        return plan_data
+    index_of: Dict[str, int] = {}
+    for index, value in enumerate(params):
+        index_of.setdefault(value, index)
+    alternatives = "|".join(re.escape(value) for value in sorted(index_of, key=len, reverse=True))
+    pattern = re.compile(r"(?<![\w.])(" + alternatives + r")(?![\w]|\.\d)")
+
+    def substitute(text: str) -> str:
+        parts = _CONTEXT_PLACEHOLDER_PATTERN.split(text)
+        return "".join(part if i % 2 else pattern.sub(lambda m: _PARAM_PLACEHOLDER.format(index_of[m.group(1)]), part)
+                       for i, part in enumerate(parts))
+
+    def parameterize_steps(steps: List[Any]) -> List[Any]:
+        rewritten = []
+        for step in steps:
+            if not isinstance(step, dict) or not isinstance(step.get("data"), dict):
+                rewritten.append(step)
+                continue
+            data = dict(step["data"])
+            for field in _GOAL_DERIVED_FIELDS:
+                if isinstance(data.get(field), str):
+                    data[field] = substitute(data[field])
+            if isinstance(data.get("url"), str) and "?" in data["url"]:
+                base, query = data["url"].split("?", 1)
+                data["url"] = base + "?" + substitute(query)
+            locator = data.get("locator")
+            if isinstance(locator, dict) and locator.get("type") in _TEXT_LOCATOR_TYPES and isinstance(locator.get("value"), str):
+                data["locator"] = dict(locator, value=substitute(locator["value"]))
+            if isinstance(data.get("branches"), list):
+                data["branches"] = [dict(branch, steps=parameterize_steps(branch["steps"]))
+                                    if isinstance(branch, dict) and isinstance(branch.get("steps"), list) else branch
+                                    for branch in data["branches"]]
+            rewritten.append(dict(step, data=data))
+        return rewritten
+
+    return dict(plan_data, steps=parameterize_steps(plan_data["steps"]))
+
+
+def apply_params(plan_data: Any, cached_params: List[str], new_params: List[str]) -> Any:
+    # Fills the placeholders parameterize_plan left in a cached plan with the
+    # new goal's numbers. Returns None when that is ambiguous (the same number
+    # stood for two parameters that now differ), in which case the caller
+    # should re-plan.
+    if len(cached_params) != len(new_params):
+        return None
+    ambiguous = set()
+    for i, old in enumerate(cached_params):
+        for j in range(i + 1, len(cached_params)):
+            if cached_params[j] == old and new_params[j] != new_params[i]:
+                ambiguous.add(i)
+    unfillable = []
+
+    def fill(match):
+        index = int(match.group(1))
+        if index in ambiguous or index >= len(new_params):
+            unfillable.append(index)
+            return match.group(0)
+        return new_params[index]
+
+    def rewrite(value):
+        if isinstance(value, str):
+            return _PARAM_PLACEHOLDER_PATTERN.sub(fill, value)
+        if isinstance(value, list):
+            return [rewrite(item) for item in value]
+        if isinstance(value, dict):
+            return {key: rewrite(item) for key, item in value.items()}
+        return value
+
+    filled = rewrite(plan_data)
+    return None if unfillable else filled
+
+
+class PlanCache:
+    def __init__(self, path: Optional[str] = PLAN_CACHE_PATH, memory_entries: int = PLAN_CACHE_MEMORY_ENTRIES,
+                 disk_entries: int = PLAN_CACHE_DISK_ENTRIES, ttl_seconds: float = PLAN_CACHE_TTL_SECONDS):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._disk: Optional[Dict[str, Dict[str, Any]]] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _load_disk(self) -> Dict[str, Dict[str, Any]]:
+        if self._disk is not None: return self._disk
+        self._disk = {}
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    loaded = json.load(f)
+                if isinstance(loaded, dict):
+                    self._disk = loaded
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"DEBUG: Could not read plan cache '{self.path}': {e}. Starting with an empty cache.")
+        return self._disk
+
+    def _save_disk(self):
+        if not self.path or self._disk is None: return
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._disk, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"DEBUG: Could not write plan cache '{self.path}': {e}")
+
+    def _is_expired(self, entry: Dict[str, Any], now: float) -> bool:
+        return self.ttl_seconds is not None and now - entry.get("created_at", 0) > self.ttl_seconds
+
+    def _remember(self, key: str, entry: Dict[str, Any]):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                entry = self._load_disk().get(key)
+            if entry is not None and (entry.get("format") != PLAN_CACHE_FORMAT or self._is_expired(entry, now)):
+                self._memory.pop(key, None)
+                if self._load_disk().pop(key, None) is not None:
+                    self._save_disk()
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry["last_used"] = now
+            self._remember(key, entry)
+            return entry
+
+    def put(self, key: str, response_text: str, params: List[str]):
+        now = time.time()
+        entry = {"response_text": response_text, "params": list(params), "format": PLAN_CACHE_FORMAT, "created_at": now, "last_used": now}
+        with self._lock:
+            self._remember(key, entry)
+            disk = self._load_disk()
+            disk[key] = entry
+            if len(disk) > self.disk_entries:
+                for stale_key in sorted(disk, key=lambda k: disk[k].get("last_used", 0))[:len(disk) - self.disk_entries]:
+                    del disk[stale_key]
+                    self.evictions += 1
+            self._save_disk()
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._memory.pop(key, None)
+            if self._load_disk().pop(key, None) is not None:
+                self._save_disk()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
@@ -0,0 +1,359 @@
+import operator as op
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from browser_profile import resolve_profile
+
+_PATH_NOT_FOUND_MARKER_STR = "[{path} not found/extracted]"
+class _NotFoundType: pass
+NOT_FOUND = _NotFoundType()
+_OPERATORS = {
+    '==': op.eq,
+    '!=': op.ne,
+    '>': op.gt,
+    '<': op.lt,
+    '>=': op.ge,
+    '<=': op.le,
+}
+
+KNOWN_ACTIONS = {
+    "OPEN_BROWSER", "NAVIGATE_TO_URL", "LABEL_AND_READ_SCREEN", "TYPE_INTO_ELEMENT", "CLICK_ELEMENT",
+    "READ_SCREEN", "SCROLL_PAGE_TO_TEXT", "CONDITIONAL_JUMP", "ANSWER_USER", "PARALLEL",
+}
+COMPILE_CACHE_SIZE = 4096
+
+_VAR_PATTERN = re.compile(r"^\s*([a-zA-Z_]\w*)")
+_TOKEN_PATTERN = re.compile(r"""
+    ^\s*(?:
+        (?:\.\s*([a-zA-Z_]\w*))
+      | (?:\[\s*(?:
+            (-?\d+)
+          | (?:(['"])(.*?)\3)
+          )\s*\])
+    )
+""", re.VERBOSE)
+_PLACEHOLDER_PATTERN = re.compile(r"\{([^\{\}]+)\}")
+_LENGTH_PATTERN = re.compile(r"\{([^\{\}]+?)\}\.length\s*(==|!=|<=|>=|<|>)\s*(\d+)")
+_COMPARISON_PATTERN = re.compile(r"(.+?)(==|!=|<=|>=|<|>)(.+)")
+
+
+class CompiledPath:
+    # A path like "results[0].price" parsed once into (root, [(kind, key), ...]).
+    __slots__ = ("expression", "root", "segments", "literal_key", "error")
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        self.root = None
+        self.segments = []
+        self.literal_key = None
+        self.error = None
+        m = _VAR_PATTERN.match(expression)
+        if not m:
+            self.literal_key = expression.strip()
+            return
+        self.root = m.group(1)
+        remaining = expression[m.end():].strip()
+        while remaining:
+            token = _TOKEN_PATTERN.match(remaining)
+            if not token:
+                self.error = f"Invalid path segment at: '{remaining}'"
+                return
+            dot_attr, index_str, _, quoted_key = token.groups()
+            if dot_attr is not None: self.segments.append(("key", dot_attr))
+            elif index_str is not None: self.segments.append(("index", int(index_str)))
+            else: self.segments.append(("bracket_key", quoted_key))
+            remaining = remaining[token.end():].strip()
+
+    def resolve(self, context: Dict[str, Any]) -> Any:
+        if not isinstance(context, dict):
+            return NOT_FOUND
+        if self.root is None:
+            return context.get(self.literal_key, NOT_FOUND) if self.literal_key else NOT_FOUND
+        if self.root not in context:
+            return NOT_FOUND
+        if self.error:
+            print(f"DEBUG: _get_value_from_path: {self.error} in '{self.expression}'")
+            return NOT_FOUND
+        current = context[self.root]
+        for kind, key in self.segments:
+            if kind == "index":
+                if not isinstance(current, list):
+                    print(f"DEBUG: _get_value_from_path (index): Trying to index a non-list. Path: '{self.expression}'"); return NOT_FOUND
+                if not -len(current) <= key < len(current):
+                    print(f"DEBUG: _get_value_from_path (index): Index {key} out of range. Path: '{self.expression}'"); return NOT_FOUND
+                current = current[key]
+            else:
+                if not isinstance(current, dict):
+                    print(f"DEBUG: _get_value_from_path ({kind}): Trying to access key '{key}' but current_value is {type(current)}"); return NOT_FOUND
+                if key not in current:
+                    print(f"DEBUG: _get_value_from_path ({kind}): Key '{key}' missing in dict. Path: '{self.expression}'"); return NOT_FOUND
+                current = current[key]
+        return current
+
+
+def _format_placeholder_value(path: CompiledPath, val: Any) -> str:
+    if val is NOT_FOUND: return _PATH_NOT_FOUND_MARKER_STR.format(path=path.expression)
+    elif val is None: return "None"
+    elif isinstance(val, list):
+        if not val: return "[empty list]"
+        return ", ".join(map(str, val))
+    else: return str(val)
+
+
+class CompiledTemplate:
+    # "Price of {item} is {prices[0]}" split once into literal text and paths.
+    __slots__ = ("template", "parts")
+
+    def __init__(self, template: str):
+        self.template = template
+        self.parts: List[Any] = []
+        position = 0
+        for m in _PLACEHOLDER_PATTERN.finditer(template):
+            if m.start() > position:
+                self.parts.append(template[position:m.start()])
+            self.parts.append(compile_path(m.group(1).strip()))
+            position = m.end()
+        if position < len(template):
+            self.parts.append(template[position:])
+
+    @property
+    def paths(self) -> List[CompiledPath]:
+        return [part for part in self.parts if isinstance(part, CompiledPath)]
+
+    def render(self, context: Dict[str, Any]) -> str:
+        if len(self.parts) == 1 and isinstance(self.parts[0], str):
+            return self.parts[0]
+        return "".join(part if isinstance(part, str) else _format_placeholder_value(part, part.resolve(context))
+                       for part in self.parts)
+
+
+class _Comparison:
+    __slots__ = ("kind", "path", "compare", "left", "right", "length")
+
+    def __init__(self, comp_str: str):
+        self.path = self.left = self.right = self.length = None
+        length_match = _LENGTH_PATTERN.fullmatch(comp_str.strip())
+        if length_match:
+            list_path, op_str, val_str = length_match.groups()
+            self.kind, self.path, self.compare, self.length = "length", compile_path(list_path.strip()), _OPERATORS[op_str], int(val_str)
+            return
+        match = _COMPARISON_PATTERN.match(comp_str)
+        if not match:
+            self.kind, self.path, self.compare = "truthy", compile_path(comp_str.strip()), None
+            return
+        left_str, op_str, right_str = match.groups()
+        self.kind, self.compare = "compare", _OPERATORS[op_str]
+        self.left, self.right = compile_template(left_str.strip()), compile_template(right_str.strip())
+
+    def evaluate(self, context: Dict[str, Any]) -> bool:
+        if self.kind == "length":
+            list_val = self.path.resolve(context)
+            if not isinstance(list_val, list): return False
+            return self.compare(len(list_val), self.length)
+        if self.kind == "truthy":
+            return bool(self.path.resolve(context))
+        left, right = self.left.render(context), self.right.render(context)
+        try:
+            return self.compare(float(left), float(right))
+        except (ValueError, TypeError):
+            return self.compare(str(left), str(right))
+
+
+class CompiledCondition:
+    __slots__ = ("condition", "combine", "comparisons")
+
+    def __init__(self, condition_template: str):
+        self.condition = condition_template
+        normalized_condition = condition_template.replace("{{", "{").replace("}}", "}")
+        if "||" in normalized_condition:
+            self.combine, parts = any, normalized_condition.split("||")
+        elif "&&" in normalized_condition:
+            self.combine, parts = all, normalized_condition.split("&&")
+        else:
+            self.combine, parts = all, [normalized_condition]
+        self.comparisons = [_Comparison(part) for part in parts]
+
+    @property
+    def paths(self) -> List[CompiledPath]:
+        paths = []
+        for comparison in self.comparisons:
+            if comparison.path is not None: paths.append(comparison.path)
+            if comparison.left is not None: paths.extend(comparison.left.paths + comparison.right.paths)
+        return paths
+
+    def evaluate(self, context: Dict[str, Any]) -> bool:
+        return self.combine(comparison.evaluate(context) for comparison in self.comparisons)
+
+
+@lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def compile_path(path_expression: str) -> CompiledPath:
+    return CompiledPath(path_expression)
+
+
+@lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def compile_template(template_string: str) -> CompiledTemplate:
+    return CompiledTemplate(template_string)
+
+
+@lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def compile_condition(condition_template: str) -> CompiledCondition:
+    return CompiledCondition(condition_template)
+
+
+class CompiledPlan:
+    def __init__(self, steps: List[Dict[str, Any]]):
+        self.steps = steps
+        self.errors: List[str] = []
+        self.warnings: List[str] = []
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
+def _stored_context_keys(steps: List[Dict[str, Any]]) -> set:
+    keys = {"execution_halted"}
+    for step in steps:
+        if not isinstance(step, dict): continue
+        data = step.get("data") or {}
+        if step.get("action") == "LABEL_AND_READ_SCREEN":
+            label_key = data.get("context_key_to_store_labels", "last_labeled_elements")
+            keys.update({label_key, f"{label_key}_summary"})
+        elif step.get("action") == "READ_SCREEN":
+            keys.add(data.get("context_key_to_store", "last_vision_response"))
+        elif step.get("action") == "PARALLEL":
+            # Whatever a branch stores is merged back at the join.
+            for branch in data.get("branches") or []:
+                if isinstance(branch, dict) and isinstance(branch.get("steps"), list):
+                    keys.update(_stored_context_keys(branch["steps"]))
+            if data.get("context_key_to_store"):
+                keys.add(data["context_key_to_store"])
+    return keys
+
+
+def compile_step(step: Any, step_number: int, stored_keys: Optional[set] = None,
+                 plan_length: Optional[int] = None) -> Tuple[Dict[str, Any], List[str], List[str]]:
+    # Checks and compiles one step. The cross-step checks (context keys stored
+    # elsewhere in the plan, goto_step range) need stored_keys/plan_length and
+    # are skipped while a streamed plan is still arriving.
+    compiled: Dict[str, Any] = {}
+    errors: List[str] = []
+    warnings: List[str] = []
+    if not isinstance(step, dict):
+        errors.append(f"Step {step_number}: must be an object, got {type(step).__name__}.")
+        return compiled, errors, warnings
+    action = step.get("action")
+    data = step.get("data") or {}
+    if not action:
+        errors.append(f"Step {step_number}: missing 'action'.")
+        return compiled, errors, warnings
+    if not isinstance(data, dict):
+        errors.append(f"Step {step_number}: 'data' must be an object.")
+        return compiled, errors, warnings
+    if action not in KNOWN_ACTIONS:
+        warnings.append(f"Step {step_number}: unknown action '{action}' will be skipped.")
+
+    if action == "OPEN_BROWSER":
+        try:
+            resolve_profile(data)
+        except ValueError as e:
+            errors.append(f"Step {step_number}: {e}")
+    elif action == "NAVIGATE_TO_URL":
+        if not data.get("url"):
+            errors.append(f"Step {step_number}: NAVIGATE_TO_URL needs a 'url'.")
+        else:
+            compiled["url"] = compile_template(str(data["url"]))
+    elif action in ("CLICK_ELEMENT", "TYPE_INTO_ELEMENT"):
+        locator = data.get("locator") or {}
+        if locator.get("type") == "label_number":
+            source = locator.get("context_source")
+            if not source:
+                errors.append(f"Step {step_number}: 'context_source' is required for a 'label_number' locator.")
+            elif stored_keys is not None and source not in stored_keys:
+                errors.append(f"Step {step_number}: context_source '{source}' is never stored by a LABEL_AND_READ_SCREEN step.")
+            try:
+                int(locator.get("value"))
+            except (TypeError, ValueError):
+                errors.append(f"Step {step_number}: label number '{locator.get('value')}' is not an integer.")
+        elif locator.get("value") is not None:
+            compiled["locator_value"] = compile_template(str(locator["value"]))
+        if action == "TYPE_INTO_ELEMENT":
+            compiled["text"] = compile_template(str(data.get("text", "")))
+    elif action == "READ_SCREEN":
+        if data.get("capture") not in (None, "viewport", "full_page"):
+            errors.append(f"Step {step_number}: capture '{data['capture']}' must be 'viewport' or 'full_page'.")
+        region = data.get("region")
+        if region is not None and not (isinstance(region, list) and len(region) == 4 and all(isinstance(v, (int, float)) for v in region)
+                                       and region[2] > region[0] and region[3] > region[1]):
+            errors.append(f"Step {step_number}: region must be [x_min, y_min, x_max, y_max] in CSS pixels.")
+    elif action == "ANSWER_USER":
+        compiled["response_template"] = compile_template(str(data.get("response_template", "Task completed.")))
+    elif action == "CONDITIONAL_JUMP":
+        condition, goto_step = data.get("condition"), data.get("goto_step")
+        if not condition or goto_step is None:
+            warnings.append(f"Step {step_number}: CONDITIONAL_JUMP without 'condition' or 'goto_step' does nothing.")
+        else:
+            compiled["condition"] = compile_condition(str(condition))
+            try:
+                target = int(goto_step)
+                if target < 1 or plan_length is not None and target > plan_length:
+                    errors.append(f"Step {step_number}: goto_step {target} is outside the plan (1-{plan_length or '?'}).")
+            except (TypeError, ValueError):
+                errors.append(f"Step {step_number}: goto_step '{goto_step}' is not an integer.")
+    elif action == "PARALLEL":
+        _check_branches(data.get("branches"), step_number, stored_keys, errors, warnings)
+
+    for field, compiled_item in compiled.items():
+        for path in compiled_item.paths:
+            if path.error:
+                errors.append(f"Step {step_number}: {path.error} in '{path.expression}' ({field}).")
+            elif stored_keys is not None and (path.root or path.literal_key) not in stored_keys:
+                warnings.append(f"Step {step_number}: '{path.expression}' in {field} is never stored by any step.")
+    return compiled, errors, warnings
+
+
+def _check_branches(branches: Any, step_number: int, stored_keys: Optional[set], errors: List[str], warnings: List[str]):
+    # Each branch is a small plan of its own: goto_step numbers are local to it
+    # and branches can't be nested.
+    if not isinstance(branches, list) or not branches:
+        errors.append(f"Step {step_number}: PARALLEL needs a non-empty 'branches' list.")
+        return
+    if len(branches) == 1:
+        warnings.append(f"Step {step_number}: PARALLEL with a single branch runs nothing in parallel.")
+    names = set()
+    for branch_number, branch in enumerate(branches, 1):
+        if not isinstance(branch, dict) or not isinstance(branch.get("steps"), list) or not branch["steps"]:
+            errors.append(f"Step {step_number}: branch {branch_number} must be an object with a non-empty 'steps' list.")
+            continue
+        name = str(branch.get("name") or f"branch-{branch_number}")
+        if name in names:
+            errors.append(f"Step {step_number}: branch name '{name}' is used twice.")
+        names.add(name)
+        branch_keys = None if stored_keys is None else stored_keys | _stored_context_keys(branch["steps"])
+        for index, branch_step in enumerate(branch["steps"]):
+            if isinstance(branch_step, dict) and branch_step.get("action") == "PARALLEL":
+                errors.append(f"Step {step_number}, branch '{name}' step {index + 1}: nested PARALLEL steps are not supported.")
+                continue
+            _, branch_errors, branch_warnings = compile_step(branch_step, index + 1, branch_keys, len(branch["steps"]))
+            # "Step 2: ..." from the branch becomes "Step 4, branch 'x' step 2: ...".
+            errors.extend(f"Step {step_number}, branch '{name}' s{error[1:]}" for error in branch_errors)
+            warnings.extend(f"Step {step_number}, branch '{name}' s{warning[1:]}" for warning in branch_warnings)
+
+
+def compile_plan(steps: List[Dict[str, Any]]) -> CompiledPlan:
+    # Validates the plan and pre-compiles every template, path and condition.
+    # The compiled objects stay in the compile_* caches, so executing (and
+    # re-executing, in CONDITIONAL_JUMP loops) a step never parses strings
+    # again. Errors mean the plan must not run; warnings are logged and
+    # execution continues.
+    plan = CompiledPlan(steps)
+    if not isinstance(steps, list):
+        plan.errors.append("Plan 'steps' must be a list.")
+        return plan
+    stored_keys = _stored_context_keys(steps)
+    for index, step in enumerate(steps):
+        _, errors, warnings = compile_step(step, index + 1, stored_keys, len(steps))
+        plan.errors.extend(errors)
+        plan.warnings.extend(warnings)
+    return plan
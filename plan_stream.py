@@ -0,0 +1,129 @@
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# --- Configuration ---
+PLAN_STREAM_STEP_TIMEOUT = 120.0  # longest the executor waits for the next step to arrive
+
+
+class StepStreamParser:
+    # Incremental scanner for a planning response of the form
+    # {"steps": [{...}, {...}, ...]}. feed() returns every element of the
+    # top-level "steps" array that has been completed by the text seen so far.
+    # Anything outside the outermost object (markdown fences, chatter) is
+    # ignored; the full text stays available in .text for the final parse.
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._string_start = None
+        self._last_string = None
+        self._pending_key = None
+        self._steps_depth = None  # depth inside the "steps" array, -1 once it closed
+        self._element_start = None
+        self.steps_parsed = 0
+
+    def feed(self, chunk: str) -> List[Any]:
+        self.text += chunk
+        completed = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            c = text[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif c == "\\":
+                    self._escaped = True
+                elif c == '"':
+                    self._in_string = False
+                    self._last_string = text[self._string_start + 1:i]
+                continue
+            if c == '"':
+                self._in_string, self._string_start = True, i
+            elif c == ":":
+                self._pending_key = self._last_string if self._depth == 1 else None
+            elif c == ",":
+                self._pending_key = None
+            elif c in "{[":
+                if c == "[" and self._steps_depth is None and self._depth == 1 and self._pending_key == "steps":
+                    self._steps_depth = self._depth + 1
+                self._depth += 1
+                if c == "{" and self._steps_depth not in (None, -1) and self._depth == self._steps_depth + 1:
+                    self._element_start = i
+            elif c in "}]":
+                if c == "}" and self._element_start is not None and self._depth == self._steps_depth + 1:
+                    completed.append(json.loads(text[self._element_start:i + 1], strict=False))
+                    self._element_start = None
+                elif c == "]" and self._steps_depth not in (None, -1) and self._depth == self._steps_depth:
+                    self._steps_depth = -1
+                self._depth -= 1
+        self._pos = len(text)
+        self.steps_parsed += len(completed)
+        return completed
+
+
+class StreamingPlan:
+    # The steps of a plan that is still being generated. A producer appends
+    # steps as they are parsed and calls finish(); the executor reads them with
+    # get(), which blocks until the step arrives or the plan is known to be
+    # shorter. len() and indexing only cover the steps received so far.
+    def __init__(self):
+        self.steps: List[Dict[str, Any]] = []
+        self.error: Optional[str] = None
+        self.done = False
+        self._cond = threading.Condition()
+        self._started = time.perf_counter()
+        self._first_step_at = None
+        self._finished_at = None
+
+    @classmethod
+    def completed(cls, steps: List[Dict[str, Any]]) -> "StreamingPlan":
+        plan = cls()
+        for step in steps:
+            plan.append(step)
+        plan.finish()
+        return plan
+
+    def append(self, step: Dict[str, Any]):
+        with self._cond:
+            if self._first_step_at is None:
+                self._first_step_at = time.perf_counter()
+            self.steps.append(step)
+            self._cond.notify_all()
+
+    def finish(self, error: Optional[str] = None):
+        with self._cond:
+            self.error = error
+            self.done = True
+            self._finished_at = time.perf_counter()
+            self._cond.notify_all()
+
+    def get(self, index: int, timeout: float = PLAN_STREAM_STEP_TIMEOUT) -> Optional[Dict[str, Any]]:
+        with self._cond:
+            arrived = self._cond.wait_for(lambda: index < len(self.steps) or self.done, timeout)
+            if not arrived:
+                self.error = self.error or f"Timed out after {timeout}s waiting for step {index + 1}."
+                return None
+            return self.steps[index] if index < len(self.steps) else None
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: self.done, timeout)
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        return self.steps[index]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "steps": len(self.steps),
+                "first_step_s": round(self._first_step_at - self._started, 4) if self._first_step_at else None,
+                "complete_s": round(self._finished_at - self._started, 4) if self._finished_at else None,
+                "error": self.error,
+            }
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# --- Configuration ---
+WATCHDOG_ENABLED = True
+WATCHDOG_STEP_DEADLINE_S = 120.0  # wall clock per step; a batch of reads or a PARALLEL fork counts as one step
+WATCHDOG_MAX_STEPS = 200  # steps executed per plan run, jumps included
+WATCHDOG_MAX_MODEL_CALLS = 60  # vision calls per plan run (prefetches included, cache hits not)
+WATCHDOG_MAX_REPEATS = 3  # visits to the same (step, context, page) state before a loop counts as stuck
+WATCHDOG_RECENT_STEPS = 12  # step numbers kept for the abort report
+
+_stats_lock = threading.Lock()
+_stats = {"runs": 0, "aborts": 0, "step_deadline": 0, "step_budget": 0, "model_call_budget": 0, "loop": 0}
+
+
+class WatchdogAbort(Exception):
+    # Raised where work can be refused up front (a model call over budget);
+    # the executor halts on Watchdog.abort whether or not a step swallowed it.
+    pass
+
+
+def context_fingerprint(shared_context: Dict[str, Any]) -> str:
+    encoded = json.dumps(shared_context, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()[:16]
+
+
+class Watchdog:
+    # Bounds one plan run: a wall-clock deadline per step, budgets for steps
+    # and model calls, and loop detection. A step can't be interrupted from
+    # outside, so the deadline is enforced cooperatively (model calls get at
+    # most the step's remaining time) and checked when the step returns. A
+    # jump back to a state already seen - same step, same shared context, same
+    # page - means the loop made no progress since; after max_repeats such
+    # visits the run is stopped. A PARALLEL branch's watchdog has the forking
+    # run's as its parent: its model calls are drawn from the parent's budget
+    # and its model calls never outlive the PARALLEL step's deadline.
+    def __init__(self, step_deadline_s: float = WATCHDOG_STEP_DEADLINE_S, max_steps: int = WATCHDOG_MAX_STEPS,
+                 max_model_calls: int = WATCHDOG_MAX_MODEL_CALLS, max_repeats: int = WATCHDOG_MAX_REPEATS,
+                 enabled: bool = WATCHDOG_ENABLED, parent: Optional["Watchdog"] = None):
+        self.step_deadline_s = step_deadline_s
+        self.max_steps = max_steps
+        self.max_model_calls = max_model_calls
+        self.max_repeats = max_repeats
+        self.enabled = enabled
+        self.parent = parent
+        self.started = time.perf_counter()
+        self.steps = 0
+        self.model_calls = 0
+        self.slowest_step_s = 0.0
+        self.abort: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        self._step_started: Optional[float] = None
+        self._step: Optional[Tuple[int, str]] = None
+        self._recent: List[int] = []
+        self._visits: Dict[Tuple[int, str, Any], int] = {}
+        with _stats_lock:
+            _stats["runs"] += 1
+
+    def begin_step(self, index: int, action: str, count: int = 1) -> bool:
+        # False when starting the step would go over the step budget.
+        if self.enabled and self.steps + count > self.max_steps:
+            self._trip("step_budget", f"The plan ran {self.steps} steps; starting step {index + 1} would exceed the budget of {self.max_steps}.",
+                       index, action)
+            return False
+        self._step_started = time.perf_counter()
+        self._step = (index, action)
+        return True
+
+    def end_step(self, count: int = 1):
+        index, action = self._step
+        elapsed = time.perf_counter() - self._step_started
+        self.steps += count
+        self.slowest_step_s = max(self.slowest_step_s, elapsed)
+        self._recent = (self._recent + [index + 1 + offset for offset in range(count)])[-WATCHDOG_RECENT_STEPS:]
+        if self.enabled and elapsed > self.step_deadline_s:
+            self._trip("step_deadline", f"Step {index + 1} ({action}) took {elapsed:.1f}s; the deadline is {self.step_deadline_s:.0f}s.",
+                       index, action, step_s=round(elapsed, 3))
+        self._step_started = None
+
+    def model_deadline(self, default_s: float) -> float:
+        # A model call never gets more time than the step has left.
+        if self.parent is not None:
+            default_s = self.parent.model_deadline(default_s)
+        if not self.enabled or self._step_started is None: return default_s
+        remaining = self.step_deadline_s - (time.perf_counter() - self._step_started)
+        return max(0.001, min(default_s, remaining))
+
+    def count_model_call(self):
+        with self._lock:
+            if self.enabled and self.model_calls >= self.max_model_calls:
+                index, action = self._step or (None, None)
+                self._trip("model_call_budget", f"The plan made {self.model_calls} model calls; the budget is {self.max_model_calls}.", index, action)
+                raise WatchdogAbort(self.abort["message"])
+            if self.parent is not None:
+                try:
+                    self.parent.count_model_call()
+                except WatchdogAbort:
+                    # The parent has the abort on record; the branch stops too.
+                    index, action = self._step or (None, None)
+                    self._trip("model_call_budget", self.parent.abort["message"], index, action, record=False)
+                    raise
+            self.model_calls += 1
+
+    def check_jump(self, target_index: int, context_fp: str, page_fp: Any) -> bool:
+        # False when the jump returns to a state seen max_repeats times already.
+        state = (target_index, context_fp, page_fp)
+        visits = self._visits.get(state, 0) + 1
+        self._visits[state] = visits
+        if self.enabled and visits > self.max_repeats:
+            index, action = self._step or (None, None)
+            self._trip("loop", f"Jumping back to step {target_index + 1} in the same state (same context and page) "
+                               f"for the {visits}th time; the loop is not making progress.",
+                       index, action, loop={"target_step": target_index + 1, "visits": visits, "context": context_fp,
+                                            "page": list(page_fp) if isinstance(page_fp, tuple) else page_fp})
+            return False
+        return True
+
+    def _trip(self, reason: str, message: str, index: Optional[int], action: Optional[str], record: bool = True, **details):
+        if self.abort is not None: return
+        self.abort = {
+            "reason": reason,
+            "message": message,
+            "step": index + 1 if index is not None else None,
+            "action": action,
+            "steps_executed": self.steps,
+            "model_calls": self.model_calls,
+            "elapsed_s": round(time.perf_counter() - self.started, 3),
+            "recent_steps": list(self._recent),
+            "limits": self.limits(),
+        }
+        self.abort.update(details)
+        if not record: return
+        with _stats_lock:
+            _stats["aborts"] += 1
+            _stats[reason] += 1
+
+    def limits(self) -> Dict[str, Any]:
+        return {"step_deadline_s": self.step_deadline_s, "max_steps": self.max_steps,
+                "max_model_calls": self.max_model_calls, "max_repeats": self.max_repeats}
+
+    def summary(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "steps": self.steps, "model_calls": self.model_calls,
+                "slowest_step_s": round(self.slowest_step_s, 3), "aborted": self.abort["reason"] if self.abort else None}
+
+
+def watchdog_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        return dict(_stats)
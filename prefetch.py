@@ -0,0 +1,99 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional
+
+# --- Configuration ---
+PREFETCH_CAPTURE_TIMEOUT = 10.0
+
+
+class SpeculativePrefetcher:
+    # Runs the next step's screen analysis in the background while the executor
+    # finishes its bookkeeping. The page fingerprint taken right before the
+    # capture is compared with a fresh one when the step actually runs; if the
+    # page changed in between, the result is thrown away and the step does its
+    # own capture.
+    # A WebDriver session is not thread-safe. start() takes driver_lock on the
+    # caller's thread and the worker releases it once its capture is done, so
+    # whoever drives the browser next (with the lock) waits for the capture;
+    # the analysis that follows must not touch the browser.
+    def __init__(self, name: str = "prefetch", driver_lock: Optional[threading.Lock] = None):
+        self.name = name
+        self.driver_lock = driver_lock or threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        self.started = 0
+        self.used = 0
+        self.wasted = 0
+        self.failed = 0
+
+    def start(self, key: Hashable, fingerprint_fn: Callable[[], Any], capture_fn: Callable[[], Any],
+              analyze_fn: Callable[[Any], Any]):
+        self.discard()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=self.name)
+        capture_done = threading.Event()
+
+        def work():
+            try:
+                fingerprint = fingerprint_fn()
+                captured = capture_fn()
+            finally:
+                self.driver_lock.release()
+                capture_done.set()
+            return fingerprint, analyze_fn(captured)
+
+        self.driver_lock.acquire()
+        try:
+            future = self._executor.submit(work)
+        except Exception:
+            self.driver_lock.release()
+            raise
+        with self._lock:
+            self._pending = {"key": key, "future": future, "capture_done": capture_done}
+            self.started += 1
+
+    def take(self, key: Hashable, fingerprint_fn: Callable[[], Any]) -> Optional[Any]:
+        with self._lock:
+            pending = self._pending
+            if pending is None: return None
+            if pending["key"] != key:
+                pending = None
+        if pending is None:
+            self.discard()
+            return None
+        with self._lock:
+            self._pending = None
+        try:
+            fingerprint, result = pending["future"].result()
+        except Exception as e:
+            print(f"DEBUG: Prefetch for {key} failed ({type(e).__name__}: {e}). Running the step normally.")
+            self.failed += 1
+            return None
+        if fingerprint is not None and fingerprint == fingerprint_fn():
+            self.used += 1
+            return result
+        print(f"DEBUG: Page changed since the prefetch for {key} was captured. Discarding it.")
+        self.wasted += 1
+        return None
+
+    def discard(self):
+        # The vision call may still be running, but the browser must be free
+        # before the caller drives it again, so wait for the capture to finish.
+        with self._lock:
+            pending, self._pending = self._pending, None
+        if pending is None: return
+        pending["capture_done"].wait(PREFETCH_CAPTURE_TIMEOUT)
+        self.wasted += 1
+
+    def reset_stats(self):
+        self.started = self.used = self.wasted = self.failed = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"started": self.started, "used": self.used, "wasted": self.wasted, "failed": self.failed}
+
+    def shutdown(self):
+        self.discard()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,73 @@
+import json
+import re
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+from page_text import is_text_read
+from screenshot_pipeline import capture_options
+
+# --- Configuration ---
+READ_BATCH_ENABLED = True
+READ_BATCH_MAX_QUESTIONS = 8  # longer runs of READ_SCREEN steps are split into several batches
+
+READ_BATCH_VISION_PROMPT = """
+Answer each of the following questions about this screenshot of a webpage.
+Return only a JSON object whose keys are the question ids below and whose values are your answers as plain strings. Answer every question; if the screenshot doesn't show the answer, say so in that question's value.
+{questions}
+"""
+
+_JSON_FENCE = re.compile(r"```(?:json)?\s*([\s\S]*?)\s*```")
+
+_stats_lock = threading.Lock()
+_stats = {"batches": 0, "questions": 0, "fallbacks": 0, "calls_saved": 0}
+
+
+def read_screen_group(steps: Sequence[Any], index: int, max_questions: int = READ_BATCH_MAX_QUESTIONS) -> List[Dict[str, Any]]:
+    # The READ_SCREEN steps starting at index with nothing in between. A READ
+    # doesn't change the page, so they all look at the same frame. Text-mode
+    # reads need no screenshot, and full-page or region reads need their own,
+    # so both end the group.
+    group = []
+    while index + len(group) < len(steps) and len(group) < max_questions:
+        step = steps[index + len(group)]
+        if not isinstance(step, dict) or step.get("action") != "READ_SCREEN" or is_text_read(step) or capture_options(step.get("data") or {}): break
+        group.append(step)
+    return group
+
+
+def question_ids(count: int) -> List[str]:
+    return [f"q{number}" for number in range(1, count + 1)]
+
+
+def build_batch_prompt(questions: Sequence[str]) -> str:
+    lines = [f"{json.dumps(question_id)}: {question}" for question_id, question in zip(question_ids(len(questions)), questions)]
+    return READ_BATCH_VISION_PROMPT.format(questions="\n".join(lines))
+
+
+def split_batch_answer(text: str, count: int) -> Optional[List[str]]:
+    # The answers in question order, or None if the response isn't a JSON
+    # object answering every question.
+    fence = _JSON_FENCE.search(text or "")
+    try:
+        answers = json.loads(fence.group(1) if fence else text)
+    except (json.JSONDecodeError, TypeError):
+        return None
+    if not isinstance(answers, dict): return None
+    ids = question_ids(count)
+    if any(question_id not in answers for question_id in ids): return None
+    return [answers[question_id] if isinstance(answers[question_id], str) else json.dumps(answers[question_id])
+            for question_id in ids]
+
+
+def record_read_batch(questions: int, fallback: bool = False):
+    with _stats_lock:
+        _stats["batches"] += 1
+        _stats["questions"] += questions
+        _stats["fallbacks"] += int(fallback)
+        # A fallback costs the batched call on top of one call per question.
+        _stats["calls_saved"] += -1 if fallback else questions - 1
+
+
+def read_batch_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        return dict(_stats)
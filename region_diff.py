@@ -0,0 +1,167 @@
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+# --- Configuration ---
+REGION_DIFF_ENABLED = True
+REGION_DIFF_TILE_SIZE = 32  # pixels of the (resized) image sent to the model
+REGION_DIFF_PADDING = 16
+REGION_DIFF_MAX_CHANGED_FRACTION = 0.4  # above this a full relabel is cheaper than crops
+REGION_DIFF_MAX_REGIONS = 4
+REGION_DIFF_MATCH_IOU = 0.5  # a relabeled element overlapping an old one this much keeps its number
+
+REGION_PROMPT_SUFFIX = (
+    "This image is a {width}x{height} crop taken at offset ({x}, {y}) of a {full_width}x{full_height} screenshot. "
+    "Label only the elements inside this crop and give box coordinates in the crop's own pixels.\n"
+)
+
+Box = Tuple[int, int, int, int]
+
+_stats_lock = threading.Lock()
+_stats = {"full": 0, "incremental": 0, "unchanged": 0, "regions": 0, "crop_pixels": 0, "frame_pixels": 0}
+
+
+class LabelFrame:
+    # What the last labeling of a context key saw: the tile hashes of the image
+    # that went to the model, the URL and the resulting elements_map. Without
+    # hashes, they are computed from source.image (a PreparedScreenshot) the
+    # first time the key is relabeled, so a key labeled only once never has
+    # its screenshot decoded for them.
+    def __init__(self, url: Optional[str], size: Tuple[int, int], hashes: Optional[Dict[Tuple[int, int], bytes]],
+                 elements_map: Dict[int, Dict[str, Any]], source: Any = None):
+        self.url = url
+        self.size = tuple(size)
+        self._hashes = hashes
+        self._source = source
+        self.elements_map = elements_map
+
+    @property
+    def hashes(self) -> Dict[Tuple[int, int], bytes]:
+        if self._hashes is None:
+            self._hashes, self._source = tile_hashes(self._source.image), None
+        return self._hashes
+
+
+def tile_hashes(image: Image.Image, tile_size: int = REGION_DIFF_TILE_SIZE) -> Dict[Tuple[int, int], bytes]:
+    gray = image.convert("L")
+    raw = gray.tobytes()
+    width, height = gray.size
+    hashes = {}
+    for row_start in range(0, height, tile_size):
+        rows = [raw[y * width:(y + 1) * width] for y in range(row_start, min(row_start + tile_size, height))]
+        for col_start in range(0, width, tile_size):
+            digest = hashlib.blake2b(digest_size=8)
+            for row in rows:
+                digest.update(row[col_start:col_start + tile_size])
+            hashes[(col_start // tile_size, row_start // tile_size)] = digest.digest()
+    return hashes
+
+
+def _box_intersects(a: Sequence[int], b: Sequence[int]) -> bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def box_iou(a: Sequence[int], b: Sequence[int]) -> float:
+    inter_w = min(a[2], b[2]) - max(a[0], b[0])
+    inter_h = min(a[3], b[3]) - max(a[1], b[1])
+    if inter_w <= 0 or inter_h <= 0: return 0.0
+    inter = inter_w * inter_h
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _merge_overlapping(boxes: List[List[int]]) -> List[List[int]]:
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                if _box_intersects(boxes[i], boxes[j]):
+                    a, b = boxes[i], boxes.pop(j)
+                    boxes[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    merged = True
+                    break
+            if merged: break
+    return boxes
+
+
+def changed_regions(previous: Dict[Tuple[int, int], bytes], current: Dict[Tuple[int, int], bytes],
+                    image_size: Tuple[int, int], old_boxes: Sequence[Sequence[int]] = (),
+                    tile_size: int = REGION_DIFF_TILE_SIZE, padding: int = REGION_DIFF_PADDING) -> Tuple[List[Box], float]:
+    # Returns the rectangles (image pixels) that need relabeling and the
+    # fraction of tiles that changed. Changed tiles are grouped into connected
+    # components, each grown to cover any old element box it touches (so no
+    # element is cut in half by a crop edge), padded and merged.
+    changed = {key for key, digest in current.items() if previous.get(key) != digest}
+    fraction = len(changed) / len(current) if current else 1.0
+    regions: List[List[int]] = []
+    remaining = set(changed)
+    while remaining:
+        stack = [remaining.pop()]
+        component = []
+        while stack:
+            col, row = stack.pop()
+            component.append((col, row))
+            for d_col in (-1, 0, 1):
+                for d_row in (-1, 0, 1):
+                    neighbour = (col + d_col, row + d_row)
+                    if neighbour in remaining:
+                        remaining.remove(neighbour)
+                        stack.append(neighbour)
+        cols, rows = [c for c, _ in component], [r for _, r in component]
+        regions.append([min(cols) * tile_size, min(rows) * tile_size, (max(cols) + 1) * tile_size, (max(rows) + 1) * tile_size])
+    width, height = image_size
+    grown = []
+    for region in regions:
+        for box in old_boxes:
+            if _box_intersects(region, box):
+                region = [min(region[0], box[0]), min(region[1], box[1]), max(region[2], box[2]), max(region[3], box[3])]
+        grown.append([max(0, region[0] - padding), max(0, region[1] - padding),
+                      min(width, region[2] + padding), min(height, region[3] + padding)])
+    return [tuple(region) for region in _merge_overlapping(grown)], fraction
+
+
+def merge_elements(old_map: Dict[int, Dict[str, Any]], regions: Sequence[Box],
+                   new_elements: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+    # Elements outside the relabeled regions keep their entries and numbers.
+    # Relabeled elements take the number of the old element they overlap most
+    # (IoU >= REGION_DIFF_MATCH_IOU); genuinely new ones are numbered after the
+    # highest number in use, so numbers the planner has seen never move.
+    kept, replaced = {}, {}
+    for number, element in old_map.items():
+        box = element.get("image_box")
+        if box and any(_box_intersects(box, region) for region in regions):
+            replaced[number] = element
+        else:
+            kept[number] = element
+    next_number = max(old_map, default=0) + 1
+    merged = dict(kept)
+    for element in new_elements:
+        best_number, best_iou = None, REGION_DIFF_MATCH_IOU
+        for number, old in replaced.items():
+            if number in merged: continue
+            iou = box_iou(element["image_box"], old["image_box"])
+            if iou >= best_iou:
+                best_number, best_iou = number, iou
+        if best_number is None:
+            best_number, next_number = next_number, next_number + 1
+        element = dict(element, number=best_number)
+        merged[best_number] = element
+    return dict(sorted(merged.items()))
+
+
+def record_relabel(kind: str, regions: Sequence[Box] = (), frame_size: Tuple[int, int] = (0, 0)):
+    with _stats_lock:
+        _stats[kind] += 1
+        _stats["regions"] += len(regions)
+        _stats["crop_pixels"] += sum((r[2] - r[0]) * (r[3] - r[1]) for r in regions)
+        _stats["frame_pixels"] += frame_size[0] * frame_size[1]
+
+
+def region_diff_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["pixels_saved_fraction"] = round(1 - stats["crop_pixels"] / stats["frame_pixels"], 3) if stats["frame_pixels"] else None
+    return stats
@@ -0,0 +1,204 @@
+import base64
+import threading
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Sequence
+
+from PIL import Image
+
+# --- Configuration ---
+SCREENSHOT_FORMAT = "JPEG"  # "JPEG", "WEBP" or "PNG"
+SCREENSHOT_QUALITY = 80
+SCREENSHOT_BACKEND = "cdp"  # "cdp" (Page.captureScreenshot, falls back to "webdriver") or "webdriver" (PNG, re-encoded here)
+SCREENSHOT_FULL_PAGE_MAX_HEIGHT = 16384  # CSS pixels; a full-page capture of a longer page is cut off here
+
+_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+_CDP_FORMATS = {"JPEG": "jpeg", "WEBP": "webp", "PNG": "png"}
+_stats_lock = threading.Lock()
+_stats = {"captures": 0, "cdp_captures": 0, "original_bytes": 0, "sent_bytes": 0, "bytes_saved": 0}
+
+# Device pixel ratio, scroll offset, viewport and page size in one round trip.
+VIEWPORT_METRICS_JS = ("return [window.devicePixelRatio || 1, window.scrollX, window.scrollY, window.innerWidth, window.innerHeight, "
+                       "document.documentElement.scrollWidth, document.documentElement.scrollHeight];")
+
+
+class PreparedScreenshot:
+    # data is what gets uploaded. image is decoded from it on first use; reads
+    # key the vision cache on data and labeling hashes a reduced decode of it,
+    # so only a relabel's region diff decodes a CDP capture on the executor
+    # (the overlay renderer decodes the bytes on its own thread). origin is
+    # the viewport position, in CSS pixels, of the image's top-left corner:
+    # non-zero for a region clip, minus the scroll offset for a full-page capture.
+    # original_bytes is what came out of the browser: the PNG for a WebDriver
+    # capture, the encoded image itself for a CDP one.
+    def __init__(self, data: bytes, mime_type: str, image: Optional[Image.Image], original_size: Sequence[int],
+                 device_pixel_ratio: float, original_bytes: int, origin: Sequence[float] = (0, 0), size: Optional[Sequence[int]] = None,
+                 encoded_in_browser: bool = False):
+        self.data = data
+        self.mime_type = mime_type
+        self.original_size = tuple(original_size)
+        self.device_pixel_ratio = device_pixel_ratio or 1.0
+        self.original_bytes = original_bytes
+        self.origin = tuple(origin)
+        self.encoded_in_browser = encoded_in_browser
+        self._image = image
+        self.size = tuple(image.size) if image is not None else tuple(size)
+        self._lock = threading.Lock()
+        self.page_url: Optional[str] = None  # set by the capturer, so later users needn't ask the browser
+
+    @property
+    def image(self) -> Image.Image:
+        with self._lock:
+            if self._image is None:
+                self._image = Image.open(BytesIO(self.data)).convert("RGB")
+            return self._image
+
+    @property
+    def image_loaded(self) -> bool:
+        return self._image is not None
+
+    @property
+    def loaded_image(self) -> Optional[Image.Image]:
+        # The decoded image if someone already paid for it, without decoding.
+        return self._image
+
+    @property
+    def overlay_source(self):
+        return self._image if self._image is not None else self.data
+
+    @property
+    def bytes_saved(self) -> Optional[int]:
+        # What re-encoding the WebDriver PNG saved. A CDP capture never had a
+        # PNG to compare with; benchmark.py screenshot measures that saving.
+        if self.encoded_in_browser: return None
+        return self.original_bytes - len(self.data)
+
+    def to_viewport_box(self, box: Sequence[float]) -> List[int]:
+        # Boxes come back in the pixels of the image we sent. The raw screenshot
+        # is in device pixels, so undo the resize first and then divide by the
+        # device pixel ratio to land on the CSS pixels ActionChains expects.
+        scale_x = self.original_size[0] / self.size[0] / self.device_pixel_ratio
+        scale_y = self.original_size[1] / self.size[1] / self.device_pixel_ratio
+        x_min, y_min, x_max, y_max = box
+        origin_x, origin_y = self.origin
+        return [round(x_min * scale_x + origin_x), round(y_min * scale_y + origin_y),
+                round(x_max * scale_x + origin_x), round(y_max * scale_y + origin_y)]
+
+    def to_image_box(self, viewport_box: Sequence[float]) -> List[int]:
+        scale_x = self.size[0] * self.device_pixel_ratio / self.original_size[0]
+        scale_y = self.size[1] * self.device_pixel_ratio / self.original_size[1]
+        x_min, y_min, x_max, y_max = viewport_box
+        origin_x, origin_y = self.origin
+        return [round((x_min - origin_x) * scale_x), round((y_min - origin_y) * scale_y),
+                round((x_max - origin_x) * scale_x), round((y_max - origin_y) * scale_y)]
+
+
+def encode_image(image: Image.Image, image_format: str = SCREENSHOT_FORMAT, quality: int = SCREENSHOT_QUALITY):
+    image_format = image_format.upper()
+    buffer = BytesIO()
+    save_kwargs = {"optimize": True} if image_format == "PNG" else {"quality": quality}
+    image.save(buffer, format=image_format, **save_kwargs)
+    return buffer.getvalue(), _MIME_TYPES[image_format]
+
+
+def _checked_format(image_format: str) -> str:
+    image_format = image_format.upper()
+    if image_format not in _MIME_TYPES:
+        print(f"Warning: Unknown screenshot format '{image_format}'. Defaulting to JPEG.")
+        image_format = "JPEG"
+    return image_format
+
+
+def capture_options(action_data: Dict[str, Any]) -> Dict[str, Any]:
+    # READ_SCREEN's optional "capture": "full_page" and "region": [x_min,
+    # y_min, x_max, y_max] in viewport CSS pixels, as capture keyword arguments.
+    options: Dict[str, Any] = {}
+    if action_data.get("capture") == "full_page":
+        options["full_page"] = True
+    if action_data.get("region"):
+        options["region"] = [float(value) for value in action_data["region"]]
+    return options
+
+
+def capture_cdp_screenshot(driver, max_width: int, max_height: int, image_format: str = SCREENSHOT_FORMAT,
+                           quality: int = SCREENSHOT_QUALITY, region: Optional[Sequence[float]] = None,
+                           full_page: bool = False) -> PreparedScreenshot:
+    # Page.captureScreenshot clips, scales and encodes in the browser, so the
+    # decoded bytes are already what gets uploaded: no PNG round trip, no
+    # resize and no re-encode here.
+    image_format = _checked_format(image_format)
+    device_pixel_ratio, scroll_x, scroll_y, view_width, view_height, page_width, page_height = driver.execute_script(VIEWPORT_METRICS_JS)
+    device_pixel_ratio = float(device_pixel_ratio or 1)
+    if full_page:
+        x, y = 0, 0
+        width, height = max(view_width, page_width), min(max(view_height, page_height), SCREENSHOT_FULL_PAGE_MAX_HEIGHT)
+        origin = (-scroll_x, -scroll_y)
+    elif region:
+        x_min, y_min = max(0.0, region[0]), max(0.0, region[1])
+        x_max, y_max = min(float(view_width), region[2]), min(float(view_height), region[3])
+        if x_max <= x_min or y_max <= y_min:
+            raise ValueError(f"Region {list(region)} is outside the {view_width}x{view_height} viewport.")
+        x, y, width, height = scroll_x + x_min, scroll_y + y_min, x_max - x_min, y_max - y_min
+        origin = (x_min, y_min)
+    else:
+        x, y, width, height = scroll_x, scroll_y, view_width, view_height
+        origin = (0, 0)
+    device_size = (round(width * device_pixel_ratio), round(height * device_pixel_ratio))
+    if full_page:
+        # Only the width is fitted: squeezing a long page into max_height
+        # would leave its text unreadable, so the height follows the width.
+        scale = min(1.0, max_width / device_size[0])
+    else:
+        scale = min(1.0, max_width / device_size[0], max_height / device_size[1])
+    params = {"format": _CDP_FORMATS[image_format], "clip": {"x": x, "y": y, "width": width, "height": height, "scale": scale},
+              "captureBeyondViewport": bool(full_page), "fromSurface": True}
+    if image_format != "PNG":
+        params["quality"] = quality
+    data = base64.b64decode(driver.execute_cdp_cmd("Page.captureScreenshot", params)["data"])
+    size = Image.open(BytesIO(data)).size  # reads the header only
+    prepared = PreparedScreenshot(data, _MIME_TYPES[image_format], None, device_size, device_pixel_ratio, len(data), origin=origin, size=size,
+                                  encoded_in_browser=True)
+    _record_capture(prepared, cdp=True)
+    return prepared
+
+
+def prepare_screenshot(png_bytes: bytes, max_width: int, max_height: int, device_pixel_ratio: float = 1.0,
+                       image_format: str = SCREENSHOT_FORMAT, quality: int = SCREENSHOT_QUALITY,
+                       region: Optional[Sequence[float]] = None) -> PreparedScreenshot:
+    image_format = _checked_format(image_format)
+    img = Image.open(BytesIO(png_bytes))
+    origin = (0, 0)
+    if region:
+        # WebDriver can only shoot the whole viewport; crop the region here.
+        crop_box = [round(value * device_pixel_ratio) for value in region]
+        img = img.crop((max(0, crop_box[0]), max(0, crop_box[1]), min(img.width, crop_box[2]), min(img.height, crop_box[3])))
+        origin = (max(0, crop_box[0]) / device_pixel_ratio, max(0, crop_box[1]) / device_pixel_ratio)
+    original_size = img.size
+    img = img.convert("RGB")
+    if img.width > max_width or img.height > max_height:
+        img.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
+
+    if image_format == "PNG" and img.size == original_size and not region:
+        data, mime_type = png_bytes, _MIME_TYPES["PNG"]
+    else:
+        data, mime_type = encode_image(img, image_format, quality)
+        if len(data) >= len(png_bytes) and img.size == original_size and not region:
+            data, mime_type = png_bytes, _MIME_TYPES["PNG"]
+
+    prepared = PreparedScreenshot(data, mime_type, img, original_size, device_pixel_ratio, len(png_bytes), origin=origin)
+    _record_capture(prepared)
+    return prepared
+
+
+def _record_capture(prepared: PreparedScreenshot, cdp: bool = False):
+    with _stats_lock:
+        _stats["captures"] += 1
+        _stats["cdp_captures"] += int(cdp)
+        _stats["original_bytes"] += prepared.original_bytes
+        _stats["sent_bytes"] += len(prepared.data)
+        _stats["bytes_saved"] += prepared.bytes_saved or 0
+
+
+def pipeline_stats() -> Dict[str, Any]:
+    # bytes_saved covers WebDriver captures only (see PreparedScreenshot.bytes_saved).
+    with _stats_lock:
+        return dict(_stats)
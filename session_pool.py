@@ -0,0 +1,132 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+# --- Configuration ---
+DEFAULT_POOL_SIZE = 4
+DEFAULT_MAX_RUNS_PER_SESSION = 20
+
+
+class BrowserSession:
+    def __init__(self, session_id: int):
+        self.session_id = session_id
+        self.context: Any = None
+        self.runs = 0
+        self.generation = 0
+
+    def __repr__(self):
+        return f"BrowserSession(id={self.session_id}, generation={self.generation}, runs={self.runs})"
+
+
+class SessionPool:
+    # Hands jobs to free browser sessions. Each session owns one execution
+    # context (browser + vision model + shared_context), so concurrent jobs never
+    # share state. Sessions are created on first use and recycled after
+    # max_runs_per_session jobs or when is_alive() reports the browser dead.
+    def __init__(self, size: int = DEFAULT_POOL_SIZE, context_factory: Callable[[int], Any] = None,
+                 is_alive: Callable[[Any], bool] = None, close: Callable[[Any], None] = None,
+                 max_runs_per_session: int = DEFAULT_MAX_RUNS_PER_SESSION):
+        if size < 1:
+            raise ValueError("SessionPool size must be at least 1.")
+        self.size = size
+        self.context_factory = context_factory
+        self.is_alive = is_alive or (lambda ctx: True)
+        self.close = close or (lambda ctx: None)
+        self.max_runs_per_session = max_runs_per_session
+        self._free: "queue.Queue[BrowserSession]" = queue.Queue()
+        for session_id in range(1, size + 1):
+            self._free.put(BrowserSession(session_id))
+        self._sessions = []
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="session")
+        self._lock = threading.Lock()
+        self._started_at = time.perf_counter()
+        self._queued = 0
+        self._active = 0
+        self._completed = 0
+        self._failed = 0
+        self._recycled = 0
+        self._busy_s = 0.0
+        self._closed = False
+
+    def _prepare_session(self, session: BrowserSession):
+        needs_new = session.context is None
+        if not needs_new and session.runs >= self.max_runs_per_session:
+            print(f"DEBUG: Recycling {session} after {session.runs} runs.")
+            needs_new = True
+        elif not needs_new and not self.is_alive(session.context):
+            print(f"DEBUG: Recycling {session}: browser is no longer alive.")
+            needs_new = True
+        if not needs_new:
+            return
+        if session.context is not None:
+            self.close(session.context)
+            with self._lock:
+                self._recycled += 1
+        session.context = self.context_factory(session.session_id)
+        session.runs = 0
+        session.generation += 1
+        with self._lock:
+            if session not in self._sessions:
+                self._sessions.append(session)
+
+    def _run(self, fn: Callable, args, kwargs):
+        session = self._free.get()
+        with self._lock:
+            self._queued -= 1
+            self._active += 1
+        started = time.perf_counter()
+        try:
+            self._prepare_session(session)
+            result = fn(*args, ctx=session.context, **kwargs)
+            with self._lock:
+                self._completed += 1
+            return result
+        except Exception:
+            with self._lock:
+                self._failed += 1
+            raise
+        finally:
+            session.runs += 1
+            with self._lock:
+                self._active -= 1
+                self._busy_s += time.perf_counter() - started
+            self._free.put(session)
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        # fn is called as fn(*args, ctx=<session context>, **kwargs) on the first free session.
+        if self._closed:
+            raise RuntimeError("SessionPool has been shut down.")
+        with self._lock:
+            self._queued += 1
+        return self._executor.submit(self._run, fn, args, kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            elapsed = time.perf_counter() - self._started_at
+            busy_s = self._busy_s
+            return {
+                "size": self.size,
+                "queue_depth": self._queued,
+                "active": self._active,
+                "completed": self._completed,
+                "failed": self._failed,
+                "recycled": self._recycled,
+                "sessions_started": sum(s.generation for s in self._sessions),
+                "utilization": round(busy_s / (self.size * elapsed), 4) if elapsed > 0 else 0.0,
+            }
+
+    def shutdown(self, wait: bool = True):
+        self._closed = True
+        self._executor.shutdown(wait=wait)
+        for session in self._sessions:
+            if session.context is not None:
+                self.close(session.context)
+                session.context = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
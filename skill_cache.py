@@ -0,0 +1,130 @@
+import copy
+import json
+import threading
+from typing import Any, Dict, List, Optional
+
+from dom_labeler import STABLE_SELECTOR_JS
+from page_text import text_similarity
+from plan_compiler import compile_plan
+
+# --- Configuration ---
+SKILL_CACHE_PATH = "skill_cache.json"
+SKILL_REPLAY_WAIT_S = 3.0  # how long a replayed step waits for its recorded element before repairing
+SKILL_REPAIR_MIN_SIMILARITY = 0.5  # a relabeled element must describe the recorded one at least this well
+
+# Runs in the page. Resolves the element under a label's box centre (viewport
+# CSS pixels) to the nearest interactive ancestor and returns a CSS selector
+# and an XPath for it, so a replay can find it again without a screenshot.
+RESOLVE_ELEMENT_AT_POINT_JS = r"""
+const x = arguments[0];
+const y = arguments[1];
+""" + STABLE_SELECTOR_JS + r"""
+function stableXPath(el) {
+  if (el.id) return '//*[@id="' + el.id + '"]';
+  const name = el.getAttribute('name');
+  const tag = el.tagName.toLowerCase();
+  if (name && document.getElementsByName(name).length === 1) return '//' + tag + '[@name="' + name + '"]';
+  const parts = [];
+  for (let node = el; node && node.nodeType === 1; node = node.parentElement) {
+    let index = 1;
+    for (let sibling = node.previousElementSibling; sibling; sibling = sibling.previousElementSibling) {
+      if (sibling.tagName === node.tagName) index++;
+    }
+    parts.unshift(node.tagName.toLowerCase() + '[' + index + ']');
+  }
+  return '/' + parts.join('/');
+}
+let el = document.elementFromPoint(x, y);
+if (!el) return null;
+const interactive = el.closest('a[href],button,input,select,textarea,summary,label,[role="button"],[role="link"],[role="checkbox"],[role="tab"],[role="menuitem"],[contenteditable=""],[contenteditable="true"],[onclick]');
+if (interactive) el = interactive;
+return {
+  selector: stableSelector(el),
+  xpath: stableXPath(el),
+  tag: el.tagName.toLowerCase(),
+  name: (el.getAttribute('aria-label') || el.getAttribute('placeholder') || el.innerText || el.value || '').replace(/\s+/g, ' ').trim().slice(0, 80)
+};
+"""
+
+_stats_lock = threading.Lock()
+_stats = {"recorded": 0, "not_recorded": 0, "replays": 0, "replayed_steps": 0, "deferred_labels": 0, "repairs": 0, "failed_repairs": 0}
+
+
+def resolve_element_at(driver, x: float, y: float) -> Optional[Dict[str, Any]]:
+    target = driver.execute_script(RESOLVE_ELEMENT_AT_POINT_JS, x, y)
+    return target if isinstance(target, dict) and target.get("selector") else None
+
+
+class SkillRecorder:
+    # Collects, for one run of a plan, the DOM element each label_number
+    # click/type resolved to. build() turns the plan into a replay plan: those
+    # steps use the recorded css_selector (XPath as a second try) and the
+    # labeling steps that only fed them are deferred, so replaying needs no
+    # model call unless a recorded element is gone.
+    def __init__(self):
+        self.targets: Dict[int, Dict[str, Any]] = {}
+        self.problems: List[str] = []
+        self.repaired: List[int] = []
+
+    def record_target(self, step_index: int, target: Dict[str, Any], description: str, context_source: str, label_number: Any):
+        entry = {"selector": target["selector"], "xpath": target.get("xpath"), "description": description or target.get("name", ""),
+                 "context_source": context_source, "label_number": label_number}
+        previous = self.targets.get(step_index)
+        if previous is not None and previous["selector"] != entry["selector"]:
+            # The same step hit different elements (a loop over results); a
+            # fixed selector would replay it wrongly.
+            self.problems.append(f"step {step_index + 1} resolved to '{previous['selector']}' and '{entry['selector']}'")
+        self.targets[step_index] = entry
+
+    def build(self, steps: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+        if self.problems: return None
+        replay_steps = copy.deepcopy(list(steps))
+        for index, target in self.targets.items():
+            step = replay_steps[index]
+            step["data"] = dict(step.get("data") or {}, locator={"type": "css_selector", "value": target["selector"]})
+            step["replay"] = {key: target[key] for key in ("xpath", "description", "context_source", "label_number")}
+        # A labeling step can be deferred when nothing still reads its labels
+        # or its summary except the steps that now have selectors.
+        still_labeled = {(step.get("data") or {}).get("locator", {}).get("context_source") for step in _walk(replay_steps)
+                         if (step.get("data") or {}).get("locator", {}).get("type") == "label_number"}
+        for index, step in enumerate(replay_steps):
+            if step.get("action") != "LABEL_AND_READ_SCREEN": continue
+            key = (step.get("data") or {}).get("context_key_to_store_labels", "last_labeled_elements")
+            elsewhere = json.dumps(replay_steps[:index] + replay_steps[index + 1:])
+            if key in still_labeled or "{" + key in elsewhere:
+                step.pop("replay", None)
+            else:
+                step["replay"] = {"deferred": True}
+        if compile_plan(replay_steps).errors: return None
+        return replay_steps
+
+
+def _walk(steps: List[Dict[str, Any]]):
+    for step in steps:
+        if not isinstance(step, dict): continue
+        yield step
+        for branch in (step.get("data") or {}).get("branches") or []:
+            yield from _walk(branch.get("steps") or [])
+
+
+def pick_repair_target(elements_map: Dict[int, Dict[str, Any]], description: str, label_number: Any) -> Optional[int]:
+    # The relabeled element that best matches the recorded description; on a
+    # tie, the one with the recorded label number.
+    best, best_key = None, None
+    for number, element in elements_map.items():
+        score = text_similarity(description, element.get("description", "")) if description else 0.0
+        if score < SKILL_REPAIR_MIN_SIMILARITY: continue
+        key = (score, str(number) == str(label_number))
+        if best_key is None or key > best_key:
+            best, best_key = number, key
+    return best
+
+
+def record_skill_event(event: str, count: int = 1):
+    with _stats_lock:
+        _stats[event] += count
+
+
+def skill_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        return dict(_stats)
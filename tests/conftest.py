@@ -0,0 +1,42 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_backends import FakeWebDriver, FixtureServer  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def site():
+    with FixtureServer() as server:
+        yield server
+
+
+@pytest.fixture
+def driver():
+    fake_driver = FakeWebDriver()
+    yield fake_driver
+    fake_driver.quit()
+
+
+@pytest.fixture(scope="session")
+def chrome():
+    # Headless Chrome, for tests that have to run the real in-page scripts
+    # (FakeWebDriver answers them in Python). Skipped where Chrome is missing.
+    if not any(shutil.which(name) for name in ("google-chrome", "google-chrome-stable", "chromium", "chromium-browser", "chrome")):
+        pytest.skip("Chrome is not installed")
+    from selenium import webdriver
+    from selenium.common.exceptions import WebDriverException
+
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless=new")
+    options.add_argument("--window-size=1280,800")
+    try:
+        chrome_driver = webdriver.Chrome(options=options)
+    except WebDriverException as e:
+        pytest.skip(f"headless Chrome did not start: {e.msg}")
+    yield chrome_driver
+    chrome_driver.quit()
@@ -0,0 +1,43 @@
+import json
+
+import main
+from batch_runner import run_batch
+from fake_backends import FakeWebDriver
+from session_pool import SessionPool
+
+
+def test_batch_writes_one_record_per_goal(site, tmp_path):
+    def plan(url, answer):
+        return {"steps": [{"action": "NAVIGATE_TO_URL", "data": {"url": site.url(url)}},
+                          {"action": "ANSWER_USER", "data": {"response_template": answer}}]}
+
+    planned = {"find the deals": plan("deals.html", "Deals found.")}
+    lines = [json.dumps({"id": "deals", "goal": "find the deals"}),
+             json.dumps({"id": "guide", "plan": plan("guide.html", "Guide read.")}),
+             json.dumps({"request_id": "bad-plan", "plan": {"steps": [{"action": "CLICK_ELEMENT",
+                                                                      "data": {"locator": {"type": "label_number", "value": 1}}}]}}),
+             json.dumps({"id": "no-plan", "goal": "something nobody can plan"}),
+             "",
+             "{not json"]
+    input_path, output_path = tmp_path / "goals.jsonl", tmp_path / "results.jsonl"
+    input_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    pool = SessionPool(2, context_factory=lambda session_id: main.ExecutionContext(driver=FakeWebDriver(), headless=True, name=f"session-{session_id}"),
+                       close=main.close_context)
+    with pool:
+        summary = run_batch(str(input_path), str(output_path), pool, plan_fn=lambda goal: planned.get(goal, {}),
+                            run_fn=main.run_plan, is_valid_plan=main.is_valid_plan)
+
+    records = {record["id"]: record for record in map(json.loads, output_path.read_text(encoding="utf-8").splitlines())}
+    assert sorted(records) == ["bad-plan", "deals", "guide", "line-6", "no-plan"]
+    assert (records["deals"]["status"], records["deals"]["final_answer"]) == ("ok", "Deals found.")
+    assert (records["guide"]["status"], records["guide"]["final_answer"]) == ("ok", "Guide read.")
+    assert [step["action"] for step in records["deals"]["steps"]] == ["NAVIGATE_TO_URL", "ANSWER_USER"]
+    assert records["bad-plan"]["status"] == "invalid_plan"
+    assert records["no-plan"]["status"] == "plan_failed"
+    assert (records["line-6"]["status"], records["line-6"]["line"]) == ("invalid_input", 6)
+
+    assert (summary["runs"], summary["succeeded"]) == (5, 2)
+    assert summary["failures_by_status"] == {"invalid_plan": 1, "plan_failed": 1, "invalid_input": 1}
+    assert summary["pool"]["completed"] == 5
+    assert json.loads((tmp_path / "results.jsonl.summary.json").read_text(encoding="utf-8")) == summary
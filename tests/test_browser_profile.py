@@ -0,0 +1,103 @@
+import json
+
+import pytest
+
+import main
+from browser_profile import NetworkLog, apply_network_blocking, resolve_profile
+from fake_backends import FakeWebDriver
+
+
+@pytest.mark.parametrize("spec, message", [
+    ("turbo", "Unknown browser profile 'turbo'"),
+    ({"profile": "fast", "page_load_strategy": "lazy"}, "Unknown page_load_strategy 'lazy'"),
+    ({"block": ["media", "videos"]}, "Unknown resource class(es) ['videos']"),
+    ({"block": "media"}, "'block' must be a list of strings."),
+    ({"blocked_urls": ["*ads*", 3]}, "'blocked_urls' must be a list of strings."),
+    (["fast"], "A browser profile must be a name or an object, not list."),
+])
+def test_bad_profiles_are_rejected(spec, message):
+    with pytest.raises(ValueError) as error:
+        resolve_profile(spec)
+    assert message in str(error.value)
+
+
+def test_overrides_beat_the_named_profile_which_beats_the_base():
+    base = resolve_profile({"profile": "minimal", "headless": True})
+    # No profile name: start from the base and apply the fields given.
+    profile = resolve_profile({"page_load_strategy": "none", "blocked_urls": ["*ads.example*"]}, base=base)
+    assert (profile.name, profile.headless, profile.page_load_strategy) == ("minimal", True, "none")
+    assert profile.block == ["media", "fonts", "images", "third_party_scripts"]
+    assert profile.blocked_url_patterns[-1] == "*ads.example*"
+    # A profile name replaces the base entirely; explicit fields still win.
+    profile = resolve_profile({"profile": "fast", "block": ["media"], "disk_cache_mb": 32}, base=base)
+    assert (profile.name, profile.headless, profile.page_load_strategy) == ("fast", False, "eager")
+    assert (profile.block, profile.disk_cache_mb) == (["media"], 32)
+    # Unknown keys such as OPEN_BROWSER's "browser" are not profile fields.
+    assert resolve_profile({"browser": "chrome"}).describe() == resolve_profile().describe()
+
+
+def test_switching_to_a_profile_without_patterns_clears_the_blocking():
+    driver = FakeWebDriver()
+    fast, default = resolve_profile("fast"), resolve_profile("default")
+    assert not apply_network_blocking(driver, default)
+    assert apply_network_blocking(driver, fast)
+    assert driver.blocked_urls == fast.blocked_url_patterns
+    assert apply_network_blocking(driver, default, previous=fast)
+    assert driver.blocked_urls == []
+
+
+def _entry(method, **params):
+    return {"message": json.dumps({"message": {"method": method, "params": params}})}
+
+
+class LoggedDriver:
+    def __init__(self, entries):
+        self.entries = entries
+
+    def get_log(self, log_type):
+        entries, self.entries = self.entries, []
+        return entries
+
+
+def test_drain_counts_one_navigation_at_a_time():
+    profile = resolve_profile("fast")
+    driver = LoggedDriver([
+        _entry("Network.requestWillBeSent", requestId="1", request={"url": "https://shop.example/"}),
+        _entry("Network.loadingFinished", requestId="1", encodedDataLength=2048),
+        _entry("Network.requestWillBeSent", requestId="2", request={"url": "https://shop.example/launch.mp4"}),
+        _entry("Network.loadingFailed", requestId="2", blockedReason="inspector"),
+        _entry("Network.requestWillBeSent", requestId="3", request={"url": "https://shop.example/ads.js"}),
+        _entry("Network.loadingFailed", requestId="3", errorText="net::ERR_CONNECTION_RESET"),
+        {"message": "not json"},
+    ])
+    log = NetworkLog()
+    record = log.drain(driver, "NAVIGATE_TO_URL", "https://shop.example/", profile)
+    assert record == {"action": "NAVIGATE_TO_URL", "url": "https://shop.example/", "requests": 3, "loaded": 1, "bytes_loaded": 2048,
+                      "blocked": 1, "blocked_by_class": {"media": 1}, "failed": 1}
+    # The log was drained, so the next navigation starts from zero.
+    assert log.drain(driver, "CLICK_ELEMENT", "https://shop.example/", profile)["requests"] == 0
+    assert log.summary()["navigations"] == 2
+    assert log.drain(object(), "CLICK_ELEMENT", None, profile) is None
+    assert log.summary()["navigations"] == 2
+
+
+def test_blocked_and_loaded_requests_per_navigation(site):
+    # media.html: the page, a stylesheet, two fonts, two analytics scripts,
+    # an image and a video.
+    steps = [{"action": "OPEN_BROWSER", "data": {"browser": "chrome", "profile": "fast"}},
+             {"action": "NAVIGATE_TO_URL", "data": {"url": site.url("media.html")}},
+             {"action": "OPEN_BROWSER", "data": {"browser": "chrome", "profile": "default"}},
+             {"action": "NAVIGATE_TO_URL", "data": {"url": site.url("media.html")}}]
+    driver = FakeWebDriver()
+    ctx = main.ExecutionContext(driver=driver, name="test-profile")
+    try:
+        assert main.run_plan(steps, ctx)["success"]
+    finally:
+        main.close_context(ctx)
+    fast, default = ctx.network_log.records
+    assert (fast["requests"], fast["loaded"], fast["blocked"], fast["failed"]) == (8, 3, 5, 0)
+    assert fast["blocked_by_class"] == {"fonts": 2, "third_party_scripts": 2, "media": 1}
+    assert (default["requests"], default["loaded"], default["blocked"], default["failed"]) == (8, 8, 0, 0)
+    assert default["bytes_loaded"] > fast["bytes_loaded"]
+    assert driver.blocked_urls == []
+    assert ctx.network_log.summary()["blocked_by_class"] == fast["blocked_by_class"]
@@ -0,0 +1,48 @@
+import time
+
+import pytest
+
+import main
+from daemon import iter_run_events, run_remote
+from fake_backends import FakeWebDriver
+
+
+@pytest.fixture
+def daemon():
+    agent_daemon = main.create_daemon(port=0, context_factory=lambda: main.ExecutionContext(driver=FakeWebDriver(), headless=True, name="daemon"))
+    thread = agent_daemon.start().serve_in_background()
+    yield agent_daemon
+    agent_daemon.stop()
+    thread.join(timeout=10)
+
+
+def test_run_streams_one_event_per_step_then_the_result(daemon, site, monkeypatch):
+    monkeypatch.setattr(main, "WAIT_TIME", 0.5)
+    plan = {"steps": [{"action": "NAVIGATE_TO_URL", "data": {"url": site.url("deals.html")}},
+                      {"action": "CLICK_ELEMENT", "data": {"locator": {"type": "css_selector", "value": "#no-such-element"}}},
+                      {"action": "ANSWER_USER", "data": {"response_template": "Done."}}]}
+    events, received = [], []
+    for event in iter_run_events(plan=plan, port=daemon.port):
+        events.append(event)
+        received.append(time.perf_counter())
+    assert [event["event"] for event in events] == ["accepted", "plan", "step", "step", "step", "result"]
+    assert events[0]["queue_position"] == 1
+    assert (events[1]["steps"], events[1]["complete"]) == (3, True)
+    assert [(event["index"], event["action"], event["skipped"]) for event in events[2:5]] == [
+        (1, "NAVIGATE_TO_URL", False), (2, "CLICK_ELEMENT", True), (3, "ANSWER_USER", False)]
+    # Events are written as they happen, not when the run is over: the missing
+    # element keeps step 2 waiting for WAIT_TIME after step 1 is reported.
+    assert received[3] - received[2] >= 0.4
+    result = events[-1]["result"]
+    assert result["final_answer"] == "Done." and result["steps"] == [{k: v for k, v in event.items() if k != "event"} for event in events[2:5]]
+    # The same warm browser serves the next run.
+    assert run_remote(plan={"steps": plan["steps"][-1:]}, port=daemon.port)["result"]["success"]
+    assert daemon.stats()["runs"] == 2 and daemon.stats()["contexts_started"] == 1
+    assert daemon.context.driver.current_url == site.url("deals.html")
+
+
+def test_bad_requests_end_with_an_error_event(daemon):
+    assert list(iter_run_events(plan={"stepz": []}, port=daemon.port)) == [
+        {"event": "accepted", "queue_position": 1}, {"event": "error", "error": "No valid plan with a 'steps' list."}]
+    assert list(iter_run_events(plan={}, port=daemon.port)) == [{"event": "error", "error": "Body needs a 'goal' or a 'plan'."}]
+    assert daemon.stats()["failed"] == 1
@@ -0,0 +1,86 @@
+import json
+import os
+
+from selenium.webdriver.common.by import By
+
+import main
+from dom_labeler import apply_vision_ranking, collect_dom_elements
+from fake_backends import FakeGenerativeModel
+
+LABELING_FIXTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures", "labeling.html")
+
+
+def _labels(elements_map):
+    return {number: (element["description"], element["selector"]) for number, element in elements_map.items()}
+
+
+def test_labels_resolve_to_their_elements(site, driver):
+    driver.get(site.url("index.html"))
+    elements_map = collect_dom_elements(driver)
+    assert [element["description"] for element in elements_map.values()] == [
+        'link "Fixture Store"', 'link "Today\'s deals"', 'input[type=text] "Search for products"',
+        'button "Search"', 'link "Fixture Phone 128GB"', 'link "Fixture Phone 256GB"',
+    ]
+    assert list(elements_map) == list(range(1, 7))
+    for element in elements_map.values():
+        found = driver.find_element(By.CSS_SELECTOR, element["selector"])
+        assert found.rect["y"] == element["box"][1]
+
+
+def test_label_ids_are_stable_across_relabels(site, driver):
+    driver.get(site.url("index.html"))
+    first = _labels(collect_dom_elements(driver))
+    assert _labels(collect_dom_elements(driver)) == first
+    driver.find_element(By.ID, "search").send_keys("phone")
+    assert _labels(collect_dom_elements(driver)) == first
+    driver.get(site.url("deals.html"))
+    driver.get(site.url("index.html"))
+    assert _labels(collect_dom_elements(driver)) == first
+
+
+def test_vision_ranking_keeps_dom_numbers_and_boxes(site, driver):
+    driver.get(site.url("index.html"))
+    elements_map = collect_dom_elements(driver)
+    ranking = json.dumps({"elements": [{"number": 3, "description": "Search box"}, {"number": 99}, {"number": 5}]})
+    ranked = apply_vision_ranking(elements_map, f"```json\n{ranking}\n```")
+    assert list(ranked) == [3, 5, 1, 2, 4, 6]
+    assert ranked[3]["description"] == "Search box" and ranked[3]["rank"] == 1
+    assert ranked[5]["description"] == elements_map[5]["description"]
+    assert all(ranked[number]["box"] == elements_map[number]["box"] for number in elements_map)
+
+
+def test_dom_labels_drive_a_click_without_a_vision_call(site, driver):
+    ctx = main.ExecutionContext(driver=driver, headless=True, name="test-dom-labels")
+    ctx.vision_model = FakeGenerativeModel()
+    steps = [
+        {"action": "NAVIGATE_TO_URL", "data": {"url": site.url("index.html")}},
+        {"action": "LABEL_AND_READ_SCREEN", "data": {"labeling_mode": "dom", "context_key_to_store_labels": "home"}},
+        {"action": "CLICK_ELEMENT", "data": {"locator": {"type": "label_number", "value": 5, "context_source": "home"}}},
+    ]
+    try:
+        assert main.run_plan(steps, ctx)["success"]
+        assert driver.current_url.endswith("/product-1.html")
+        assert ctx.vision_model.calls == []
+    finally:
+        main.overlay_renderer.flush(timeout=30)
+        main.close_context(ctx)
+
+
+def test_collector_script_in_chrome(chrome):
+    # The real COLLECT_INTERACTIVE_ELEMENTS_JS: hidden, disabled, covered and
+    # off-screen elements are dropped, a link inside a clickable row is not
+    # labeled separately, and names come from aria-labelledby, aria-label,
+    # <label for>, alt text and inner text.
+    chrome.get("file://" + LABELING_FIXTURE)
+    elements_map = collect_dom_elements(chrome)
+    descriptions = [element["description"] for element in elements_map.values()]
+    assert descriptions[:4] == ['link "Home"', 'link "Today\'s deals"', 'button "Open cart"', 'input[type=text] "Search products"']
+    assert descriptions[4].startswith('select "All')
+    assert descriptions[5:] == ['button "Search"', 'button "iPhone 13"', 'div "Leave a note"', 'div "Row link"']
+    assert elements_map[1]["selector"] == "#home-link"
+    assert elements_map[3]["selector"] == 'button[aria-label="Open cart"]'
+    assert elements_map[8]["selector"] == 'div[data-testid="note"]'
+    for element in elements_map.values():
+        found = chrome.find_elements(By.CSS_SELECTOR, element["selector"])
+        assert len(found) == 1, element["selector"]
+        assert [round(found[0].rect["x"]), round(found[0].rect["y"])] == element["box"][:2]
@@ -0,0 +1,53 @@
+import builtins
+
+import pytest
+
+import main
+from fake_backends import FakeWebDriver
+
+
+@pytest.fixture
+def contexts(monkeypatch):
+    created = []
+    real_context = main.ExecutionContext
+
+    def make_context(*args, **kwargs):
+        drivers = [FakeWebDriver(), FakeWebDriver()]
+        ctx = real_context(driver=drivers[0], name="cli")
+        ctx.branch_contexts = [real_context(driver=drivers[1], name="cli-branch-1")]
+        ctx.prefetcher.start("warm", lambda: None, lambda: None, lambda captured: None)
+        created.append((ctx, drivers))
+        return ctx
+
+    monkeypatch.setattr(main, "ExecutionContext", make_context)
+    return created
+
+
+def _answers(*lines):
+    remaining = list(lines)
+
+    def fake_input(prompt=""):
+        answer = remaining.pop(0)
+        if isinstance(answer, BaseException):
+            raise answer
+        return answer
+    return fake_input
+
+
+@pytest.mark.parametrize("lines, api_key", [
+    (["exit"], "key"),
+    (["find me a phone"], ""),
+    ([KeyboardInterrupt()], "key"),
+    ([EOFError()], "key"),
+])
+def test_every_exit_path_closes_the_browsers(contexts, monkeypatch, lines, api_key):
+    monkeypatch.setattr(builtins, "input", _answers(*lines))
+    monkeypatch.setattr(main, "gemini_api_key", api_key)
+    try:
+        main.main()
+    except (KeyboardInterrupt, EOFError):
+        pass
+    ctx, drivers = contexts[0]
+    assert ctx.driver is None and ctx.branch_contexts == []
+    assert all(driver._closed for driver in drivers)
+    assert ctx.prefetcher._executor is None
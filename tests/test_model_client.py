@@ -0,0 +1,61 @@
+import time
+
+import pytest
+
+from fake_backends import FakeModelServer, HttpGenerativeModel
+from model_client import ModelCallError, ModelClient, TokenBucket
+
+
+def _client(**kwargs):
+    options = dict(rate_limits_rpm={}, default_rpm=1_000_000, burst=1000, backoff_base_s=0.01, seed=1)
+    options.update(kwargs)
+    return ModelClient(**options)
+
+
+def test_retryable_errors_are_retried_until_a_success():
+    with FakeModelServer(text="ok", script=[(429, 0.0), (503, 0.0)]) as server:
+        client = _client()
+        assert client.generate(HttpGenerativeModel(server.url), "fake", "hello").text == "ok"
+    stats = client.stats()["fake"]
+    assert (stats["attempts"], stats["retries"], stats["failures"]) == (3, 2, 0)
+
+
+def test_non_retryable_error_fails_at_once():
+    with FakeModelServer(script=[(400, 0.0)]) as server:
+        client = _client()
+        with pytest.raises(ModelCallError) as failure:
+            client.generate(HttpGenerativeModel(server.url), "fake", "hello")
+    assert failure.value.attempts == 1 and failure.value.reason == "failed with a non-retryable error"
+    assert server.requests == 1
+
+
+def test_deadline_bounds_a_slow_call():
+    with FakeModelServer(latency_s=1.0) as server:
+        client = _client(max_retries=0, hedging=False)
+        started = time.monotonic()
+        with pytest.raises(ModelCallError):
+            client.generate(HttpGenerativeModel(server.url), "fake", "hello", deadline_s=0.2)
+        assert time.monotonic() - started < 0.6
+
+
+def test_slow_call_is_hedged_once_latencies_are_known():
+    with FakeModelServer(text="ok", latency_s=0.01) as server:
+        client = _client()
+        model = HttpGenerativeModel(server.url)
+        for _ in range(20):
+            client.generate(model, "fake", "warm up")
+        server.script = [(200, 1.5)]
+        started = time.monotonic()
+        assert client.generate(model, "fake", "hedge me").text == "ok"
+        assert time.monotonic() - started < 1.0
+    stats = client.stats()["fake"]
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1
+
+
+def test_token_bucket_spends_its_burst_then_waits():
+    bucket = TokenBucket(rate_per_s=20, burst=2)
+    assert bucket.try_acquire() and bucket.try_acquire()
+    assert not bucket.try_acquire()
+    started = time.monotonic()
+    assert bucket.acquire(timeout=1.0)
+    assert 0.02 < time.monotonic() - started < 0.5
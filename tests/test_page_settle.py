@@ -0,0 +1,95 @@
+import pytest
+
+import page_settle
+from fake_backends import FixtureServer
+from page_settle import read_settle_state, wait_for_page_settle
+
+
+class ScriptedDriver:
+    # Answers the settle probe from a list of states (None: mid-navigation,
+    # the probe can't run); the last state repeats.
+    def __init__(self, states):
+        self.states = list(states)
+        self.polls = 0
+
+    def execute_script(self, script, *args):
+        state = self.states[min(self.polls, len(self.states) - 1)]
+        self.polls += 1
+        return state
+
+
+def _state(doc_id, url="http://site/a", ready_state="complete", unloading=False, quiet_ms=1000):
+    return {"readyState": ready_state, "url": url, "docId": doc_id, "unloading": unloading, "mutations": 0, "pending": 0, "quietMs": quiet_ms}
+
+
+def _wait(states, **kwargs):
+    return wait_for_page_settle(ScriptedDriver(states), "CLICK_ELEMENT", timeout=2.0, **kwargs)
+
+
+def test_quiet_page_settles_at_once(monkeypatch):
+    monkeypatch.setattr(page_settle, "SETTLE_POLL_INTERVAL", 0.001)
+    record = _wait([_state("old")], previous_url="http://site/a", previous_doc_id="old")
+    assert record["settled"] and record["polls"] == 1
+    assert not record["url_changed"] and not record["doc_changed"]
+
+
+def test_click_that_starts_a_navigation_waits_for_the_new_document(monkeypatch):
+    monkeypatch.setattr(page_settle, "SETTLE_POLL_INTERVAL", 0.001)
+    states = [_state("old", unloading=True)] * 3 + [None, _state("new", url="http://site/b", ready_state="loading"),
+                                                    _state("new", url="http://site/b")]
+    record = _wait(states, previous_url="http://site/a", previous_doc_id="old")
+    assert record["settled"] and record["polls"] == 6
+    assert record["url"] == "http://site/b" and record["url_changed"] and record["doc_changed"]
+
+
+def test_same_url_reload_waits_for_the_new_document(monkeypatch):
+    monkeypatch.setattr(page_settle, "SETTLE_POLL_INTERVAL", 0.001)
+    record = _wait([_state("old", unloading=True), _state("old", unloading=True), _state("new")],
+                   previous_url="http://site/a", previous_doc_id="old")
+    assert record["settled"] and record["polls"] == 3
+    assert not record["url_changed"] and record["doc_changed"]
+
+
+def test_same_document_url_change_settles_without_a_new_document(monkeypatch):
+    monkeypatch.setattr(page_settle, "SETTLE_POLL_INTERVAL", 0.001)
+    record = _wait([_state("old", url="http://site/a#reviews")], previous_url="http://site/a", previous_doc_id="old")
+    assert record["settled"] and record["url_changed"] and not record["doc_changed"]
+
+
+def test_navigation_that_never_commits_times_out(monkeypatch):
+    monkeypatch.setattr(page_settle, "SETTLE_POLL_INTERVAL", 0.01)
+    record = wait_for_page_settle(ScriptedDriver([_state("old", unloading=True)]), "CLICK_ELEMENT", timeout=0.1,
+                                  previous_url="http://site/a", previous_doc_id="old")
+    assert record["timed_out"]
+
+
+
+@pytest.fixture(scope="module")
+def slow_site():
+    with FixtureServer(latency_s=1.0) as server:
+        yield server
+
+
+def test_real_probe_waits_for_a_pending_fetch(chrome, site, slow_site):
+    chrome.get(site.url("index.html"))
+    before = read_settle_state(chrome)
+    # Cross-origin, so the fetch is rejected, but only once the slow response is in.
+    chrome.execute_script("fetch(arguments[0]).catch(() => {});", slow_site.url("deals.html"))
+    assert read_settle_state(chrome)["pending"] == 1
+    record = wait_for_page_settle(chrome, "CLICK_ELEMENT", previous_url=before["url"], previous_doc_id=before["docId"])
+    assert record["settled"] and record["pending_requests"] == 0
+    assert record["waited_s"] >= 0.8
+    assert not record["doc_changed"] and not record["url_changed"]
+
+
+def test_real_probe_waits_for_a_navigation_started_during_the_wait(chrome, site, slow_site):
+    chrome.get(site.url("index.html"))
+    before = read_settle_state(chrome)
+    target = slow_site.url("deals.html")
+    # The old page is quiet long before the slow page commits; it must not settle there.
+    chrome.execute_script("const url = arguments[0]; setTimeout(() => { location.href = url; }, 100);", target)
+    record = wait_for_page_settle(chrome, "CLICK_ELEMENT", previous_url=before["url"], previous_doc_id=before["docId"])
+    assert record["settled"] and record["doc_changed"] and record["url_changed"]
+    assert record["url"] == target
+    assert record["waited_s"] >= 0.8
+    assert chrome.execute_script("return document.readyState;") == "complete"
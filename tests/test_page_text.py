@@ -0,0 +1,95 @@
+import pytest
+
+from page_settle import read_settle_state
+from page_text import PageTextIndex, build_page_text_index, text_similarity
+
+
+@pytest.fixture
+def guide(site, driver):
+    driver.get(site.url("guide.html"))
+    return build_page_text_index(driver)
+
+
+def test_text_similarity_tolerates_typos_and_case():
+    assert text_similarity("Return window", "Return window: 30 days from delivery") == 1.0
+    assert text_similarity("retrun windw", "Return window: 30 days from delivery") >= 0.75
+    assert text_similarity("gift cards", "Return window: 30 days from delivery") < 0.75
+
+
+def test_find_prefers_the_most_specific_block(guide):
+    block, score = guide.find("Warranty")
+    assert (block["tag"], block["text"], score) == ("h2", "Warranty", 1.0)
+    block, _ = guide.find("Makng a clam", headings_only=True)
+    assert block["text"] == "Making a claim"
+    assert block["section"] == ["Help Center", "Warranty", "Making a claim"]
+    assert guide.find("gift wrapping") is None
+
+
+def test_read_value_strips_the_label(guide):
+    assert guide.read_value("Return window") == "30 days from delivery"
+    assert guide.read_value("support email") == "help@fixture.example"
+    # A block that doesn't start with the query comes back whole.
+    assert guide.read_value("PO boxes") == "We do not ship to PO boxes."
+    assert guide.read_value("loyalty points") is None
+
+
+def test_read_section_stops_at_the_next_sibling_heading(guide):
+    returns = guide.read_section("Returns").split("\n")
+    assert returns[0] == "Return window: 30 days from delivery"
+    assert "Exchanges" in returns
+    assert "Exchanges for a different size or colour are free of charge." in returns
+    assert "Warranty" not in returns
+    assert guide.read_section("Exchanges").split("\n") == [
+        "Exchanges for a different size or colour are free of charge.",
+        "Start an exchange from the order page; a prepaid label is emailed to you.",
+    ]
+    assert guide.read_section("Shipping policy for PO boxes") is None
+
+
+def test_index_is_current_until_the_page_mutates(driver, guide):
+    assert guide.is_current(read_settle_state(driver))
+    driver.find_element("css selector", "h1").click()
+    assert not guide.is_current(read_settle_state(driver))
+    assert build_page_text_index(driver).is_current(read_settle_state(driver))
+
+
+def test_index_is_stale_after_navigation(site, driver, guide):
+    driver.get(site.url("product-1.html"))
+    assert not guide.is_current(read_settle_state(driver))
+    # Reloading the same URL is a new document, even with no mutations yet.
+    driver.get(site.url("guide.html"))
+    state = read_settle_state(driver)
+    assert (state["url"], state["mutations"]) == (guide.url, guide.mutations)
+    assert not guide.is_current(state)
+
+
+def test_index_without_a_document_id_is_never_current():
+    index = PageTextIndex({"url": "http://example.test/", "docId": None, "mutations": 0, "blocks": []})
+    assert not index.is_current({"url": "http://example.test/", "docId": None, "mutations": 0})
+    assert not index.is_current(None)
+
+
+def test_text_index_script_in_chrome(chrome, site):
+    chrome.get(site.url("guide.html"))
+    read_settle_state(chrome)
+    index = build_page_text_index(chrome)
+    assert index.document_id is not None and not index.truncated
+    assert index.read_value("Return window") == "30 days from delivery"
+    assert index.read_value("support email") == "help@fixture.example"
+    block, _ = index.find("Makng a clam", headings_only=True)
+    assert (block["tag"], block["section"]) == ("h3", ["Help Center", "Warranty", "Making a claim"])
+    assert index.read_section("Exchanges").split("\n") == [
+        "Exchanges for a different size or colour are free of charge.",
+        "Start an exchange from the order page; a prepaid label is emailed to you.",
+    ]
+    # Rects are in document coordinates, so they don't move when the page scrolls.
+    chrome.execute_script("window.scrollTo(0, 200);")
+    assert build_page_text_index(chrome).find("Support email")[0]["rect"] == index.find("Support email")[0]["rect"]
+
+    assert index.is_current(read_settle_state(chrome))
+    chrome.execute_script("document.querySelector('main').appendChild(document.createElement('p')).textContent = 'New note';")
+    assert not index.is_current(read_settle_state(chrome))
+    fresh = build_page_text_index(chrome)
+    assert fresh.find("New note") is not None and fresh.is_current(read_settle_state(chrome))
+    chrome.refresh()
+    assert not fresh.is_current(read_settle_state(chrome))
@@ -0,0 +1,66 @@
+import json
+
+from plan_cache import PLAN_CACHE_FORMAT, PlanCache, apply_params, normalize_goal, parameterize_plan
+
+
+def _plan():
+    return {"steps": [
+        {"action": "NAVIGATE_TO_URL", "data": {"url": "https://shop.example/api/v3/search?limit=3&page=1"}},
+        {"action": "TYPE_INTO_ELEMENT", "data": {"locator": {"type": "css_selector", "value": "li:nth-of-type(3) input"}, "text": "top 3 laptops"}},
+        {"action": "CLICK_ELEMENT", "data": {"locator": {"type": "xpath", "value": "/html[1]/body[1]/ul[1]/li[3]"}}},
+        {"action": "CLICK_ELEMENT", "data": {"locator": {"type": "link_text", "value": "Show 3 more"}}},
+        {"action": "READ_SCREEN", "data": {"prompt_for_vision": "List the first 3 laptops and their prices.", "context_key_to_store": "laptops"}},
+        {"action": "CONDITIONAL_JUMP", "data": {"condition": "{laptops.3} == ''", "goto_step": 3}},
+        {"action": "ANSWER_USER", "data": {"response_template": "Your top 3: {laptops}"}},
+    ]}
+
+
+def _reuse(goal, new_goal, plan):
+    template, params = normalize_goal(goal)
+    new_template, new_params = normalize_goal(new_goal)
+    assert template == new_template
+    return apply_params(parameterize_plan(plan, params), params, new_params)
+
+
+def test_goal_numbers_are_rewritten_in_goal_derived_fields():
+    steps = _reuse("find the top 3 laptops", "find the top 5 laptops", _plan())["steps"]
+    assert steps[0]["data"]["url"] == "https://shop.example/api/v3/search?limit=5&page=1"
+    assert steps[1]["data"]["text"] == "top 5 laptops"
+    assert steps[3]["data"]["locator"]["value"] == "Show 5 more"
+    assert steps[4]["data"]["prompt_for_vision"] == "List the first 5 laptops and their prices."
+    assert steps[6]["data"]["response_template"] == "Your top 5: {laptops}"
+
+
+def test_numbers_the_page_owns_are_left_alone():
+    steps = _reuse("find the top 3 laptops", "find the top 5 laptops", _plan())["steps"]
+    assert steps[1]["data"]["locator"]["value"] == "li:nth-of-type(3) input"
+    assert steps[2]["data"]["locator"]["value"] == "/html[1]/body[1]/ul[1]/li[3]"
+    assert steps[5]["data"]["condition"] == "{laptops.3} == ''"
+    assert steps[5]["data"]["goto_step"] == 3
+
+
+def test_same_params_round_trip_unchanged():
+    plan = _plan()
+    assert _reuse("find the top 3 laptops", "find the  Top 3 laptops", plan) == plan
+
+
+def test_ambiguous_mapping_is_refused():
+    plan = {"steps": [{"action": "TYPE_INTO_ELEMENT", "data": {"locator": {"type": "id", "value": "q"}, "text": "3 rooms for 3 nights"}}]}
+    assert _reuse("book 3 rooms for 3 nights", "book 2 rooms for 4 nights", plan) is None
+    assert _reuse("book 3 rooms for 3 nights", "book 4 rooms for 4 nights", plan)["steps"][0]["data"]["text"] == "4 rooms for 4 nights"
+
+
+def test_parallel_branches_are_parameterized():
+    plan = {"steps": [{"action": "PARALLEL", "data": {"branches": [
+        {"steps": [{"action": "READ_SCREEN", "data": {"prompt_for_vision": "Price of the 3 GB plan?"}}]}]}}]}
+    branch_step = _reuse("compare 3 gb plans", "compare 8 gb plans", plan)["steps"][0]["data"]["branches"][0]["steps"][0]
+    assert branch_step["data"]["prompt_for_vision"] == "Price of the 8 GB plan?"
+
+
+def test_entries_of_an_older_format_are_dropped(tmp_path):
+    path = tmp_path / "plan_cache.json"
+    path.write_text(json.dumps({"old goal": {"response_text": "{\"steps\": []}", "params": [], "created_at": 9e12, "last_used": 9e12}}))
+    cache = PlanCache(path=str(path))
+    assert cache.get("old goal") is None
+    cache.put("new goal", "{\"steps\": []}", [])
+    assert cache.get("new goal")["format"] == PLAN_CACHE_FORMAT
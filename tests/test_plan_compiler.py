@@ -0,0 +1,51 @@
+import pytest
+
+import main
+from fake_backends import FakeWebDriver
+from plan_compiler import compile_plan
+
+
+def _plan(*middle):
+    return [{"action": "NAVIGATE_TO_URL", "data": {"url": "https://shop.example/"}},
+            {"action": "LABEL_AND_READ_SCREEN", "data": {"context_key_to_store_labels": "page"}},
+            *middle,
+            {"action": "ANSWER_USER", "data": {"response_template": "Done."}}]
+
+
+@pytest.mark.parametrize("goto_step, error", [
+    (0, "Step 3: goto_step 0 is outside the plan (1-4)."),
+    (5, "Step 3: goto_step 5 is outside the plan (1-4)."),
+    ("next", "Step 3: goto_step 'next' is not an integer."),
+])
+def test_bad_jump_targets_are_errors(goto_step, error):
+    plan = compile_plan(_plan({"action": "CONDITIONAL_JUMP", "data": {"condition": "{page}", "goto_step": goto_step}}))
+    assert plan.errors == [error]
+
+
+def test_missing_or_unstored_context_source_is_an_error():
+    plan = compile_plan(_plan({"action": "CLICK_ELEMENT", "data": {"locator": {"type": "label_number", "value": 3}}},
+                              {"action": "CLICK_ELEMENT", "data": {"locator": {"type": "label_number", "value": 4, "context_source": "cart"}}}))
+    assert plan.errors == ["Step 3: 'context_source' is required for a 'label_number' locator.",
+                           "Step 4: context_source 'cart' is never stored by a LABEL_AND_READ_SCREEN step."]
+
+
+def test_unknown_action_is_reported_before_the_run():
+    # Unknown actions are skipped at run time, as they always were; the plan
+    # still runs, but the problem is reported up front.
+    plan = compile_plan(_plan({"action": "HOVER_ELEMENT", "data": {}}))
+    assert plan.ok
+    assert plan.warnings == ["Step 3: unknown action 'HOVER_ELEMENT' will be skipped."]
+
+
+def test_plan_errors_stop_the_run_before_the_first_step(site):
+    steps = [{"action": "NAVIGATE_TO_URL", "data": {"url": site.url("index.html")}},
+             {"action": "CLICK_ELEMENT", "data": {"locator": {"type": "label_number", "value": 1}}}]
+    driver = FakeWebDriver()
+    ctx = main.ExecutionContext(driver=driver, name="test-compiler")
+    try:
+        result = main.run_plan(steps, ctx)
+    finally:
+        main.close_context(ctx)
+    assert result["halted"] and result["steps"] == []
+    assert result["plan_errors"] == ["Step 2: 'context_source' is required for a 'label_number' locator."]
+    assert driver.navigations == 0
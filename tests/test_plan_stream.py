@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+from plan_stream import StepStreamParser
+
+STEPS = [
+    {"action": "NAVIGATE_TO_URL", "data": {"url": "https://shop.example/search?q={query}"}},
+    # Braces, brackets, commas and escaped quotes inside strings are not structure.
+    {"action": "READ_SCREEN", "data": {"prompt_for_vision": "Is there a \"Deal}\" badge, [yes/no]?", "context_key_to_store": "deal"}},
+    # A nested "steps" key is a branch's plan, not the top-level one.
+    {"action": "PARALLEL", "data": {"branches": [{"name": "a", "steps": [{"action": "READ_SCREEN", "data": {}}]}]}},
+    {"action": "ANSWER_USER", "data": {"response_template": "Deal: {deal}\\n"}},
+]
+RESPONSE = "Here is the plan:\n```json\n" + json.dumps({"thought": "{not a step}", "steps": STEPS}, indent=1) + "\n```\nGood luck!"
+
+
+def _feed(parser, chunks):
+    return [step for chunk in chunks for step in parser.feed(chunk)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, len(RESPONSE)])
+def test_steps_come_out_whole_whatever_the_chunking(chunk_size):
+    parser = StepStreamParser()
+    steps = _feed(parser, [RESPONSE[i:i + chunk_size] for i in range(0, len(RESPONSE), chunk_size)])
+    assert steps == STEPS
+    assert parser.steps_parsed == len(STEPS)
+    assert parser.text == RESPONSE
+
+
+def test_a_step_is_emitted_as_soon_as_it_closes():
+    text = json.dumps({"steps": STEPS[:2]})
+    first_end = text.index(json.dumps(STEPS[0])) + len(json.dumps(STEPS[0]))
+    parser = StepStreamParser()
+    assert parser.feed(text[:first_end - 1]) == []
+    assert parser.feed(text[first_end - 1:first_end]) == [STEPS[0]]
+    assert parser.feed(text[first_end:]) == [STEPS[1]]
+
+
+def test_a_cut_off_response_yields_only_the_complete_steps():
+    text = json.dumps({"steps": STEPS})
+    cut = text.index('"PARALLEL"')
+    parser = StepStreamParser()
+    assert parser.feed(text[:cut]) == STEPS[:2]
+    assert parser.steps_parsed == 2
+
+
+def test_steps_outside_the_top_level_array_are_ignored():
+    parser = StepStreamParser()
+    text = json.dumps({"examples": {"steps": [STEPS[0]]}, "steps": [STEPS[3]]}) + json.dumps({"steps": [STEPS[1]]})
+    assert _feed(parser, [text[:40], text[40:]]) == [STEPS[3]]
@@ -0,0 +1,84 @@
+import pytest
+
+import main
+from fake_backends import FakeGenerativeModel, FakeWebDriver
+from model_client import ModelClient
+from plan_watchdog import Watchdog, WatchdogAbort
+
+
+@pytest.fixture
+def fast_models(monkeypatch):
+    monkeypatch.setattr(main, "VISION_CACHE_ENABLED", False)
+    monkeypatch.setattr(main, "PREFETCH_ENABLED", False)
+    monkeypatch.setattr(main, "READ_BATCH_ENABLED", False)
+    monkeypatch.setattr(main, "model_client", ModelClient(rate_limits_rpm={}, default_rpm=1_000_000, burst=1000))
+
+
+def _run_with_args(argv, steps, monkeypatch):
+    for name in ("WATCHDOG_MAX_STEPS", "WATCHDOG_MAX_MODEL_CALLS", "WATCHDOG_STEP_DEADLINE_S"):
+        monkeypatch.setattr(main, name, getattr(main, name))
+    main.apply_watchdog_args(main.parse_args(argv))
+    driver = FakeWebDriver()
+    ctx = main.ExecutionContext(driver=driver, name="test-watchdog")
+    ctx.vision_model = FakeGenerativeModel(default_text="42")
+    try:
+        return main.run_plan(steps, ctx), driver, ctx.vision_model
+    finally:
+        main.close_context(ctx)
+
+
+def test_zero_model_calls_from_the_command_line_stops_the_first_call(fast_models, monkeypatch, site):
+    steps = [{"action": "NAVIGATE_TO_URL", "data": {"url": site.url("guide.html")}},
+             {"action": "READ_SCREEN", "data": {"prompt_for_vision": "What is the return window?", "context_key_to_store": "window"}},
+             {"action": "ANSWER_USER", "data": {"response_template": "{window}"}}]
+    result, driver, vision_model = _run_with_args(["--max-model-calls", "0"], steps, monkeypatch)
+    assert main.WATCHDOG_MAX_MODEL_CALLS == 0
+    assert vision_model.calls == []
+    assert result["halted"] and result["abort"]["reason"] == "model_call_budget"
+    assert result["abort"]["message"] == "The plan made 0 model calls; the budget is 0."
+    assert (result["abort"]["step"], result["final_answer"]) == (2, None)
+    assert driver.navigations == 1
+
+
+def test_zero_steps_from_the_command_line_stops_the_first_step(fast_models, monkeypatch, site):
+    steps = [{"action": "NAVIGATE_TO_URL", "data": {"url": site.url("guide.html")}},
+             {"action": "ANSWER_USER", "data": {"response_template": "done"}}]
+    result, driver, _ = _run_with_args(["--max-steps", "0"], steps, monkeypatch)
+    assert main.WATCHDOG_MAX_STEPS == 0
+    assert result["halted"] and result["abort"]["reason"] == "step_budget"
+    assert result["abort"]["message"] == "The plan ran 0 steps; starting step 1 would exceed the budget of 0."
+    assert result["steps"] == [] and driver.navigations == 0
+
+
+def test_a_branch_draws_model_calls_from_its_parent():
+    parent = Watchdog(max_model_calls=3)
+    branches = [Watchdog(max_model_calls=10, parent=parent) for _ in range(2)]
+    branches[0].count_model_call()
+    branches[1].count_model_call()
+    parent.count_model_call()
+    with pytest.raises(WatchdogAbort):
+        branches[0].count_model_call()
+    assert parent.model_calls == 3
+    assert parent.abort["reason"] == branches[0].abort["reason"] == "model_call_budget"
+    assert branches[1].abort is None
+
+
+def test_parallel_branches_share_the_runs_model_call_budget(fast_models, monkeypatch, site):
+    monkeypatch.setattr(main, "WATCHDOG_MAX_MODEL_CALLS", 4)
+    reads = [{"action": "READ_SCREEN", "data": {"prompt_for_vision": f"What is fact {n}?", "context_key_to_store": f"fact_{n}"}}
+             for n in range(3)]
+    branches = [{"name": f"site-{n}", "steps": [{"action": "NAVIGATE_TO_URL", "data": {"url": site.url("guide.html")}}] + reads}
+                for n in range(3)]
+    steps = [{"action": "PARALLEL", "data": {"branches": branches}},
+             {"action": "ANSWER_USER", "data": {"response_template": "done"}}]
+    ctx = main.ExecutionContext(driver=FakeWebDriver(), driver_factory=FakeWebDriver, name="test-watchdog")
+    ctx.vision_model = FakeGenerativeModel(default_text="42")
+    try:
+        result = main.run_plan(steps, ctx)
+    finally:
+        main.close_context(ctx)
+    # Nine reads across three branches; each branch alone is under the budget.
+    assert len(ctx.vision_model.calls) == 4
+    assert result["halted"] and result["abort"]["reason"] == "model_call_budget"
+    assert result["watchdog"]["model_calls"] == 4
+    assert result["final_answer"] is None
@@ -0,0 +1,82 @@
+import threading
+import time
+
+import pytest
+
+import main
+from fake_backends import FakeGenerativeModel, FakeWebDriver
+from model_client import ModelClient
+
+READ_PROMPT = "What is the price on this page?"
+
+
+class OneCallerDriver(FakeWebDriver):
+    # Records every WebDriver call made while another thread's call is still
+    # running; each call takes a few milliseconds so overlaps aren't left to luck.
+    def __init__(self):
+        self._busy = threading.Lock()
+        self._owner = None
+        self.overlaps = []
+        self._url = "about:blank"
+        super().__init__()
+
+    def _guarded(self, name, call):
+        if self._owner == threading.get_ident():
+            return call()  # the fake calling itself
+        if not self._busy.acquire(blocking=False):
+            self.overlaps.append((name, threading.current_thread().name))
+            return call()
+        self._owner = threading.get_ident()
+        try:
+            time.sleep(0.003)
+            return call()
+        finally:
+            self._owner = None
+            self._busy.release()
+
+    @property
+    def current_url(self):
+        return self._guarded("current_url", lambda: self._url)
+
+    @current_url.setter
+    def current_url(self, value):
+        self._url = value
+
+    @property
+    def title(self):
+        return self._guarded("title", lambda: FakeWebDriver.title.fget(self))
+
+    def execute_script(self, script, *args):
+        return self._guarded("execute_script", lambda: super(OneCallerDriver, self).execute_script(script, *args))
+
+    def execute_cdp_cmd(self, cmd, cmd_args):
+        return self._guarded("execute_cdp_cmd", lambda: super(OneCallerDriver, self).execute_cdp_cmd(cmd, cmd_args))
+
+    def get_screenshot_as_png(self):
+        return self._guarded("get_screenshot_as_png", lambda: super(OneCallerDriver, self).get_screenshot_as_png())
+
+
+@pytest.fixture
+def prefetching(monkeypatch):
+    monkeypatch.setattr(main, "PREFETCH_ENABLED", True)
+    monkeypatch.setattr(main, "READ_BATCH_ENABLED", False)
+    monkeypatch.setattr(main, "VISION_CACHE_ENABLED", False)
+    monkeypatch.setattr(main, "model_client", ModelClient(rate_limits_rpm={}, default_rpm=1_000_000, burst=1000))
+
+
+def test_prefetch_never_drives_the_browser_alongside_the_executor(prefetching, site):
+    driver = OneCallerDriver()
+    ctx = main.ExecutionContext(driver=driver, headless=True, name="test-prefetch")
+    ctx.vision_model = FakeGenerativeModel([(READ_PROMPT, "59999")], latency_s=0.02)
+    steps = []
+    for index, page in enumerate(["product-1.html", "product-2.html", "product-3.html"]):
+        steps.append({"action": "NAVIGATE_TO_URL", "data": {"url": site.url(page)}})
+        steps.append({"action": "READ_SCREEN", "data": {"prompt_for_vision": READ_PROMPT, "context_key_to_store": f"price_{index}"}})
+        steps.append({"action": "READ_SCREEN", "data": {"prompt_for_vision": READ_PROMPT, "context_key_to_store": f"again_{index}"}})
+    try:
+        result = main.run_plan(steps, ctx)
+    finally:
+        main.close_context(ctx)
+    assert result["success"]
+    assert result["prefetch"]["used"] >= 3
+    assert driver.overlaps == []
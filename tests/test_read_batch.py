@@ -0,0 +1,59 @@
+import pytest
+
+import main
+from fake_backends import FakeGenerativeModel, FakeWebDriver
+from model_client import ModelClient
+from read_batch import read_batch_stats, split_batch_answer
+
+QUESTIONS = {"price": "What is the price?", "rating": "What is the rating?", "stock": "Is it in stock?"}
+
+
+@pytest.fixture
+def batching(monkeypatch):
+    monkeypatch.setattr(main, "READ_BATCH_ENABLED", True)
+    monkeypatch.setattr(main, "VISION_CACHE_ENABLED", False)
+    monkeypatch.setattr(main, "PREFETCH_ENABLED", False)
+    monkeypatch.setattr(main, "model_client", ModelClient(rate_limits_rpm={}, default_rpm=1_000_000, burst=1000))
+
+
+def test_split_batch_answer_needs_every_question_answered():
+    assert split_batch_answer('```json\n{"q2": "4.1", "q1": "59999"}\n```', 2) == ["59999", "4.1"]
+    assert split_batch_answer('{"q1": 59999, "q2": ["blue", "red"]}', 2) == ["59999", '["blue", "red"]']
+    assert split_batch_answer('{"q1": "59999"}', 2) is None
+    assert split_batch_answer('["59999", "4.1"]', 2) is None
+    assert split_batch_answer("The price is 59999 and the rating 4.1.", 2) is None
+    assert split_batch_answer(None, 2) is None
+
+
+def _run_reads(site, batch_answer):
+    steps = [{"action": "NAVIGATE_TO_URL", "data": {"url": site.url("product-1.html")}}]
+    steps += [{"action": "READ_SCREEN", "data": {"prompt_for_vision": question, "context_key_to_store": key}}
+              for key, question in QUESTIONS.items()]
+    steps.append({"action": "ANSWER_USER", "data": {"response_template": "{price} / {rating} / {stock}"}})
+    driver = FakeWebDriver()
+    ctx = main.ExecutionContext(driver=driver, name="test-read-batch")
+    ctx.vision_model = FakeGenerativeModel([("Answer each of the following questions", batch_answer),
+                                            ("What is the price?", "59999"), ("What is the rating?", "4.1"), ("Is it in stock?", "yes")])
+    try:
+        result = main.run_plan(steps, ctx)
+    finally:
+        main.close_context(ctx)
+    return result, len(ctx.vision_model.calls), driver.screenshots
+
+
+def test_one_call_answers_the_whole_group(batching, site):
+    result, calls, screenshots = _run_reads(site, '{"q1": "59999", "q2": "4.1", "q3": "yes"}')
+    assert result["final_answer"] == "59999 / 4.1 / yes"
+    assert [step.get("batched") for step in result["steps"][1:4]] == [3, 3, 3]
+    assert (calls, screenshots) == (1, 1)
+
+
+def test_an_unsplittable_answer_falls_back_to_separate_reads(batching, site):
+    before = read_batch_stats()
+    result, calls, screenshots = _run_reads(site, '{"q1": "59999", "q2": "4.1"}')
+    assert result["success"] and result["final_answer"] == "59999 / 4.1 / yes"
+    # The batched call, then one call per question against the same screenshot.
+    assert (calls, screenshots) == (4, 1)
+    after = read_batch_stats()
+    assert after["fallbacks"] - before["fallbacks"] == 1
+    assert after["calls_saved"] - before["calls_saved"] == -1
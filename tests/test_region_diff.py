@@ -0,0 +1,70 @@
+import pytest
+from PIL import Image, ImageDraw
+
+import main
+from fake_backends import FakeGenerativeModel, FakeWebDriver, make_labeling_responder
+from model_client import ModelClient
+from region_diff import changed_regions, merge_elements, tile_hashes
+
+
+@pytest.fixture
+def labeling(monkeypatch):
+    monkeypatch.setattr(main, "VISION_CACHE_ENABLED", False)
+    monkeypatch.setattr(main, "PREFETCH_ENABLED", False)
+    monkeypatch.setattr(main, "model_client", ModelClient(rate_limits_rpm={}, default_rpm=1_000_000, burst=1000))
+
+
+def _label_type_relabel(monkeypatch, site, driver, region_diff):
+    monkeypatch.setattr(main, "REGION_DIFF_ENABLED", region_diff)
+    ctx = main.ExecutionContext(driver=driver, headless=True, name="test-region-diff")
+    ctx.vision_model = FakeGenerativeModel([("interactive elements", make_labeling_responder(lambda: driver))])
+    steps = [
+        {"action": "NAVIGATE_TO_URL", "data": {"url": site.url("index.html")}},
+        {"action": "LABEL_AND_READ_SCREEN", "data": {"context_key_to_store_labels": "home"}},
+        {"action": "TYPE_INTO_ELEMENT", "data": {"text": "phone", "locator": {"type": "label_number", "value": 3, "context_source": "home"}}},
+        {"action": "LABEL_AND_READ_SCREEN", "data": {"context_key_to_store_labels": "home"}},
+    ]
+    try:
+        assert main.run_plan(steps, ctx)["success"]
+        return ctx.shared_context["home"], ctx.vision_model.calls
+    finally:
+        main.overlay_renderer.flush(timeout=30)
+        main.close_context(ctx)
+
+
+def test_changed_region_relabel_matches_a_full_relabel(labeling, monkeypatch, site, driver):
+    full, full_calls = _label_type_relabel(monkeypatch, site, driver, region_diff=False)
+    incremental, incremental_calls = _label_type_relabel(monkeypatch, site, FakeWebDriver(), region_diff=True)
+    assert list(incremental) == list(full)
+    for number, element in full.items():
+        assert incremental[number]["description"] == element["description"]
+        assert all(abs(a - b) <= 1 for a, b in zip(incremental[number]["box"], element["box"]))
+    assert incremental_calls[-1]["image_bytes"] < full_calls[-1]["image_bytes"]
+
+
+def test_changed_tiles_grow_to_cover_the_elements_they_touch():
+    before = Image.new("RGB", (256, 128), "white")
+    after = before.copy()
+    ImageDraw.Draw(after).rectangle([70, 40, 80, 50], fill="black")
+    regions, fraction = changed_regions(tile_hashes(before), tile_hashes(after), before.size,
+                                        old_boxes=[[40, 36, 140, 60], [200, 100, 250, 120]], padding=4)
+    assert regions == [(36, 28, 144, 68)]
+    assert fraction == pytest.approx(1 / 32)
+    assert changed_regions(tile_hashes(before), tile_hashes(before), before.size) == ([], 0.0)
+
+
+def test_merge_keeps_numbers_outside_and_matches_inside_the_regions():
+    old = {
+        1: {"number": 1, "description": "Home", "image_box": [0, 0, 50, 20]},
+        2: {"number": 2, "description": "Search", "image_box": [0, 40, 100, 60]},
+        5: {"number": 5, "description": "Old banner", "image_box": [0, 80, 100, 100]},
+    }
+    new_elements = [
+        {"description": "Search (typed)", "image_box": [0, 41, 100, 61]},
+        {"description": "Suggestion", "image_box": [0, 62, 100, 78]},
+    ]
+    merged = merge_elements(old, [(0, 30, 128, 110)], new_elements)
+    assert list(merged) == [1, 2, 6]
+    assert merged[1] is old[1]
+    assert merged[2]["description"] == "Search (typed)" and merged[2]["number"] == 2
+    assert merged[6]["description"] == "Suggestion"
@@ -0,0 +1,90 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+import main
+from fake_backends import FAKE_ROW_HEIGHT, FakeGenerativeModel, FakeWebDriver
+from model_client import ModelClient
+from page_text import SCROLL_TO_Y_JS
+from screenshot_pipeline import capture_cdp_screenshot, prepare_screenshot
+
+
+@pytest.fixture
+def cdp(monkeypatch):
+    monkeypatch.setattr(main, "SCREENSHOT_BACKEND", "cdp")
+    monkeypatch.setattr(main, "VISION_CACHE_ENABLED", False)
+    monkeypatch.setattr(main, "PREFETCH_ENABLED", False)
+    monkeypatch.setattr(main, "model_client", ModelClient(rate_limits_rpm={}, default_rpm=1_000_000, burst=1000))
+
+
+def _link(driver, text):
+    return next(node for node in driver.nodes if node["tag"] == "a" and node["text"] == text)
+
+
+def _is_outline_blue(image, x, y):
+    # The fake draws link outlines in blue and text in black; JPEG blurs both.
+    red, green, blue = image.getpixel((x, y))
+    return blue - red > 60
+
+
+def test_full_page_read_keeps_a_long_page_readable(cdp, site, driver):
+    driver.get(site.url("compare.html"))
+    uploaded = []
+
+    def answer(parts):
+        uploaded.append(Image.open(BytesIO(parts[1]["data"])).size)
+        return "Fixture Phone 120"
+
+    ctx = main.ExecutionContext(driver=driver, headless=True, name="test-screenshot")
+    ctx.vision_model = FakeGenerativeModel([("most expensive", answer)])
+    steps = [{"action": "READ_SCREEN", "data": {"prompt_for_vision": "Which phone is the most expensive?", "capture": "full_page",
+                                                "context_key_to_store": "priciest"}}]
+    try:
+        assert main.run_plan(steps, ctx)["success"]
+    finally:
+        main.close_context(ctx)
+    page_width, page_height = driver.viewport[0], driver._page_height()
+    assert page_height > 10 * main.VISION_IMAGE_RESIZE_HEIGHT
+    # The width is fitted to the upload limit and the height follows it.
+    scale = main.VISION_IMAGE_RESIZE_WIDTH / page_width
+    assert uploaded == [(main.VISION_IMAGE_RESIZE_WIDTH, round(page_height * scale))]
+
+
+def test_full_page_boxes_map_back_to_the_scrolled_viewport(site):
+    driver = FakeWebDriver(device_pixel_ratio=2.0)
+    driver.get(site.url("compare.html"))
+    driver.execute_script(SCROLL_TO_Y_JS, 30 * FAKE_ROW_HEIGHT)
+    screenshot = capture_cdp_screenshot(driver, 1024, 768, full_page=True)
+    assert screenshot.origin == (0, -30 * FAKE_ROW_HEIGHT)
+    link = _link(driver, "Fixture Phone 3")
+    viewport_box = driver._box(link)
+    assert viewport_box[1] < 0  # scrolled out of view, but on the full-page image
+    image_box = screenshot.to_image_box(viewport_box)
+    assert _is_outline_blue(screenshot.image, image_box[0], (image_box[1] + image_box[3]) // 2)
+    assert screenshot.to_viewport_box(image_box) == pytest.approx(viewport_box, abs=1)
+
+
+@pytest.mark.parametrize("device_pixel_ratio", [1.0, 2.0])
+def test_region_boxes_map_back_to_the_viewport(site, device_pixel_ratio):
+    driver = FakeWebDriver(device_pixel_ratio=device_pixel_ratio)
+    driver.get(site.url("compare.html"))
+    link = _link(driver, "Fixture Phone 5")
+    x0, y0, x1, y1 = driver._box(link)
+    region = [x0 - 10, y0 - 10, x1 + 200, y1 + 10]
+    screenshot = capture_cdp_screenshot(driver, 1024, 768, region=region)
+    assert screenshot.origin == (region[0], region[1])
+    assert screenshot.size == (round((region[2] - region[0]) * device_pixel_ratio), round((region[3] - region[1]) * device_pixel_ratio))
+    # The link's outline, found in the region image, is where a click must land.
+    image = screenshot.image
+    left = next(x for x in range(image.width) if _is_outline_blue(image, x, image.height // 2))
+    top = next(y for y in range(image.height) if _is_outline_blue(image, left + 4, y))
+    assert screenshot.to_viewport_box([left, top, left, top])[:2] == pytest.approx([x0, y0], abs=1)
+
+
+def test_bytes_saved_is_reported_only_for_re_encoded_captures(site, driver):
+    driver.get(site.url("guide.html"))
+    cdp_capture = capture_cdp_screenshot(driver, 1024, 768)
+    assert cdp_capture.bytes_saved is None
+    webdriver_capture = prepare_screenshot(driver.get_screenshot_as_png(), 1024, 768)
+    assert webdriver_capture.bytes_saved == webdriver_capture.original_bytes - len(webdriver_capture.data) > 0
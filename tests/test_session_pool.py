@@ -0,0 +1,67 @@
+import threading
+
+from session_pool import SessionPool
+
+
+class Context:
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.alive = True
+        self.closed = False
+
+
+def _pool(size, max_runs_per_session=20):
+    created, closed = [], []
+
+    def context_factory(session_id):
+        created.append(Context(session_id))
+        return created[-1]
+
+    def close(ctx):
+        ctx.closed = True
+        closed.append(ctx)
+
+    pool = SessionPool(size, context_factory=context_factory, is_alive=lambda ctx: ctx.alive, close=close,
+                       max_runs_per_session=max_runs_per_session)
+    return pool, created, closed
+
+
+def _which_context(ctx=None):
+    return ctx
+
+
+def test_a_session_is_reused_until_its_run_limit():
+    pool, created, closed = _pool(1, max_runs_per_session=2)
+    with pool:
+        contexts = [pool.submit(_which_context).result() for _ in range(5)]
+        stats = pool.stats()
+    assert contexts == [created[0], created[0], created[1], created[1], created[2]]
+    assert closed == created  # two recycled, the last one at shutdown
+    assert (stats["completed"], stats["recycled"], stats["sessions_started"]) == (5, 2, 3)
+
+
+def test_a_dead_browser_is_replaced_before_the_next_run():
+    pool, created, closed = _pool(1)
+    with pool:
+        first = pool.submit(_which_context).result()
+        first.alive = False
+        second = pool.submit(_which_context).result()
+        assert second is not first and closed == [first]
+        assert pool.stats()["recycled"] == 1
+
+
+def test_concurrent_jobs_get_their_own_session():
+    pool, created, _ = _pool(2)
+    both_running = threading.Barrier(2, timeout=5)
+
+    def job(ctx=None):
+        both_running.wait()
+        return ctx
+
+    with pool:
+        futures = [pool.submit(job), pool.submit(job)]
+        contexts = [future.result(timeout=10) for future in futures]
+    # Both jobs were in flight together, each with a session of its own.
+    assert contexts[0] is not contexts[1]
+    assert sorted(ctx.session_id for ctx in contexts) == [1, 2]
+    assert len(created) == 2
@@ -0,0 +1,35 @@
+import main
+from plan_cache import PlanCache, normalize_goal
+from skill_cache import SkillRecorder
+
+
+def _record_skill(goal):
+    steps = [
+        {"action": "NAVIGATE_TO_URL", "data": {"url": "https://shop.example/list/3?count=3"}},
+        {"action": "LABEL_AND_READ_SCREEN", "data": {"context_key_to_store_labels": "list"}},
+        {"action": "CLICK_ELEMENT", "data": {"locator": {"type": "label_number", "value": 3, "context_source": "list"}}},
+        {"action": "TYPE_INTO_ELEMENT", "data": {"text": "3", "locator": {"type": "label_number", "value": 7, "context_source": "list"}}},
+        {"action": "ANSWER_USER", "data": {"response_template": "Added 3 phones."}},
+    ]
+    recorder = SkillRecorder()
+    recorder.record_target(2, {"selector": "ul.results > li:nth-of-type(3) > a", "xpath": "/html[1]/body[1]/ul[1]/li[3]/a[1]"},
+                           "Phone 3 (128 GB)", "list", 3)
+    recorder.record_target(3, {"selector": "#qty", "xpath": '//*[@id="qty"]'}, "Quantity", "list", 7)
+    result = {"success": True, "steps": [{"success": True, "skipped": False} for _ in steps]}
+    main._remember_skill(goal, steps, result, recorder)
+
+
+def test_replaying_a_skill_keeps_its_recorded_locators(monkeypatch, tmp_path):
+    monkeypatch.setattr(main, "skill_cache", PlanCache(path=str(tmp_path / "skill_cache.json")))
+    _record_skill("add 3 phones to the cart")
+    template, params = normalize_goal("add 5 phones to the cart")
+    steps = main._get_cached_plan(template, params, main.skill_cache, kind="skill")["steps"]
+
+    assert steps[0]["data"]["url"] == "https://shop.example/list/3?count=5"
+    assert steps[1]["replay"] == {"deferred": True}
+    assert steps[2]["data"]["locator"] == {"type": "css_selector", "value": "ul.results > li:nth-of-type(3) > a"}
+    assert steps[2]["replay"] == {"xpath": "/html[1]/body[1]/ul[1]/li[3]/a[1]", "description": "Phone 3 (128 GB)",
+                                  "context_source": "list", "label_number": 3}
+    assert steps[3]["data"] == {"text": "5", "locator": {"type": "css_selector", "value": "#qty"}}
+    assert steps[3]["replay"]["xpath"] == '//*[@id="qty"]'
+    assert steps[4]["data"]["response_template"] == "Added 5 phones."
@@ -0,0 +1,76 @@
+import json
+import threading
+
+import main
+from fake_backends import FakeWebDriver
+from tracing import Tracer, tracer
+
+
+def _paths_from_spans(spans):
+    by_id = {span.span_id: span for span in spans}
+
+    def path(span):
+        return path(by_id[span.parent_id]) + [span.name] if span.parent_id in by_id else [span.name]
+    return sorted("/".join(path(span)) for span in spans)
+
+
+def _paths_from_chrome_trace(trace):
+    # The export has no parent ids: a span's parent is the innermost span of
+    # the same thread that encloses it in time, as the trace viewers draw it.
+    events = sorted((event for event in trace["traceEvents"] if event["ph"] == "X"), key=lambda event: (event["tid"], event["ts"], -event["dur"]))
+    paths, stack = [], []
+    for event in events:
+        while stack and (stack[-1][0]["tid"] != event["tid"] or stack[-1][0]["ts"] + stack[-1][0]["dur"] < event["ts"] + event["dur"]):
+            stack.pop()
+        path = (stack[-1][1] if stack else []) + [event["name"]]
+        stack.append((event, path))
+        paths.append("/".join(path))
+    return sorted(paths)
+
+
+def test_span_tree_survives_the_chrome_trace_export(tmp_path):
+    local_tracer = Tracer()
+
+    def branch():
+        with local_tracer.span("branch"):
+            pass
+
+    with local_tracer.span("run", session="a"):
+        with local_tracer.span("step", index=1):
+            with local_tracer.span("wait.settle"):
+                pass
+        worker = threading.Thread(target=branch, name="worker")
+        worker.start()
+        worker.join()
+        try:
+            with local_tracer.span("step", index=2):
+                raise RuntimeError("boom")
+        except RuntimeError:
+            pass
+    path = tmp_path / "trace.json"
+    local_tracer.export(str(path))
+    trace = json.loads(path.read_text(encoding="utf-8"))
+
+    assert _paths_from_chrome_trace(trace) == _paths_from_spans(local_tracer.spans()) == [
+        "branch", "run", "run/step", "run/step", "run/step/wait.settle"]
+    complete = {(event["name"], event["args"].get("index")): event for event in trace["traceEvents"] if event["ph"] == "X"}
+    assert complete[("step", 2)]["args"]["error"] == "RuntimeError: boom"
+    assert complete[("wait.settle", None)]["cat"] == "wait"
+    thread_names = {event["tid"]: event["args"]["name"] for event in trace["traceEvents"] if event["ph"] == "M"}
+    assert thread_names[complete[("branch", None)]["tid"]] == "worker"
+
+
+def test_a_plan_run_exports_the_same_tree(site, tmp_path):
+    tracer.clear()
+    steps = [{"action": "NAVIGATE_TO_URL", "data": {"url": site.url("deals.html")}},
+             {"action": "ANSWER_USER", "data": {"response_template": "Done."}}]
+    ctx = main.ExecutionContext(driver=FakeWebDriver(), name="test-tracing")
+    try:
+        assert main.run_plan(steps, ctx)["success"]
+    finally:
+        main.close_context(ctx)
+    path = tmp_path / "trace.json"
+    tracer.export(str(path))
+    paths = _paths_from_chrome_trace(json.loads(path.read_text(encoding="utf-8")))
+    assert paths == _paths_from_spans(tracer.spans())
+    assert {"run", "run/step", "run/step/wait.settle"} <= set(paths)
@@ -0,0 +1,101 @@
+import re
+
+import pytest
+from PIL import Image
+
+import main
+from fake_backends import FakeGenerativeModel, make_labeling_responder
+from model_client import ModelClient
+from screenshot_pipeline import encode_image
+from vision_cache import VISION_CACHE_HAMMING_TOLERANCE, VisionResponseCache, content_hash, hamming_distance, perceptual_hash, \
+    perceptual_hash_of_bytes
+
+PRICE_PROMPT = "What is the price on this page? Answer with the number only."
+
+
+@pytest.fixture
+def vision_cache_on(monkeypatch):
+    monkeypatch.setattr(main, "VISION_CACHE_ENABLED", True)
+    monkeypatch.setattr(main, "vision_cache", VisionResponseCache(path=None))
+    monkeypatch.setattr(main, "model_client", ModelClient(rate_limits_rpm={}, default_rpm=1_000_000, burst=1000))
+
+
+def _read_prices(driver, urls):
+    ctx = main.ExecutionContext(driver=driver, headless=True, name="test-vision-cache")
+
+    def answer_price(parts):
+        return re.search(r"Price: (\d+)", driver.page_source).group(1)
+
+    ctx.vision_model = FakeGenerativeModel([(PRICE_PROMPT, answer_price)])
+    steps = []
+    for index, url in enumerate(urls):
+        steps.append({"action": "NAVIGATE_TO_URL", "data": {"url": url}})
+        steps.append({"action": "READ_SCREEN", "data": {"prompt_for_vision": PRICE_PROMPT, "context_key_to_store": f"price_{index}"}})
+    try:
+        result = main.run_plan(steps, ctx)
+        assert result["success"]
+        return [ctx.shared_context[f"price_{index}"] for index in range(len(urls))], len(ctx.vision_model.calls)
+    finally:
+        main.close_context(ctx)
+
+
+def test_near_identical_pages_are_read_separately(vision_cache_on, site, driver):
+    prices, calls = _read_prices(driver, [site.url("product-1.html"), site.url("product-2.html")])
+    assert prices == ["59999", "69999"]
+    assert calls == 2
+
+
+def test_rereading_the_same_page_hits_the_cache(vision_cache_on, site, driver):
+    prices, calls = _read_prices(driver, [site.url("product-1.html"), site.url("product-1.html")])
+    assert prices == ["59999", "59999"]
+    assert calls == 1
+
+
+def test_tolerance_applies_only_to_tolerant_lookups_on_the_same_page():
+    cache = VisionResponseCache(path=None, tolerance=2)
+    image = Image.new("RGB", (64, 32), "white")
+    phash = perceptual_hash(image)
+    cache.put("http://site/a", phash, "label", "model", "labels")
+    near = phash ^ 1
+    assert cache.get("http://site/a", near, "label", "model", tolerant=True) == "labels"
+    assert cache.get("http://site/a", near, "label", "model") is None
+    assert cache.get("http://site/b", near, "label", "model", tolerant=True) is None
+
+
+def test_content_hash_sees_small_changes():
+    assert content_hash(b"Price: 59999") != content_hash(b"Price: 69999")
+    assert content_hash(b"same") == content_hash(b"same")
+
+
+
+def test_hash_of_the_encoded_frame_matches_the_decoded_one(site, driver):
+    driver.get(site.url("index.html"))
+    ctx = main.ExecutionContext(driver=driver, headless=True, name="test-vision-cache")
+    screenshot = main._capture_screenshot(ctx)
+    phash = perceptual_hash_of_bytes(screenshot.data)
+    assert not screenshot.image_loaded
+    assert hamming_distance(phash, perceptual_hash(screenshot.image)) <= VISION_CACHE_HAMMING_TOLERANCE
+    png, _ = encode_image(screenshot.image, "PNG")
+    assert perceptual_hash_of_bytes(png) == perceptual_hash(screenshot.image)
+
+
+def test_reads_and_a_labeling_leave_screenshots_undecoded(vision_cache_on, monkeypatch, site, driver):
+    monkeypatch.setattr(main, "SCREENSHOT_BACKEND", "cdp")
+    captured, capture = [], main._capture_screenshot
+    monkeypatch.setattr(main, "_capture_screenshot", lambda *args, **kwargs: captured.append(capture(*args, **kwargs)) or captured[-1])
+    ctx = main.ExecutionContext(driver=driver, headless=True, name="test-vision-cache")
+    ctx.vision_model = FakeGenerativeModel([("interactive elements", make_labeling_responder(lambda: driver))], default_text="Fixture Shop")
+    steps = [{"action": "NAVIGATE_TO_URL", "data": {"url": site.url("index.html")}},
+             {"action": "READ_SCREEN", "data": {"prompt_for_vision": "What is the page title?", "context_key_to_store": "title"}},
+             {"action": "LABEL_AND_READ_SCREEN", "data": {"context_key_to_store_labels": "home"}},
+             {"action": "READ_SCREEN", "data": {"prompt_for_vision": "What is the page title?", "context_key_to_store": "title_again"}}]
+    try:
+        assert main.run_plan(steps, ctx)["success"]
+        assert len(ctx.vision_model.calls) == 2  # the second read is a cache hit
+    finally:
+        main.overlay_renderer.flush(timeout=30)
+        main.close_context(ctx)
+    assert captured and not any(screenshot.image_loaded for screenshot in captured)
+    # Relabeling the key diffs its tiles against the stored frame, decoding it then.
+    assert ctx.label_frames["home"].hashes
+    assert sum(screenshot.image_loaded for screenshot in captured) == 1
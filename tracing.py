@@ -0,0 +1,162 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+# --- Configuration ---
+TRACE_ENABLED = True
+TRACE_MAX_SPANS = 50000  # oldest spans are dropped once the ring buffer is full
+
+
+class Span:
+    __slots__ = ("tracer", "name", "attributes", "start_ns", "end_ns", "span_id", "parent_id", "thread_id", "thread_name")
+
+    def __init__(self, tracer: "Tracer", name: str, attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.start_ns = 0
+        self.end_ns = 0
+        self.span_id = 0
+        self.parent_id = None
+        self.thread_id = 0
+        self.thread_name = ""
+
+    def set(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def update(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.tracer._push(self)
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.perf_counter_ns()
+        if exc_type is not None:
+            self.attributes["error"] = f"{exc_type.__name__}: {exc}"
+        self.tracer._pop(self)
+        return False
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "thread": self.thread_name,
+            "start_ms": round((self.start_ns - self.tracer.origin_ns) / 1e6, 3),
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+        }
+
+
+class _NoOpSpan:
+    __slots__ = ()
+
+    def set(self, key, value): pass
+    def update(self, **attributes): pass
+    def __enter__(self): return self
+    def __exit__(self, exc_type, exc, tb): return False
+
+
+_NO_OP_SPAN = _NoOpSpan()
+
+
+class Tracer:
+    # Spans are plain objects appended to a bounded deque when they finish; with
+    # tracing disabled span() hands back a shared no-op object.
+    def __init__(self, enabled: bool = TRACE_ENABLED, max_spans: int = TRACE_MAX_SPANS):
+        self.enabled = enabled
+        self.origin_ns = time.perf_counter_ns()
+        self.origin_wall = time.time()
+        self._spans = deque(maxlen=max_spans)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    def span(self, name: str, **attributes):
+        if not self.enabled:
+            return _NO_OP_SPAN
+        return Span(self, name, attributes)
+
+    def _push(self, span: Span):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        with self._lock:
+            self._next_id += 1
+            span.span_id = self._next_id
+        span.parent_id = stack[-1].span_id if stack else None
+        current = threading.current_thread()
+        span.thread_id, span.thread_name = current.ident, current.name
+        stack.append(span)
+
+    def _pop(self, span: Span):
+        stack = self._local.stack
+        if stack and stack[-1] is span:
+            stack.pop()
+        elif span in stack:
+            stack.remove(span)
+        self._spans.append(span)
+
+    def spans(self) -> List[Span]:
+        return list(self._spans)
+
+    def clear(self):
+        self._spans.clear()
+
+    def export_jsonl(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            for span in self.spans():
+                f.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+    def export_chrome_trace(self, path: str):
+        # Trace Event Format "complete" events; load the file in about:tracing
+        # or https://ui.perfetto.dev.
+        pid = os.getpid()
+        events = []
+        thread_names = {}
+        for span in self.spans():
+            thread_names[span.thread_id] = span.thread_name
+            events.append({
+                "name": span.name,
+                "cat": span.name.split(".", 1)[0],
+                "ph": "X",
+                "ts": (span.start_ns - self.origin_ns) / 1000,
+                "dur": (span.end_ns - span.start_ns) / 1000,
+                "pid": pid,
+                "tid": span.thread_id,
+                "args": span.attributes,
+            })
+        for thread_id, thread_name in thread_names.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": thread_id, "args": {"name": thread_name}})
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, default=str)
+
+    def export(self, path: str):
+        if path.endswith(".jsonl"):
+            self.export_jsonl(path)
+        else:
+            self.export_chrome_trace(path)
+        print(f"DEBUG: Wrote {len(self._spans)} trace spans to '{path}'.")
+
+    def summary(self, name_prefix: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+        totals: Dict[str, Dict[str, float]] = {}
+        for span in self.spans():
+            if name_prefix and not span.name.startswith(name_prefix): continue
+            entry = totals.setdefault(span.name, {"count": 0, "total_ms": 0.0})
+            entry["count"] += 1
+            entry["total_ms"] = round(entry["total_ms"] + span.duration_ms, 3)
+        return totals
+
+
+tracer = Tracer()
+span = tracer.span
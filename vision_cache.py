@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from io import BytesIO
+from typing import Any, Dict, Optional
+
+from PIL import Image
+
+# --- Configuration ---
+VISION_CACHE_HASH_SIZE = 16
+VISION_CACHE_HAMMING_TOLERANCE = 2  # only for tolerant lookups (labeling); text reads need the exact image
+VISION_CACHE_MAX_ENTRIES = 256
+VISION_CACHE_PATH = None  # e.g. "vision_cache.json" to keep responses across runs
+
+
+def perceptual_hash(image: Image.Image, hash_size: int = VISION_CACHE_HASH_SIZE) -> int:
+    # Difference hash: one bit per horizontally adjacent pixel pair of a small
+    # grayscale thumbnail. Visually identical frames hash to the same value even
+    # when the PNG bytes differ (cursor blink, anti-aliasing, re-encoding).
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def perceptual_hash_of_bytes(data: bytes, hash_size: int = VISION_CACHE_HASH_SIZE) -> int:
+    # perceptual_hash of an encoded frame nobody has decoded yet. A JPEG is
+    # decoded at a fraction of its size (draft), which is plenty for the
+    # thumbnail; other formats are decoded in full.
+    with Image.open(BytesIO(data)) as image:
+        image.draft("L", (hash_size * 8, hash_size * 8))
+        return perceptual_hash(image, hash_size)
+
+
+def content_hash(data: bytes) -> int:
+    # Exact key for reads: a 16x16 dHash can't see that a price changed, the
+    # encoded bytes can.
+    return int.from_bytes(hashlib.sha1(data).digest()[:8], "big")
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class VisionResponseCache:
+    def __init__(self, max_entries: int = VISION_CACHE_MAX_ENTRIES, tolerance: int = VISION_CACHE_HAMMING_TOLERANCE,
+                 path: Optional[str] = VISION_CACHE_PATH):
+        self.max_entries = max_entries
+        self.tolerance = tolerance
+        self.path = path
+        self._entries: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path:
+            self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path): return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for item in json.load(f):
+                    if "page" not in item: continue  # written before entries were keyed by page
+                    self._entries[(item["page"], item["phash"], item["prompt"], item["model"])] = item
+        except (OSError, json.JSONDecodeError, KeyError, TypeError) as e:
+            print(f"DEBUG: Could not read vision cache '{self.path}': {e}. Starting with an empty cache.")
+            self._entries.clear()
+
+    def _save(self):
+        if not self.path: return
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(list(self._entries.values()), f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"DEBUG: Could not write vision cache '{self.path}': {e}")
+
+    def get(self, page: str, phash: int, prompt: str, model_name: str, tolerant: bool = False) -> Optional[str]:
+        # page is the URL the screenshot was taken on. A tolerant lookup also
+        # accepts a near-identical frame of that page (labeling: a blinking
+        # cursor moves no boxes); reads pass an exact content_hash.
+        with self._lock:
+            key = (page, phash, prompt, model_name)
+            if key not in self._entries and tolerant and self.tolerance > 0:
+                best_distance = self.tolerance + 1
+                for candidate_key in self._entries:
+                    if candidate_key[0] != page or candidate_key[2] != prompt or candidate_key[3] != model_name: continue
+                    distance = hamming_distance(candidate_key[1], phash)
+                    if distance < best_distance:
+                        best_distance, key = distance, candidate_key
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry["response_text"]
+
+    def put(self, page: str, phash: int, prompt: str, model_name: str, response_text: str):
+        with self._lock:
+            key = (page, phash, prompt, model_name)
+            self._entries[key] = {"page": page, "phash": phash, "prompt": prompt, "model": model_name,
+                                  "response_text": response_text, "created_at": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._save()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "entries": len(self._entries),
+        }